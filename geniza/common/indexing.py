@@ -0,0 +1,489 @@
+"""Utilities for Solr indexing shared across multiple apps"""
+
+import hashlib
+import itertools
+import json
+import logging
+import threading
+import weakref
+from collections import Counter, defaultdict
+from contextlib import contextmanager
+from urllib.parse import urljoin
+
+from django.conf import settings
+from django.db import connection, transaction
+from django.db.models.query import QuerySet
+from parasolr.indexing import Indexable
+from parasolr.solr.base import SolrConnectionNotFound
+
+from geniza.common.models import IndexJob
+from geniza.common.utils import Timerable
+
+logger = logging.getLogger(__name__)
+
+
+class IndexQueue:
+    """Transaction-scoped queue of records to be reindexed in Solr.
+
+    Signal handlers add primary keys for a :class:`~parasolr.django.indexing.ModelIndexable`
+    model with :meth:`add` instead of indexing immediately; keys are
+    de-duplicated per model and indexed once, in a single batched update
+    per model, when the current transaction is committed. When called
+    outside a transaction, records are indexed immediately; records queued
+    in a transaction that is rolled back are discarded.
+
+    If **SOLR_INDEX_BACKGROUND** is enabled in Django settings, records are
+    instead saved as :class:`~geniza.common.models.IndexJob` records in the
+    current transaction, to be indexed by the ``index_worker`` manage command.
+
+    Counts of index requests and indexed records are tracked in
+    :attr:`stats`, so that :meth:`avoided` can report how many redundant
+    index calls were skipped."""
+
+    _local = threading.local()
+
+    #: counters for records requested, indexed, and queued as background jobs
+    stats = Counter()
+
+    @classmethod
+    def pending(cls):
+        """Dictionary of sets of primary keys waiting to be indexed,
+        keyed on model class (local to the current thread)"""
+        if not hasattr(cls._local, "pending"):
+            cls._local.pending = defaultdict(set)
+        return cls._local.pending
+
+    @classmethod
+    def flush_pending(cls):
+        """Check if a flush is scheduled for the current transaction and
+        has not run yet"""
+        scheduled = getattr(cls._local, "scheduled_flush", None)
+        # Django discards on-commit callbacks registered in a transaction or
+        # savepoint that is rolled back; the weak reference to the callback
+        # is cleared when it is discarded
+        return scheduled is not None and scheduled() is not None
+
+    @classmethod
+    def add(cls, model, pks):
+        """Queue primary keys for the specified model to be indexed when the
+        current transaction is committed."""
+        pks = set(pks)
+        if not pks:
+            return
+        if getattr(settings, "SOLR_INDEX_BACKGROUND", False):
+            # saved in the current transaction, so jobs are only queued
+            # if the changes that triggered them are committed
+            IndexJob.enqueue(model, pks)
+            cls.stats["queued"] += len(pks)
+            return
+        flush_pending = cls.flush_pending()
+        if not flush_pending:
+            # anything still queued belongs to a transaction that was
+            # rolled back; start over with an empty queue
+            cls._local.pending = defaultdict(set)
+        cls.pending()[model].update(pks)
+        cls.stats["requested"] += len(pks)
+        # register a single flush per transaction, after updating the queue,
+        # since outside a transaction it runs immediately
+        if not flush_pending:
+
+            def flush_on_commit():
+                cls.flush()
+
+            # only a weak reference is kept, so that a flush discarded
+            # by a rollback is not mistaken for one that is still pending
+            cls._local.scheduled_flush = weakref.ref(flush_on_commit)
+            transaction.on_commit(flush_on_commit)
+
+    @classmethod
+    def flush(cls):
+        """Index all pending records, one batched update per model.
+        Returns the total number of records indexed."""
+        cls._local.scheduled_flush = None
+        pending = cls.pending()
+        if not pending:
+            return 0
+        # reset the queue before indexing, in case indexing triggers more signals
+        cls._local.pending = defaultdict(set)
+        total = 0
+        for model, pks in pending.items():
+            count = model.index_items(model.items_to_index().filter(pk__in=pks))
+            logger.debug("Reindexed %d queued %s record(s)", count, model.__name__)
+            total += count
+        cls.stats["indexed"] += total
+        if total:
+            logger.debug(
+                "%d redundant index request(s) avoided since startup", cls.avoided()
+            )
+        return total
+
+    @classmethod
+    def avoided(cls):
+        """Number of redundant index requests avoided by de-duplication"""
+        return cls.stats["requested"] - cls.stats["indexed"]
+
+    @classmethod
+    def clear(cls):
+        """Discard any pending records and reset counters"""
+        cls._local.pending = defaultdict(set)
+        cls._local.scheduled_flush = None
+        cls.stats.clear()
+
+
+class IndexDigestMixin:
+    """Mixin for :class:`~parasolr.django.indexing.ModelIndexable` models to
+    skip sending records to Solr when their index data has not changed.
+
+    A digest of the index data is indexed with each record in
+    :attr:`digest_field`; before updating, digests for new index data are
+    compared with the indexed digests, and only records that differ (or are
+    not yet indexed) are sent to Solr. Must be listed before
+    :class:`~parasolr.django.indexing.ModelIndexable` in base classes."""
+
+    #: solr field for the digest of index data
+    digest_field = "index_digest_s"
+
+    #: counts of records sent to Solr and skipped as unchanged (shared by all subclasses)
+    index_stats = Counter()
+
+    @staticmethod
+    def index_data_digest(data):
+        """Stable digest for a dictionary of index data"""
+        return hashlib.sha1(
+            json.dumps(data, sort_keys=True, default=str).encode()
+        ).hexdigest()
+
+    @classmethod
+    def indexed_digests(cls, ids):
+        """Return a dictionary of index digests in Solr for a list of
+        index ids, or None if the request fails. Uses real-time get rather
+        than a search, so that updates not yet committed (e.g. when
+        commitWithin is set) are compared; otherwise a record changed and
+        then reverted before the next commit would be skipped."""
+        url = cls.solr.build_url(cls.solr.solr_url, cls.solr.collection, "get")
+        response = cls.solr.make_request(
+            "post",
+            url,
+            headers={"content-type": "application/x-www-form-urlencoded"},
+            params={"ids": ",".join(ids), "fl": "id,%s" % cls.digest_field},
+        )
+        if response:
+            return {d["id"]: d.get(cls.digest_field) for d in response.response.docs}
+
+    @classmethod
+    def changed_index_data(cls, docs, force=False):
+        """Add digests to a list of index data dictionaries and return
+        the ones that are not already indexed with the same digest.
+        If `force` is True, returns all of them."""
+        for doc in docs:
+            doc.pop(cls.digest_field, None)
+            doc[cls.digest_field] = cls.index_data_digest(doc)
+
+        changed = docs
+        if docs and not force:
+            # if the request fails, index everything
+            indexed = cls.indexed_digests([doc["id"] for doc in docs]) or {}
+            changed = [
+                doc for doc in docs if indexed.get(doc["id"]) != doc[cls.digest_field]
+            ]
+
+        cls.index_stats["indexed"] += len(changed)
+        cls.index_stats["skipped"] += len(docs) - len(changed)
+        return changed
+
+    def index(self):
+        """Index the current object in Solr, if it has changed. If
+        **SOLR_INDEX_BACKGROUND** is enabled, the object is queued with
+        :class:`IndexQueue` to be indexed by the ``index_worker`` manage
+        command instead, so that saving a record does not wait on Solr."""
+        if getattr(settings, "SOLR_INDEX_BACKGROUND", False) and self.pk:
+            IndexQueue.add(type(self), [self.pk])
+            return
+        changed = self.changed_index_data([self.index_data()])
+        if changed:
+            self.solr.update.index(changed)
+        else:
+            logger.debug("Skipped indexing %r; index data is unchanged", self)
+
+    @classmethod
+    def index_items(cls, items, progbar=None, force=False, stream=None):
+        """Index multiple items at once in chunks, skipping any that are
+        unchanged unless `force` is True. Extends
+        :meth:`parasolr.indexing.Indexable.index_items`; returns the total
+        number of items processed, including skipped items.
+
+        If a :class:`SolrUpdateStream` is passed in as `stream`, or if
+        **SOLR_INDEX_STREAM** is enabled in Django settings, changed items
+        are streamed to Solr instead of sent in one update per chunk."""
+        # make sure solr client is initialized (on the base class, as parasolr does)
+        Indexable._init_solr()
+        if stream is None and getattr(settings, "SOLR_INDEX_STREAM", False):
+            stream = SolrUpdateStream(cls.solr)
+        # if this is a queryset, use iterator to get it in chunks
+        # (chunk size is required when using prefetching)
+        if isinstance(items, QuerySet):
+            items = items.iterator(chunk_size=cls.index_chunk_size)
+        # convert lists to an iterator so we don't iterate the same slice over and over
+        else:
+            items = iter(items)
+
+        count = 0
+
+        def changed_chunks():
+            # generate lists of changed index data, one per chunk of items
+            nonlocal count
+            chunk = list(itertools.islice(items, cls.index_chunk_size))
+            while chunk:
+                chunk = cls.prep_index_chunk(chunk)
+                # call index data method if present; otherwise assume item is dict
+                docs = [
+                    i.index_data() if hasattr(i, "index_data") else i for i in chunk
+                ]
+                yield cls.changed_index_data(docs, force=force)
+                count += len(chunk)
+                # update progress bar if one was passed in
+                if progbar:
+                    progbar.update(count)
+                chunk = list(itertools.islice(items, cls.index_chunk_size))
+
+        if stream:
+            stream.index(itertools.chain.from_iterable(changed_chunks()))
+        else:
+            for changed in changed_chunks():
+                if changed:
+                    cls.solr.update.index(changed)
+        return count
+
+
+class SolrUpdateStream:
+    """Streams index documents to the Solr JSON update handler as JSON lines,
+    using chunked transfer encoding, so that neither the documents nor the
+    serialized request body for a full reindex are held in memory at once.
+
+    Documents are sent in a series of update requests of at most
+    `batch_bytes` each (a single document larger than the limit is sent on
+    its own). Defaults to **SOLR_INDEX_BATCH_BYTES** in Django settings;
+    `commit_within` defaults to the commitWithin configured for the Solr client.
+
+    :param solr: :class:`~parasolr.django.SolrClient` to send updates with
+    :param commit_within: milliseconds within which Solr should commit updates
+    :param batch_bytes: maximum size in bytes of each update request
+    """
+
+    def __init__(self, solr, commit_within=None, batch_bytes=None):
+        self.update = solr.update
+        self.commit_within = commit_within or self.update.params.get("commitWithin")
+        self.batch_bytes = batch_bytes or getattr(
+            settings, "SOLR_INDEX_BATCH_BYTES", 10 * 1024 * 1024
+        )
+        #: counts of documents, bytes, and requests sent
+        self.stats = Counter()
+
+    @property
+    def url(self):
+        """Solr update url for JSON documents"""
+        return urljoin("%s/" % self.update.url, "json/docs")
+
+    def index(self, docs):
+        """Send an iterable of index documents to Solr, in as many
+        requests as needed to keep each within the batch size limit.
+        Returns the number of documents sent."""
+        lines = (("%s\n" % json.dumps(doc)).encode() for doc in docs)
+        # the next line to send; held over when it would exceed a batch
+        next_line = next(lines, None)
+        sent = self.stats["docs"]
+
+        def batch():
+            # generate lines for one request, up to the byte limit
+            nonlocal next_line
+            size = 0
+            while next_line is not None and (
+                not size or size + len(next_line) <= self.batch_bytes
+            ):
+                line = next_line
+                size += len(line)
+                self.stats["docs"] += 1
+                self.stats["bytes"] += len(line)
+                yield line
+                next_line = next(lines, None)
+
+        while next_line is not None:
+            self.post(batch())
+        return self.stats["docs"] - sent
+
+    def post(self, body):
+        """Post a generator of request body content to the Solr update
+        handler. Errors are logged, as for other parasolr updates."""
+        params = {"wt": "json"}
+        if self.commit_within:
+            params["commitWithin"] = self.commit_within
+        self.stats["requests"] += 1
+        # passing a generator as data uses chunked transfer encoding
+        response = self.update.session.post(
+            self.url,
+            data=body,
+            params=params,
+            headers={"Content-Type": "application/json"},
+        )
+        if response.status_code == 404:
+            raise SolrConnectionNotFound("404 Not Found: %s" % self.url)
+        if response.status_code != 200:
+            logger.error("POST %s => err: %s", self.url, response.content)
+
+
+class SolrUpdateError(Exception):
+    """Solr responded to an update request with an error"""
+
+
+@contextmanager
+def raise_update_errors(solr):
+    """Context manager to raise :class:`SolrUpdateError` when Solr responds
+    to an update request with an error status, instead of only logging it,
+    as parasolr does, so that callers can tell that records were not indexed.
+
+    :param solr: :class:`~parasolr.django.SolrClient` used for the updates
+    """
+    update = solr.update
+
+    def check_response(response, *args, **kwargs):
+        # only check update requests, not other requests on the same session
+        if response.request.url.startswith(update.url) and response.status_code != 200:
+            raise SolrUpdateError(
+                "Solr update failed (%d): %s" % (response.status_code, response.text)
+            )
+
+    update.session.hooks["response"].append(check_response)
+    try:
+        yield
+    finally:
+        update.session.hooks["response"].remove(check_response)
+
+
+class IndexProfiler(Timerable):
+    """Opt-in profiler for the time and number of database queries spent
+    generating index data, grouped by model and by field family (e.g. dating,
+    footnotes, transcription, images, relations).
+
+    ``index_data`` methods wrap each group of fields in :meth:`section`,
+    which does nothing unless a profiler is active in the current thread.
+    Activate a profiler by using it as a context manager::
+
+        with IndexProfiler() as profiler:
+            profiler.profile(Document, Document.items_to_index()[:100])
+        print(profiler.summary())
+
+    """
+
+    _local = threading.local()
+
+    #: field family for the complete index data of each record
+    total = "total"
+    #: field family for prefetching related data for a chunk of records
+    prefetch = "prefetch"
+
+    def __init__(self):
+        #: calls, elapsed time in seconds, and queries keyed on (model name, family)
+        self.stats = defaultdict(lambda: {"calls": 0, "time": 0.0, "queries": 0})
+
+    def __enter__(self):
+        self._local.profiler = self
+        return self
+
+    def __exit__(self, *exc):
+        self._local.profiler = None
+
+    @classmethod
+    def active(cls):
+        """The profiler active in the current thread, if there is one"""
+        return getattr(cls._local, "profiler", None)
+
+    @classmethod
+    @contextmanager
+    def section(cls, model, family):
+        """Context manager to record time and queries for a group of index
+        fields on a model class or instance, when a profiler is active."""
+        profiler = cls.active()
+        if profiler is None:
+            yield
+            return
+
+        queries = 0
+
+        def count_query(execute, sql, params, many, context):
+            nonlocal queries
+            queries += 1
+            return execute(sql, params, many, context)
+
+        with connection.execute_wrapper(count_query):
+            with profiler.timer(desc=family, to_print=False) as timer:
+                yield
+        model_name = (model if isinstance(model, type) else type(model)).__name__
+        stats = profiler.stats[(model_name, family)]
+        stats["calls"] += 1
+        stats["time"] += timer.elapsed
+        stats["queries"] += queries
+
+    def profile(self, model, items):
+        """Generate index data for the specified items of an indexable model
+        in chunks, as when indexing, and record statistics. Returns the
+        number of items profiled."""
+        items = iter(items)
+        count = 0
+        chunk = list(itertools.islice(items, model.index_chunk_size))
+        while chunk:
+            with self.section(model, self.prefetch):
+                chunk = model.prep_index_chunk(chunk)
+            for item in chunk:
+                with self.section(model, self.total):
+                    item.index_data()
+            count += len(chunk)
+            chunk = list(itertools.islice(items, model.index_chunk_size))
+        return count
+
+    def results(self):
+        """List of dictionaries of statistics for each model and field family,
+        sorted by model and then by time spent, with mean time per call in
+        milliseconds and percentage of the total index data time for the model."""
+        totals = {
+            model: stats["time"]
+            for (model, family), stats in self.stats.items()
+            if family == self.total
+        }
+        results = [
+            {
+                "model": model,
+                "family": family,
+                "calls": stats["calls"],
+                "time": stats["time"],
+                "mean_ms": 1000 * stats["time"] / stats["calls"],
+                "queries": stats["queries"],
+                "percent": (
+                    100 * stats["time"] / totals[model] if totals.get(model) else None
+                ),
+            }
+            for (model, family), stats in self.stats.items()
+        ]
+        return sorted(results, key=lambda r: (r["model"], -r["time"]))
+
+    def summary(self):
+        """Summary table of profiling results, as a string"""
+        lines = [
+            "{:<10} {:<14} {:>7} {:>9} {:>9} {:>8} {:>7}".format(
+                "model", "family", "calls", "time (s)", "mean (ms)", "queries", "%"
+            )
+        ]
+        for result in self.results():
+            lines.append(
+                "{model:<10} {family:<14} {calls:>7,} {time:>9.3f} {mean_ms:>9.2f} "
+                "{queries:>8,} {percent:>7}".format(
+                    **dict(
+                        result,
+                        percent=(
+                            "%.1f" % result["percent"]
+                            if result["percent"] is not None
+                            else "-"
+                        ),
+                    )
+                )
+            )
+        return "\n".join(lines)
@@ -0,0 +1,201 @@
+"""
+**index_worker** is a custom manage command to process queued
+:class:`~geniza.common.models.IndexJob` records and index them in Solr,
+for use when **SOLR_INDEX_BACKGROUND** is enabled in Django settings.
+
+Jobs are claimed in batches with ``SELECT ... FOR UPDATE SKIP LOCKED``, so
+multiple workers can run at the same time without processing the same job.
+Failed jobs are retried with an increasing delay until they reach the
+maximum number of attempts; records are indexed in a savepoint for each
+model, so an error indexing one model does not affect jobs for the others.
+If indexing a model's records fails, they are indexed one at a time, so that
+only jobs for records that can't be indexed are retried. Updates rejected by
+Solr count as failures.
+
+Example usage::
+
+    # run continuously, polling for new jobs
+    python manage.py index_worker
+    # process all waiting jobs and then exit
+    python manage.py index_worker --once
+    # report how many jobs are waiting
+    python manage.py index_worker --status
+
+"""
+
+import time
+from collections import defaultdict
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.db.models import Count
+from django.template.defaultfilters import pluralize
+from django.utils import timezone
+from parasolr.indexing import Indexable
+
+from geniza.common.indexing import raise_update_errors
+from geniza.common.models import IndexJob
+
+
+class Command(BaseCommand):
+    __doc__ = help = __doc__
+
+    #: normal verbosity level
+    v_normal = 1
+    verbosity = v_normal
+
+    #: base delay in seconds before retrying a failed job; doubled on each attempt
+    retry_delay = 30
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=150,
+            help="Number of jobs to claim and index at once (default: %(default)s)",
+        )
+        parser.add_argument(
+            "--max-attempts",
+            type=int,
+            default=5,
+            help="Number of times to try a job before giving up (default: %(default)s)",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=5,
+            help="Seconds to wait when no jobs are available (default: %(default)s)",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Process available jobs and exit instead of polling",
+        )
+        parser.add_argument(
+            "--status",
+            action="store_true",
+            help="Report the number of waiting and failed jobs and exit",
+        )
+
+    def handle(self, *args, **kwargs):
+        self.verbosity = kwargs.get("verbosity", self.v_normal)
+        self.batch_size = kwargs["batch_size"]
+        self.max_attempts = kwargs["max_attempts"]
+
+        if kwargs["status"]:
+            self.report_status()
+            return
+
+        total = 0
+        try:
+            while True:
+                processed = self.process_batch()
+                total += processed
+                if not processed:
+                    if kwargs["once"]:
+                        break
+                    time.sleep(kwargs["sleep"])
+        except KeyboardInterrupt:
+            pass
+
+        if self.verbosity >= self.v_normal:
+            self.stdout.write("Processed %d index job%s" % (total, pluralize(total)))
+
+    def waiting(self):
+        """Jobs that have not reached the maximum number of attempts"""
+        return IndexJob.objects.filter(attempts__lt=self.max_attempts)
+
+    def report_status(self):
+        """Report counts of waiting jobs by content type, and failed jobs"""
+        counts = (
+            self.waiting()
+            .values("content_type__app_label", "content_type__model")
+            .annotate(total=Count("pk"))
+            .order_by("content_type__app_label", "content_type__model")
+        )
+        total = 0
+        for count in counts:
+            self.stdout.write(
+                "%(content_type__app_label)s.%(content_type__model)s: %(total)d" % count
+            )
+            total += count["total"]
+        self.stdout.write("%d job%s waiting" % (total, pluralize(total)))
+        failed = IndexJob.objects.filter(attempts__gte=self.max_attempts).count()
+        if failed:
+            self.stdout.write(
+                self.style.WARNING(
+                    "%d job%s failed after %d attempts"
+                    % (failed, pluralize(failed), self.max_attempts)
+                )
+            )
+
+    def process_batch(self):
+        """Claim a batch of available jobs and index the records, one update
+        per model, falling back to one record at a time if that fails. Jobs
+        are deleted when indexed successfully; jobs that fail are rescheduled.
+        Returns the number of jobs processed."""
+        with transaction.atomic():
+            jobs = list(
+                self.waiting()
+                .filter(available__lte=timezone.now())
+                .select_for_update(skip_locked=True, of=("self",))
+                .select_related("content_type")
+                .order_by("queued")[: self.batch_size]
+            )
+            jobs_by_type = defaultdict(list)
+            for job in jobs:
+                jobs_by_type[job.content_type].append(job)
+
+            for content_type, type_jobs in jobs_by_type.items():
+                model = content_type.model_class()
+                try:
+                    self.index_jobs(model, type_jobs)
+                except Exception as err:
+                    # any error, including bad data, counts as a failed attempt,
+                    # so a job that can't be indexed is eventually given up on
+                    # instead of stopping the worker
+                    if len(type_jobs) == 1:
+                        self.reschedule(type_jobs, err)
+                        continue
+                    # index records one at a time, so that jobs for records
+                    # that can be indexed are not retried with the failing ones
+                    for job in type_jobs:
+                        try:
+                            self.index_jobs(model, [job])
+                        except Exception as job_err:
+                            self.reschedule([job], job_err)
+        return len(jobs)
+
+    def index_jobs(self, model, jobs):
+        """Index the records for a list of jobs for a single model, and
+        delete the jobs. Raises an exception if indexing fails, including
+        when Solr rejects the update."""
+        # make sure solr client is initialized, so responses can be checked
+        Indexable._init_solr()
+        # index in a savepoint, so that database errors from
+        # generating index data don't abort the whole batch
+        with transaction.atomic(), raise_update_errors(model.solr):
+            # records deleted since the job was queued are skipped;
+            # they are removed from the index when they are deleted
+            model.index_items(
+                model.items_to_index().filter(pk__in=[job.object_id for job in jobs])
+            )
+        IndexJob.objects.filter(pk__in=[job.pk for job in jobs]).delete()
+        if self.verbosity > self.v_normal:
+            self.stdout.write(
+                "Indexed %d %s record%s"
+                % (len(jobs), model._meta.verbose_name, pluralize(jobs))
+            )
+
+    def reschedule(self, jobs, err):
+        """Record a failed attempt for the jobs and schedule a retry"""
+        self.stderr.write("Error indexing %d record(s): %s" % (len(jobs), err))
+        now = timezone.now()
+        for job in jobs:
+            job.attempts += 1
+            job.last_error = str(err)
+            job.available = now + timedelta(
+                seconds=self.retry_delay * 2 ** (job.attempts - 1)
+            )
+        IndexJob.objects.bulk_update(jobs, ["attempts", "last_error", "available"])
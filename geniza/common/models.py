@@ -1,8 +1,10 @@
 from functools import cache
 
 from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
 from django.db import models
 from django.db.models.functions.text import Lower
+from django.utils import timezone
 from django.utils.safestring import mark_safe
 from modeltranslation.utils import fallbacks
 
@@ -74,6 +76,52 @@ class UserProfile(models.Model):
         return "User profile for %s" % (self.user)
 
 
+class IndexJob(models.Model):
+    """A request to reindex a single record in Solr, queued by signal
+    handlers and processed in the background by the ``index_worker``
+    manage command. There is at most one job per record; queueing a
+    record that is already waiting updates the existing job."""
+
+    content_type = models.ForeignKey(ContentType, on_delete=models.CASCADE)
+    object_id = models.PositiveIntegerField()
+    #: when the job was (most recently) queued
+    queued = models.DateTimeField(default=timezone.now)
+    #: job should not be processed before this time (used for retries)
+    available = models.DateTimeField(default=timezone.now)
+    #: number of failed attempts to index this record
+    attempts = models.PositiveSmallIntegerField(default=0)
+    last_error = models.TextField(blank=True)
+
+    class Meta:
+        constraints = [
+            models.UniqueConstraint(
+                fields=["content_type", "object_id"], name="unique_index_job"
+            )
+        ]
+        indexes = [models.Index(fields=["available"])]
+
+    def __str__(self):
+        return "Index job for %s %s" % (self.content_type, self.object_id)
+
+    @classmethod
+    def enqueue(cls, model, pks):
+        """Queue jobs to reindex records of the specified model by primary key.
+        Duplicate requests are coalesced into the existing job, which is
+        made available for immediate processing; failed attempts are reset,
+        so that records whose jobs previously failed are indexed again."""
+        content_type = ContentType.objects.get_for_model(model)
+        now = timezone.now()
+        return cls.objects.bulk_create(
+            [
+                cls(content_type=content_type, object_id=pk, queued=now, available=now)
+                for pk in pks
+            ],
+            update_conflicts=True,
+            unique_fields=["content_type", "object_id"],
+            update_fields=["queued", "available", "attempts", "last_error"],
+        )
+
+
 class DisplayLabelMixin:
     """
     Mixin for models with translatable display labels that may differ from names, in
@@ -0,0 +1,227 @@
+"""Caching for Solr query responses and corpus-wide stats, for use on
+public search pages"""
+
+import hashlib
+import json
+import logging
+
+from addict import Dict as AttrDict
+from django.conf import settings
+from django.core.cache import caches
+from parasolr.django import SolrQuerySet
+from parasolr.solr.base import SolrClientException
+from parasolr.solr.client import GroupedResponse, QueryResponse
+
+logger = logging.getLogger(__name__)
+
+
+class CachedSolrClient:
+    """Wrapper for a :class:`~parasolr.django.SolrClient` that caches query
+    responses in a Django cache, keyed on the query parameters and a version
+    for the current state of the Solr index. When the version changes (i.e.,
+    anything is indexed or removed), previously cached responses are no longer
+    used. All other attributes are passed through to the wrapped client, so
+    an instance can be used as the `solr` for a
+    :class:`~parasolr.django.SolrQuerySet`.
+
+    Queries that return results sorted randomly are not cached; counts,
+    facets, and stats for those queries (which request no rows) are cached
+    without the random sort.
+
+    Counts of cache hits and misses are stored in the cache, so that they are
+    shared across processes; see :meth:`stats`.
+
+    :param solr: solr client to wrap
+    :param version: callable that returns the current index version, or
+        None if it cannot be determined (disables caching)
+    :param cache: Django cache alias (default: **SOLR_QUERY_CACHE**)
+    :param timeout: cache timeout in seconds (default: **SOLR_QUERY_CACHE_TIMEOUT**)
+    """
+
+    #: prefix for cache keys
+    key_prefix = "solr-query"
+
+    def __init__(self, solr, version, cache=None, timeout=None):
+        self.solr = solr
+        self.version = version
+        self.cache = caches[cache or settings.SOLR_QUERY_CACHE]
+        self.timeout = timeout or getattr(settings, "SOLR_QUERY_CACHE_TIMEOUT", None)
+
+    def __getattr__(self, attr):
+        # pass through anything other than query to the wrapped client
+        return getattr(self.solr, attr)
+
+    def cache_key(self, version, params):
+        """Cache key for a version and dictionary of query parameters"""
+        digest = hashlib.sha1(
+            json.dumps(params, sort_keys=True, default=str).encode()
+        ).hexdigest()
+        return "%s:%s:%s" % (self.key_prefix, version, digest)
+
+    def query(self, wrap=True, **kwargs):
+        """Return a cached response for the query if there is one; otherwise
+        query Solr and cache the response."""
+        params = dict(kwargs)
+        if "random_" in str(params.get("sort", "")):
+            # random results should not be cached, but sort is irrelevant
+            # when no rows are requested
+            if params.get("rows") != 0:
+                return self.solr.query(wrap=wrap, **kwargs)
+            del params["sort"]
+
+        version = self.version()
+        if version is None:
+            return self.solr.query(wrap=wrap, **kwargs)
+
+        key = self.cache_key(version, params)
+        response = self.cache.get(key)
+        if response is None:
+            logger.debug("Solr query cache miss: %s", key)
+            self.record("misses")
+            response = self.solr.query(wrap=False, **kwargs)
+            if not response:
+                # don't cache errors
+                return None
+            # cache as a plain dictionary, without the wrapping response class
+            response = response.to_dict()
+            self.cache.set(key, response, timeout=self.timeout)
+        else:
+            logger.debug("Solr query cache hit: %s", key)
+            self.record("hits")
+
+        response = AttrDict(response)
+        if not wrap:
+            return response
+        if "grouped" in response:
+            return GroupedResponse(response)
+        return QueryResponse(response)
+
+    def record(self, stat):
+        """Increment a shared hit/miss counter"""
+        key = "%s:stats:%s" % (self.key_prefix, stat)
+        # add is a no-op if the counter already exists
+        self.cache.add(key, 0, timeout=None)
+        try:
+            self.cache.incr(key)
+        except ValueError:
+            # counter was evicted between add and incr
+            self.cache.set(key, 1, timeout=None)
+
+    def stats(self):
+        """Dictionary of cache hit and miss counts and hit ratio"""
+        hits = self.cache.get("%s:stats:hits" % self.key_prefix, 0)
+        misses = self.cache.get("%s:stats:misses" % self.key_prefix, 0)
+        total = hits + misses
+        return {
+            "hits": hits,
+            "misses": misses,
+            "ratio": hits / total if total else None,
+        }
+
+
+class SolrIndexStats:
+    """Corpus-wide values used on public search pages that do not depend on
+    search input (date range stats, unfiltered facet counts, and totals),
+    computed once per index version and stored in a Django cache.
+
+    By default the version is :meth:`index_version`, which covers the whole
+    index and is itself cached for **SOLR_STATS_VERSION_TIMEOUT** seconds,
+    so that most page loads make no Solr requests for these values. Views
+    that already know their own index version can pass it in instead.
+
+    :param version: callable that returns the current index version, or
+        None if it cannot be determined (disables caching)
+    :param cache: Django cache alias (default: **SOLR_QUERY_CACHE**);
+        values are not cached if there is none or it is False
+    :param timeout: cache timeout in seconds (default: **SOLR_QUERY_CACHE_TIMEOUT**)
+    """
+
+    #: prefix for cache keys
+    key_prefix = "solr-stats"
+
+    def __init__(self, version=None, cache=None, timeout=None):
+        self.version = version or self.index_version
+        if cache is None:
+            cache = getattr(settings, "SOLR_QUERY_CACHE", None)
+        self.cache = caches[cache] if cache else None
+        self.timeout = timeout or getattr(settings, "SOLR_QUERY_CACHE_TIMEOUT", None)
+
+    def index_version(self):
+        """Version for the whole index, based on the total number of records
+        and the most recent last modified value; None if Solr returns an
+        error."""
+        key = "%s:version" % self.key_prefix
+        version = self.cache.get(key) if self.cache else None
+        if version is None:
+            sqs = SolrQuerySet().order_by("-last_modified").only("last_modified")
+            try:
+                response = sqs.get_response(rows=1)
+                version = "%d-%s" % (
+                    response.numFound,
+                    response.docs[0]["last_modified"],
+                )
+            except (AttributeError, IndexError, KeyError, SolrClientException) as err:
+                # no response, no results, or a solr error; no version to return
+                logger.error("Failed to retrieve index version: %s" % err)
+                return None
+            if self.cache:
+                self.cache.set(
+                    key,
+                    version,
+                    timeout=getattr(settings, "SOLR_STATS_VERSION_TIMEOUT", 60),
+                )
+        return version
+
+    def get(self, sqs, compute):
+        """Return the value cached for a queryset at the current index
+        version; if there is none, call `compute` with the queryset to
+        generate it and cache the result. Cache keys are based on the
+        queryset's Solr query options. Empty values (e.g. from Solr errors)
+        are not cached."""
+        if not self.cache:
+            return compute(sqs)
+        version = self.version()
+        if version is None:
+            return compute(sqs)
+
+        digest = hashlib.sha1(
+            json.dumps(sqs.query_opts(), sort_keys=True, default=str).encode()
+        ).hexdigest()
+        key = "%s:%s:%s" % (self.key_prefix, version, digest)
+        value = self.cache.get(key)
+        if value is None:
+            logger.debug("Solr stats cache miss: %s", key)
+            value = compute(sqs)
+            if value:
+                self.cache.set(key, value, timeout=self.timeout)
+        return value
+
+    def range_stats(self, queryset_cls, *fields):
+        """Solr stats for the specified fields across all records in a
+        queryset class, as a dictionary keyed on field name."""
+
+        def compute(sqs):
+            stats = sqs.get_stats() or {}
+            return {
+                field: dict(field_stats)
+                for field, field_stats in (stats.get("stats_fields") or {}).items()
+            }
+
+        return self.get(queryset_cls().stats(*fields), compute)
+
+    def facet_counts(self, queryset_cls, *fields):
+        """Unfiltered facet counts for the specified fields across all
+        records in a queryset class, as a dictionary keyed on field name."""
+
+        def compute(sqs):
+            facets = sqs.get_facets() or {}
+            return {
+                field: dict(counts)
+                for field, counts in (facets.get("facet_fields") or {}).items()
+            }
+
+        return self.get(queryset_cls().facet(*fields), compute)
+
+    def count(self, queryset_cls):
+        """Total number of records in a queryset class"""
+        return self.get(queryset_cls(), lambda sqs: sqs.count())
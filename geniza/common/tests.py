@@ -1,19 +1,30 @@
+import json
 import random
 import time
+from datetime import timedelta
+from io import StringIO
 from unittest.mock import MagicMock, Mock, patch
 
 import pytest
+import requests
+from addict import Dict as AttrDict
 from django.conf import settings
 from django.contrib import admin
 from django.contrib.admin.models import LogEntry
 from django.contrib.auth.models import Group, User
+from django.contrib.contenttypes.models import ContentType
 from django.contrib.sites.models import Site
+from django.core.cache import caches
 from django.core.exceptions import ValidationError
-from django.db import connection, models
+from django.core.management import call_command
+from django.db import connection, models, transaction
 from django.db.migrations.executor import MigrationExecutor
 from django.http import HttpResponseRedirect, StreamingHttpResponse
 from django.test import RequestFactory, TestCase, TransactionTestCase, override_settings
 from django.urls import reverse
+from django.utils import timezone
+from parasolr.solr.base import SolrConnectionNotFound
+from parasolr.solr.client import QueryResponse
 from pytest_django.asserts import assertContains
 from taggit.models import Tag
 
@@ -25,9 +36,18 @@ from geniza.common.admin import (
     custom_empty_field_list_filter,
 )
 from geniza.common.fields import NaturalSortField, RangeField, RangeWidget
+from geniza.common.indexing import (
+    IndexDigestMixin,
+    IndexProfiler,
+    IndexQueue,
+    SolrUpdateError,
+    SolrUpdateStream,
+    raise_update_errors,
+)
 from geniza.common.metadata_export import Exporter, LogEntryExporter
 from geniza.common.middleware import PublicLocaleMiddleware
-from geniza.common.models import UserProfile
+from geniza.common.models import IndexJob, UserProfile
+from geniza.common.solr_cache import CachedSolrClient, SolrIndexStats
 from geniza.common.utils import (
     Echo,
     Timer,
@@ -466,6 +486,630 @@ def test_timer():
     assert timer_desc3 in fake_printed
 
 
+@pytest.mark.django_db
+class TestIndexQueue:
+    @patch.object(Document, "index_items")
+    def test_add_flush(
+        self, mock_indexitems, document, join, django_capture_on_commit_callbacks
+    ):
+        # discard anything queued by fixture creation
+        IndexQueue.clear()
+        mock_indexitems.return_value = 2
+        with django_capture_on_commit_callbacks(execute=True) as callbacks:
+            IndexQueue.add(Document, [document.pk])
+            IndexQueue.add(Document, [document.pk, join.pk])
+            IndexQueue.add(Document, [])
+            # nothing indexed until the transaction is committed
+            mock_indexitems.assert_not_called()
+        # flush registered once for the transaction
+        assert len(callbacks) == 1
+        # de-duplicated records indexed in a single call
+        assert mock_indexitems.call_count == 1
+        indexed = mock_indexitems.call_args[0][0]
+        assert set(indexed) == {document, join}
+        assert IndexQueue.stats["requested"] == 3
+        assert IndexQueue.stats["indexed"] == 2
+        assert IndexQueue.avoided() == 1
+        # queue is empty after flush
+        assert not IndexQueue.pending()
+        assert IndexQueue.flush() == 0
+        # a new flush is registered once the previous one has run
+        with django_capture_on_commit_callbacks(execute=False) as callbacks:
+            IndexQueue.add(Document, [document.pk])
+        assert len(callbacks) == 1
+        IndexQueue.clear()
+
+    @patch.object(Document, "index_items")
+    def test_add_rolled_back(
+        self, mock_indexitems, document, join, django_capture_on_commit_callbacks
+    ):
+        # simulate a record queued in a transaction that was rolled back,
+        # so no flush is scheduled
+        IndexQueue.pending()[Document].add(join.pk)
+        with django_capture_on_commit_callbacks(execute=True):
+            with patch.object(IndexQueue, "flush_pending", return_value=False):
+                IndexQueue.add(Document, [document.pk])
+        # stale record should be discarded
+        assert list(mock_indexitems.call_args[0][0]) == [document]
+
+    @patch.object(Document, "index_items")
+    def test_add_savepoint_rolled_back(
+        self, mock_indexitems, document, join, django_capture_on_commit_callbacks
+    ):
+        IndexQueue.clear()
+        with django_capture_on_commit_callbacks(execute=True) as callbacks:
+            with pytest.raises(ValueError):
+                with transaction.atomic():
+                    IndexQueue.add(Document, [join.pk])
+                    assert IndexQueue.flush_pending()
+                    raise ValueError
+            # flush registered in the savepoint was discarded with it
+            assert not IndexQueue.flush_pending()
+            IndexQueue.add(Document, [document.pk])
+        assert len(callbacks) == 1
+        assert list(mock_indexitems.call_args[0][0]) == [document]
+
+    @override_settings(SOLR_INDEX_BACKGROUND=True)
+    @patch.object(Document, "index_items")
+    def test_add_background(
+        self, mock_indexitems, document, django_capture_on_commit_callbacks
+    ):
+        IndexJob.objects.all().delete()
+        with django_capture_on_commit_callbacks(execute=True):
+            IndexQueue.add(Document, [document.pk])
+            IndexQueue.add(Document, [document.pk])
+        # queued as a single job instead of indexed
+        mock_indexitems.assert_not_called()
+        assert IndexJob.objects.get().object_id == document.pk
+
+
+def realtime_get(docs):
+    """Solr real-time get response for a list of documents"""
+    return AttrDict({"response": {"numFound": len(docs), "start": 0, "docs": docs}})
+
+
+@pytest.mark.django_db
+class TestIndexDigestMixin:
+    def test_index_data_digest(self):
+        digest = IndexDigestMixin.index_data_digest({"id": "doc.1", "a": [1, 2]})
+        # key order does not matter
+        assert digest == IndexDigestMixin.index_data_digest(
+            {"a": [1, 2], "id": "doc.1"}
+        )
+        assert digest != IndexDigestMixin.index_data_digest({"id": "doc.1", "a": [2]})
+
+    def test_changed_index_data(self):
+        docs = [{"id": "doc.1", "a": 1}, {"id": "doc.2", "a": 2}]
+        digest = IndexDigestMixin.index_data_digest(docs[0])
+        with patch.object(Document, "solr") as mock_solr:
+            # first doc indexed with the same data, second not indexed
+            mock_solr.make_request.return_value = realtime_get(
+                [{"id": "doc.1", "index_digest_s": digest}]
+            )
+            Document.index_stats.clear()
+            changed = Document.changed_index_data(docs)
+            assert changed == [docs[1]]
+            assert docs[0]["index_digest_s"] == digest
+            # compared using real-time get, which includes uncommitted updates
+            mock_solr.build_url.assert_called_with(
+                mock_solr.solr_url, mock_solr.collection, "get"
+            )
+            request_params = mock_solr.make_request.call_args[1]["params"]
+            assert request_params["ids"] == "doc.1,doc.2"
+            assert request_params["fl"] == "id,index_digest_s"
+            assert Document.index_stats["indexed"] == 1
+            assert Document.index_stats["skipped"] == 1
+
+            # existing digest should not affect the new one
+            assert Document.changed_index_data([docs[0]]) == []
+
+            # force: everything returned without checking solr
+            mock_solr.reset_mock()
+            assert Document.changed_index_data(docs, force=True) == docs
+            mock_solr.make_request.assert_not_called()
+
+            # request failed: everything returned
+            mock_solr.make_request.return_value = None
+            assert Document.changed_index_data(docs) == docs
+
+    def test_index(self, document):
+        with patch.object(Document, "solr") as mock_solr:
+            mock_solr.make_request.return_value = realtime_get([])
+            document.index()
+            indexed = mock_solr.update.index.call_args[0][0]
+            assert indexed[0]["id"] == document.index_id()
+            assert "index_digest_s" in indexed[0]
+
+            # unchanged: not sent to solr
+            mock_solr.reset_mock()
+            mock_solr.make_request.return_value = realtime_get(indexed)
+            document.index()
+            mock_solr.update.index.assert_not_called()
+
+    @override_settings(SOLR_INDEX_BACKGROUND=True)
+    def test_index_background(self, document):
+        IndexJob.objects.all().delete()
+        with patch.object(Document, "solr") as mock_solr:
+            document.index()
+            # queued for the index worker instead of sent to solr
+            mock_solr.update.index.assert_not_called()
+        assert IndexJob.objects.get().object_id == document.pk
+
+    def test_index_items(self, document, join):
+        with patch.object(Document, "solr") as mock_solr:
+            mock_solr.make_request.return_value = realtime_get([])
+            assert Document.index_items(Document.objects.all()) == 2
+            indexed = mock_solr.update.index.call_args[0][0]
+            assert len(indexed) == 2
+
+            # unchanged records are counted but not sent
+            mock_solr.reset_mock()
+            mock_solr.make_request.return_value = realtime_get([indexed[0]])
+            progbar = Mock()
+            assert Document.index_items(Document.objects.all(), progbar=progbar) == 2
+            assert mock_solr.update.index.call_args[0][0] == [indexed[1]]
+            progbar.update.assert_called_with(2)
+
+            # all unchanged: no update
+            mock_solr.reset_mock()
+            mock_solr.make_request.return_value = realtime_get(indexed)
+            Document.index_items([document, join])
+            mock_solr.update.index.assert_not_called()
+            # unless forced
+            Document.index_items([document, join], force=True)
+            assert len(mock_solr.update.index.call_args[0][0]) == 2
+
+
+@pytest.mark.django_db
+class TestIndexProfiler:
+    def test_section_inactive(self, document):
+        assert IndexProfiler.active() is None
+        with IndexProfiler.section(document, "dating"):
+            pass
+        # nothing recorded when not profiling
+        profiler = IndexProfiler()
+        assert not profiler.stats
+
+    def test_section(self, document):
+        with IndexProfiler() as profiler:
+            assert IndexProfiler.active() == profiler
+            with IndexProfiler.section(document, "dating"):
+                list(Document.objects.all())
+                list(Document.objects.all())
+            with IndexProfiler.section(Document, "dating"):
+                pass
+        assert IndexProfiler.active() is None
+        stats = profiler.stats[("Document", "dating")]
+        assert stats["calls"] == 2
+        assert stats["queries"] == 2
+        assert stats["time"] > 0
+
+    def test_profile(self, document, join):
+        with IndexProfiler() as profiler:
+            assert profiler.profile(Document, Document.items_to_index()) == 2
+        assert profiler.stats[("Document", IndexProfiler.prefetch)]["calls"] == 1
+        assert profiler.stats[("Document", IndexProfiler.total)]["calls"] == 2
+        families = {family for (model, family) in profiler.stats.keys()}
+        for family in ["dating", "footnotes", "transcription", "images", "relations"]:
+            assert family in families
+
+        results = profiler.results()
+        # sorted by time spent
+        assert [r["time"] for r in results] == sorted(
+            [r["time"] for r in results], reverse=True
+        )
+        total = [r for r in results if r["family"] == IndexProfiler.total][0]
+        assert total["percent"] == 100
+        assert all(r["model"] == "Document" for r in results)
+        assert all(r["calls"] == 2 for r in results if r["family"] == "dating")
+        # json serializable
+        json.dumps(results)
+
+        summary = profiler.summary()
+        assert summary.splitlines()[0].split()[:3] == ["model", "family", "calls"]
+        assert "transcription" in summary
+
+
+class TestSolrUpdateStream:
+    def mock_solr(self, status_code=200):
+        solr = Mock()
+        solr.update.url = "http://localhost:8983/solr/geniza/update"
+        solr.update.params = {"commitWithin": 750}
+        solr.bodies = []
+
+        def post(url, data, **kwargs):
+            # read the streamed body, as requests does
+            solr.bodies.append(b"".join(data))
+            return Mock(status_code=status_code, content=b"error")
+
+        solr.update.session.post.side_effect = post
+        return solr
+
+    def test_init(self):
+        solr = self.mock_solr()
+        stream = SolrUpdateStream(solr)
+        assert stream.commit_within == 750
+        assert stream.batch_bytes == settings.SOLR_INDEX_BATCH_BYTES
+        assert stream.url == "http://localhost:8983/solr/geniza/update/json/docs"
+        stream = SolrUpdateStream(solr, commit_within=5000, batch_bytes=100)
+        assert stream.commit_within == 5000
+        assert stream.batch_bytes == 100
+
+    def test_index(self):
+        solr = self.mock_solr()
+        stream = SolrUpdateStream(solr)
+        docs = [{"id": "doc.%d" % i} for i in range(3)]
+        assert stream.index(iter(docs)) == 3
+        # sent as json lines in a single request
+        assert solr.update.session.post.call_count == 1
+        assert solr.bodies[0].decode().splitlines() == [json.dumps(d) for d in docs]
+        args, kwargs = solr.update.session.post.call_args
+        assert args[0] == stream.url
+        assert kwargs["params"] == {"wt": "json", "commitWithin": 750}
+        assert kwargs["headers"] == {"Content-Type": "application/json"}
+        assert stream.stats["docs"] == 3
+        assert stream.stats["bytes"] == len(solr.bodies[0])
+
+        # nothing to send: no request
+        assert stream.index([]) == 0
+        assert solr.update.session.post.call_count == 1
+
+    def test_index_batch_bytes(self):
+        solr = self.mock_solr()
+        docs = [{"id": "doc.%d" % i} for i in range(5)]
+        line_size = len(json.dumps(docs[0])) + 1
+        stream = SolrUpdateStream(solr, batch_bytes=line_size * 2)
+        assert stream.index(docs) == 5
+        # two documents per request
+        assert [len(body.splitlines()) for body in solr.bodies] == [2, 2, 1]
+        assert stream.stats["requests"] == 3
+
+        # documents larger than the limit are sent on their own
+        solr = self.mock_solr()
+        stream = SolrUpdateStream(solr, batch_bytes=5)
+        assert stream.index(docs[:2]) == 2
+        assert [len(body.splitlines()) for body in solr.bodies] == [1, 1]
+
+    def test_index_errors(self, caplog):
+        stream = SolrUpdateStream(self.mock_solr(status_code=400))
+        stream.index([{"id": "doc.1"}])
+        assert "err: b'error'" in caplog.text
+
+        stream = SolrUpdateStream(self.mock_solr(status_code=404))
+        with pytest.raises(SolrConnectionNotFound):
+            stream.index([{"id": "doc.1"}])
+
+    @pytest.mark.django_db
+    def test_index_items(self, document, join):
+        solr = self.mock_solr()
+        with patch.object(Document, "solr") as mock_solr:
+            mock_solr.make_request.return_value = realtime_get([])
+            stream = SolrUpdateStream(solr)
+            assert Document.index_items(Document.objects.all(), stream=stream) == 2
+            # streamed instead of sent in chunks
+            mock_solr.update.index.assert_not_called()
+            assert stream.stats["docs"] == 2
+            indexed = [json.loads(line) for line in solr.bodies[0].splitlines()]
+            assert {doc["id"] for doc in indexed} == {
+                document.index_id(),
+                join.index_id(),
+            }
+
+            # stream created automatically when enabled in settings
+            with override_settings(SOLR_INDEX_STREAM=True):
+                with patch.object(SolrUpdateStream, "index") as mock_index:
+                    Document.index_items([document], force=True)
+                    mock_index.assert_called_once()
+                    mock_solr.update.index.assert_not_called()
+
+
+def test_raise_update_errors():
+    solr = Mock()
+    solr.update.url = "http://localhost:8983/solr/geniza/update"
+    solr.update.session = requests.Session()
+    adapter = Mock()
+    solr.update.session.mount("http://", adapter)
+
+    def response(url, status_code):
+        resp = requests.Response()
+        resp.status_code = status_code
+        resp._content = b"error"
+        resp.request = requests.Request("POST", url).prepare()
+        adapter.send.return_value = resp
+
+    response(solr.update.url + "/json/docs", 400)
+    with raise_update_errors(solr):
+        with pytest.raises(SolrUpdateError, match=r"Solr update failed \(400\): error"):
+            solr.update.session.post(solr.update.url + "/json/docs")
+        # other requests on the session are not checked
+        response("http://localhost:8983/solr/geniza/get", 400)
+        solr.update.session.post("http://localhost:8983/solr/geniza/get")
+    # errors are only raised within the context manager
+    response(solr.update.url, 400)
+    solr.update.session.post(solr.update.url)
+    assert not solr.update.session.hooks["response"]
+
+
+class TestCachedSolrClient:
+    def setup_method(self):
+        caches["default"].clear()
+
+    def mock_solr(self, num_found=2):
+        solr = Mock()
+        solr.query.return_value = AttrDict(
+            {
+                "responseHeader": {"params": {"q": "*:*"}},
+                "response": {"numFound": num_found, "docs": [{"id": "doc.1"}]},
+            }
+        )
+        return solr
+
+    def test_query(self):
+        solr = self.mock_solr()
+        cached_solr = CachedSolrClient(solr, version=lambda: "1-2024")
+        response = cached_solr.query(q="*:*", rows=10)
+        # queried unwrapped, returned as a query response
+        solr.query.assert_called_once_with(wrap=False, q="*:*", rows=10)
+        assert isinstance(response, QueryResponse)
+        assert response.numFound == 2
+        assert response.docs == [{"id": "doc.1"}]
+
+        # same query: cached
+        response = cached_solr.query(q="*:*", rows=10)
+        assert solr.query.call_count == 1
+        assert response.numFound == 2
+        # unwrapped response from the cache
+        assert cached_solr.query(q="*:*", rows=10, wrap=False).response.numFound == 2
+        assert solr.query.call_count == 1
+        assert cached_solr.stats() == {"hits": 2, "misses": 1, "ratio": 2 / 3}
+
+        # different parameters: not cached
+        cached_solr.query(q="*:*", rows=20)
+        assert solr.query.call_count == 2
+
+        # new index version: not cached
+        cached_solr.version = lambda: "2-2024"
+        cached_solr.query(q="*:*", rows=10)
+        assert solr.query.call_count == 3
+
+    def test_query_not_cached(self):
+        solr = self.mock_solr()
+        # no index version
+        cached_solr = CachedSolrClient(solr, version=lambda: None)
+        cached_solr.query(q="*:*")
+        cached_solr.query(q="*:*")
+        assert solr.query.call_count == 2
+        solr.query.assert_called_with(wrap=True, q="*:*")
+
+        # random sort with results
+        cached_solr = CachedSolrClient(solr, version=lambda: "1-2024")
+        cached_solr.query(q="*:*", sort="random_1234 asc")
+        cached_solr.query(q="*:*", sort="random_1234 asc")
+        assert solr.query.call_count == 4
+        # random sort without results: cached regardless of seed
+        cached_solr.query(q="*:*", sort="random_1234 asc", rows=0)
+        cached_solr.query(q="*:*", sort="random_5678 asc", rows=0)
+        assert solr.query.call_count == 5
+
+        # errors are not cached
+        solr.query.return_value = None
+        assert cached_solr.query(q="foo") is None
+        assert cached_solr.query(q="foo") is None
+        assert solr.query.call_count == 7
+
+    def test_passthrough(self):
+        solr = self.mock_solr()
+        cached_solr = CachedSolrClient(solr, version=lambda: "1-2024")
+        assert cached_solr.update == solr.update
+        assert cached_solr.schema == solr.schema
+
+    def test_stats(self):
+        cached_solr = CachedSolrClient(self.mock_solr(), version=lambda: "1-2024")
+        assert cached_solr.stats() == {"hits": 0, "misses": 0, "ratio": None}
+
+
+class TestSolrIndexStats:
+    def setup_method(self):
+        caches["default"].clear()
+
+    def mock_queryset_cls(self):
+        sqs_cls = Mock()
+        sqs = sqs_cls.return_value
+        for method in ["stats", "facet"]:
+            getattr(sqs, method).return_value = sqs
+        sqs.query_opts.return_value = {"q": "*:*", "fq": ["item_type_s:person"]}
+        sqs.get_stats.return_value = {
+            "stats_fields": {"start_dating_i": {"min": 10380101.0, "max": 10421231.0}}
+        }
+        sqs.get_facets.return_value = AttrDict(
+            {"facet_fields": {"gender": {"Female": 1, "Male": 2}}}
+        )
+        sqs.count.return_value = 3
+        return sqs_cls
+
+    def test_range_stats(self):
+        sqs_cls = self.mock_queryset_cls()
+        stats = SolrIndexStats(version=lambda: "1-2024", cache="default")
+        expected = {"start_dating_i": {"min": 10380101.0, "max": 10421231.0}}
+        assert stats.range_stats(sqs_cls, "start_dating_i") == expected
+        sqs_cls.return_value.stats.assert_called_with("start_dating_i")
+        # cached for the same version
+        assert stats.range_stats(sqs_cls, "start_dating_i") == expected
+        assert sqs_cls.return_value.get_stats.call_count == 1
+        # new version: not cached
+        stats.version = lambda: "2-2024"
+        stats.range_stats(sqs_cls, "start_dating_i")
+        assert sqs_cls.return_value.get_stats.call_count == 2
+
+        # errors are not cached
+        sqs_cls.return_value.get_stats.return_value = {}
+        stats.version = lambda: "3-2024"
+        assert stats.range_stats(sqs_cls, "start_dating_i") == {}
+        assert stats.range_stats(sqs_cls, "start_dating_i") == {}
+        assert sqs_cls.return_value.get_stats.call_count == 4
+
+    def test_facet_counts(self):
+        sqs_cls = self.mock_queryset_cls()
+        stats = SolrIndexStats(version=lambda: "1-2024", cache="default")
+        expected = {"gender": {"Female": 1, "Male": 2}}
+        assert stats.facet_counts(sqs_cls, "gender") == expected
+        sqs_cls.return_value.facet.assert_called_with("gender")
+        assert stats.facet_counts(sqs_cls, "gender") == expected
+        assert sqs_cls.return_value.get_facets.call_count == 1
+
+    def test_count(self):
+        sqs_cls = self.mock_queryset_cls()
+        stats = SolrIndexStats(version=lambda: "1-2024", cache="default")
+        assert stats.count(sqs_cls) == 3
+        assert stats.count(sqs_cls) == 3
+        assert sqs_cls.return_value.count.call_count == 1
+
+    def test_not_cached(self):
+        sqs_cls = self.mock_queryset_cls()
+        # no cache
+        stats = SolrIndexStats(version=lambda: "1-2024", cache=False)
+        stats.count(sqs_cls)
+        stats.count(sqs_cls)
+        assert sqs_cls.return_value.count.call_count == 2
+        # no index version
+        stats = SolrIndexStats(version=lambda: None, cache="default")
+        stats.count(sqs_cls)
+        stats.count(sqs_cls)
+        assert sqs_cls.return_value.count.call_count == 4
+
+    @patch("geniza.common.solr_cache.SolrQuerySet")
+    def test_index_version(self, mock_sqs_cls):
+        mock_sqs = mock_sqs_cls.return_value
+        for method in ["order_by", "only"]:
+            getattr(mock_sqs, method).return_value = mock_sqs
+        mock_sqs.get_response.return_value.docs = [
+            {"last_modified": "2024-01-02T03:04:05Z"}
+        ]
+        mock_sqs.get_response.return_value.numFound = 12
+        stats = SolrIndexStats(cache="default")
+        assert stats.version == stats.index_version
+        assert stats.index_version() == "12-2024-01-02T03:04:05Z"
+        mock_sqs.order_by.assert_called_with("-last_modified")
+        mock_sqs.get_response.assert_called_with(rows=1)
+        # version is cached
+        assert stats.index_version() == "12-2024-01-02T03:04:05Z"
+        assert mock_sqs.get_response.call_count == 1
+
+        # no results: no version
+        caches["default"].clear()
+        mock_sqs.get_response.return_value.docs = []
+        assert stats.index_version() is None
+
+
+@pytest.mark.django_db
+class TestIndexJob:
+    def test_str(self, document):
+        job = IndexJob(
+            content_type=ContentType.objects.get_for_model(Document),
+            object_id=document.pk,
+        )
+        assert str(job) == "Index job for Corpus | document %d" % document.pk
+
+    def test_enqueue(self, document, join):
+        IndexJob.objects.all().delete()
+        IndexJob.enqueue(Document, [document.pk, join.pk])
+        assert IndexJob.objects.count() == 2
+        # simulate a failed attempt
+        job = IndexJob.objects.get(object_id=document.pk)
+        job.attempts = 5
+        job.last_error = "Solr unavailable"
+        job.available = job.available + timedelta(hours=1)
+        job.save()
+        # queueing again should update the existing job
+        IndexJob.enqueue(Document, [document.pk])
+        assert IndexJob.objects.count() == 2
+        requeued = IndexJob.objects.get(object_id=document.pk)
+        assert requeued.queued > job.queued
+        assert requeued.available < job.available
+        # failed attempts are reset, so the record is indexed again
+        assert requeued.attempts == 0
+        assert requeued.last_error == ""
+
+
+@pytest.mark.django_db
+class TestIndexWorker:
+    def setup_method(self):
+        IndexJob.objects.all().delete()
+
+    @patch.object(Document, "index_items")
+    def test_process(self, mock_indexitems, document, join):
+        IndexJob.enqueue(Document, [document.pk, join.pk])
+        stdout = StringIO()
+        call_command("index_worker", "--once", stdout=stdout)
+        assert mock_indexitems.call_count == 1
+        assert set(mock_indexitems.call_args[0][0]) == {document, join}
+        assert not IndexJob.objects.exists()
+        assert "Processed 2 index jobs" in stdout.getvalue()
+
+    @patch.object(Document, "index_items")
+    def test_process_error(self, mock_indexitems, document):
+        mock_indexitems.side_effect = requests.exceptions.ConnectionError
+        IndexJob.enqueue(Document, [document.pk])
+        stderr = StringIO()
+        call_command("index_worker", "--once", stdout=StringIO(), stderr=stderr)
+        assert "Error indexing 1 record(s)" in stderr.getvalue()
+        # job should be kept and rescheduled
+        job = IndexJob.objects.get()
+        assert job.attempts == 1
+        assert job.available > timezone.now()
+        # not available yet, so nothing to process on the next run
+        mock_indexitems.reset_mock()
+        call_command("index_worker", "--once", stdout=StringIO())
+        mock_indexitems.assert_not_called()
+
+    @patch.object(Document, "index_items")
+    def test_process_data_error(self, mock_indexitems, document, join):
+        # errors generating index data are recorded as failed attempts
+        mock_indexitems.side_effect = Document.DoesNotExist("missing")
+        IndexJob.enqueue(Document, [document.pk, join.pk])
+        stderr = StringIO()
+        call_command("index_worker", "--once", stdout=StringIO(), stderr=stderr)
+        # indexed again one at a time, each failing on its own
+        assert mock_indexitems.call_count == 3
+        assert stderr.getvalue().count("Error indexing 1 record(s): missing") == 2
+        assert all(job.attempts == 1 for job in IndexJob.objects.all())
+        assert IndexJob.objects.first().last_error == "missing"
+
+    @patch.object(Document, "index_items")
+    def test_process_partial_error(self, mock_indexitems, document, join):
+        # one record that can't be indexed doesn't fail the other jobs
+        def index_items(items):
+            if join in items:
+                raise Document.DoesNotExist("missing")
+
+        mock_indexitems.side_effect = index_items
+        IndexJob.enqueue(Document, [document.pk, join.pk])
+        call_command("index_worker", "--once", stdout=StringIO(), stderr=StringIO())
+        job = IndexJob.objects.get()
+        assert job.object_id == join.pk
+        assert job.attempts == 1
+
+    @patch.object(Document, "index_items")
+    def test_process_rejected(self, mock_indexitems, document):
+        # updates rejected by solr are rescheduled, not deleted
+        mock_indexitems.side_effect = SolrUpdateError("Solr update failed (400): bad")
+        IndexJob.enqueue(Document, [document.pk])
+        call_command("index_worker", "--once", stdout=StringIO(), stderr=StringIO())
+        job = IndexJob.objects.get()
+        assert job.attempts == 1
+        assert job.last_error == "Solr update failed (400): bad"
+
+    def test_status(self, document, join):
+        IndexJob.enqueue(Document, [document.pk, join.pk])
+        IndexJob.objects.filter(object_id=join.pk).update(attempts=5)
+        stdout = StringIO()
+        call_command("index_worker", "--status", stdout=stdout)
+        output = stdout.getvalue()
+        assert "corpus.document: 1" in output
+        assert "1 job waiting" in output
+        assert "1 job failed after 5 attempts" in output
+
+
 @pytest.mark.django_db
 def test_logentry_exporter_data(document):
     logentry_exporter = LogEntryExporter()
@@ -3,7 +3,17 @@
 # between modules - if you import just the top-level fixture (e.g. "events"),
 # it fails to find the fixture dependencies, and so on all the way down. For
 # now this does what we want, although it pollutes the namespace somewhat
+import pytest
+from django.core.cache import caches
+
 from geniza.annotations.conftest import *
 from geniza.corpus.tests.conftest import *
 from geniza.entities.conftest import *
 from geniza.footnotes.conftest import *
+
+
+@pytest.fixture(autouse=True)
+def clear_default_cache():
+    """Clear the default cache before each test, so that tests that enable
+    Solr response or manifest caching don't use values cached by others"""
+    caches["default"].clear()
@@ -43,6 +43,7 @@ from geniza.corpus.models import (
     Provenance,
     TextBlock,
 )
+from geniza.corpus.solr_filter import filter_by_solr
 from geniza.corpus.solr_queryset import DocumentSolrQuerySet
 from geniza.corpus.views import DocumentMerge
 from geniza.entities.admin import PersonInline, PlaceInline
@@ -325,14 +326,8 @@ class DateListFilter(TextInputListFilter):
                 else "document_dating_dr"
             )
             date_filter_opts = {date_field: date_filter}
-            sqs = sqs.filter(**date_filter_opts).only("pgpid").get_results(rows=100000)
-
-            # filter queryset by id if there are results
-            pks = [r["pgpid"] for r in sqs]
-            if sqs:
-                queryset = queryset.filter(pk__in=pks)
-            else:
-                queryset = queryset.none()
+            # filter queryset by id; empty if there are no results
+            queryset = filter_by_solr(queryset, sqs.filter(**date_filter_opts))
             if not (DocumentDateMixin.re_date_format.match(date)):
                 messages.error(
                     request, "Dates must be in the format YYYY-MM-DD or YYYY."
@@ -642,19 +637,13 @@ class DocumentAdmin(
         elif search_term:
             # - use AND instead of OR to get smaller result sets, more
             #  similar to default admin search behavior
-            # - return pks for all matching records
-            sqs = (
-                DocumentSolrQuerySet()
-                .admin_search(search_term)
-                .only("pgpid")
-                .get_results(rows=100000)
+            # - filter queryset by id for all matching records, ordered
+            #  by relevance; empty if there are no results
+            queryset = filter_by_solr(
+                queryset,
+                DocumentSolrQuerySet().admin_search(search_term),
+                relevance=True,
             )
-            pks = [r["pgpid"] for r in sqs]
-            # filter queryset by id if there are results
-            if sqs:
-                queryset = queryset.filter(pk__in=pks)
-            else:
-                queryset = queryset.none()
 
         # return queryset, use distinct not needed
         return queryset, False
@@ -806,7 +795,7 @@ class DocumentTypeAdmin(TabbedTranslationAdmin, admin.ModelAdmin):
 class FragmentAdmin(admin.ModelAdmin):
     list_display = ("shelfmark", "collection_display", "url", "is_multifragment")
     search_fields = ("shelfmark", "old_shelfmarks", "notes", "needs_review")
-    readonly_fields = ("created", "last_modified", "iiif_provenance")
+    readonly_fields = ("created", "last_modified", "iiif_provenance", "manifest_status")
     list_filter = (
         ("url", custom_empty_field_list_filter("IIIF image", "Has image", "No image")),
         (
@@ -822,6 +811,7 @@ class FragmentAdmin(admin.ModelAdmin):
         ("shelfmark", "old_shelfmarks"),
         "collection",
         ("url", "iiif_url"),
+        "manifest_status",
         "is_multifragment",
         "provenance_display",
         "material_support",
@@ -1,5 +1,5 @@
 from django.apps import AppConfig
-from django.db.models.signals import m2m_changed, pre_save
+from django.db.models.signals import m2m_changed, post_save, pre_delete, pre_save
 
 
 class CorpusAppConfig(AppConfig):
@@ -9,10 +9,24 @@ class CorpusAppConfig(AppConfig):
         # import and connect signal handlers for Solr indexing
         from parasolr.django.signals import IndexableSignalHandler
 
-        from geniza.corpus.models import TagSignalHandlers
+        from geniza.corpus.models import DocumentSignalHandlers, TagSignalHandlers
+        from geniza.corpus.signals import LOGGED_DELETIONS, log_related_deletion
 
         pre_save.connect(TagSignalHandlers.unidecode_tag, sender="taggit.Tag")
         m2m_changed.connect(
             TagSignalHandlers.tagged_item_change, sender="taggit.TaggedItem"
         )
+        # keep precomputed document image sequences up to date
+        for sender in ["corpus.TextBlock", "annotations.Annotation"]:
+            post_save.connect(
+                DocumentSignalHandlers.related_image_change, sender=sender
+            )
+            pre_delete.connect(
+                DocumentSignalHandlers.related_image_change, sender=sender
+            )
+        # record which indexed records deleted related records belonged to,
+        # for incremental reindexing; connected separately from indexing
+        # signals, so that deletions are recorded when indexing is disconnected
+        for sender in LOGGED_DELETIONS:
+            pre_delete.connect(log_related_deletion, sender=sender)
         return super().ready()
@@ -0,0 +1,195 @@
+"""Balance and format fragments of HTML, such as Solr highlight snippets,
+in a single pass without building a document tree"""
+
+import html
+import re
+
+#: tags whose content is output as-is, without added whitespace
+PRESERVE_WHITESPACE_TAGS = {"li", "em"}
+
+#: tags that never have content or closing tags
+VOID_TAGS = {
+    "area",
+    "base",
+    "br",
+    "col",
+    "embed",
+    "hr",
+    "img",
+    "input",
+    "keygen",
+    "link",
+    "menuitem",
+    "meta",
+    "param",
+    "source",
+    "track",
+    "wbr",
+    "basefont",
+    "bgsound",
+    "command",
+    "frame",
+    "image",
+    "isindex",
+    "nextid",
+    "spacer",
+}
+
+#: string used to indent each level of nested tags
+INDENT = " "
+
+# comments, closing tags, and opening tags (with attributes, which may
+# contain > inside quotes); anything else between tags is text
+TOKEN_RE = re.compile(
+    r"<!--(?P<comment>.*?)-->"
+    r"|</(?P<end>[a-zA-Z][^\t\n\r\f />]*)[^>]*>"
+    r"|<(?P<start>[a-zA-Z][^\t\n\r\f />]*)"
+    r"(?P<attrs>(?:[^>\"']|\"[^\"]*\"|'[^']*')*)>",
+    flags=re.DOTALL,
+)
+ATTR_RE = re.compile(
+    r"([^\s/>=][^\s/>=]*)(?:\s*=\s*(\"[^\"]*\"|'[^']*'|[^\s>]*))?",
+)
+# a tag cut off at the end of a fragment
+INCOMPLETE_TAG_RE = re.compile(r"<(?:/?[a-zA-Z]|!--)[^>]*$")
+
+
+def _escape(text):
+    """Escape special characters in text for output"""
+    return text.replace("&", "&amp;").replace("<", "&lt;").replace(">", "&gt;")
+
+
+def _format_start_tag(name, attrs):
+    """Render an opening tag with normalized attributes"""
+    values = {}
+    for key, value in ATTR_RE.findall(attrs):
+        if value[:1] in ("'", '"'):
+            value = value[1:-1]
+        value = _escape(html.unescape(value))
+        if key.lower() == "class":
+            value = " ".join(value.split())
+        # later duplicate attributes replace earlier ones
+        values[key.lower()] = value
+
+    attr_strings = []
+    for key, value in sorted(values.items()):
+        quote = '"'
+        if '"' in value:
+            if "'" in value:
+                value = value.replace('"', "&quot;")
+            else:
+                quote = "'"
+        attr_strings.append("%s=%s%s%s" % (key, quote, value, quote))
+    return "<%s%s%s>" % (
+        name,
+        "".join(" %s" % attr for attr in attr_strings),
+        "/" if name in VOID_TAGS else "",
+    )
+
+
+def balance_html(html_snippet):
+    """Balance and pretty-print a fragment of HTML. Closing tags with no
+    matching open tag are dropped, tags left open at the end are closed,
+    and a tag cut off at the end of the fragment is removed. Output is
+    formatted with one tag or string of text per line and nested tags
+    indented, except within :data:`PRESERVE_WHITESPACE_TAGS`, where content
+    is left as-is.
+
+    Runs in linear time over the fragment, keeping only a stack of open
+    tags, and matches the output of BeautifulSoup ``prettify`` with the
+    ``html.parser`` parser and minimal formatter.
+
+    :param html_snippet: fragment of HTML
+    :returns: balanced, formatted HTML
+    """
+    html_snippet = INCOMPLETE_TAG_RE.sub("", html_snippet)
+    output = []
+    # names of open tags
+    stack = []
+    # stack depth of the tag whose content is being output as-is, if any
+    literal_depth = None
+    text = []
+    # counts of void tags written without a slash, e.g. <br>, whose redundant
+    # closing tags (</br>) should be skipped without splitting the text
+    open_void = {}
+
+    def add(piece, indent=True, newline=True):
+        """Add a piece of output, indented and on its own line unless
+        within a tag whose content is output as-is"""
+        if literal_depth is not None:
+            output.append(piece)
+        else:
+            output.append(
+                "%s%s%s"
+                % (
+                    INDENT * len(stack) if indent else "",
+                    piece,
+                    "\n" if newline else "",
+                )
+            )
+
+    def flush_text():
+        """Output any text since the last tag"""
+        if text:
+            content = html.unescape("".join(text))
+            text.clear()
+            if literal_depth is None:
+                content = content.strip()
+            if content:
+                add(_escape(content))
+
+    def close_tag():
+        """Close the most recently opened tag"""
+        nonlocal literal_depth
+        name = stack.pop()
+        if literal_depth == len(stack):
+            # leaving as-is content: no indent before, newline after
+            literal_depth = None
+            add("</%s>" % name, indent=False)
+        else:
+            add("</%s>" % name)
+
+    position = 0
+    for match in TOKEN_RE.finditer(html_snippet):
+        text.append(html_snippet[position : match.start()])
+        position = match.end()
+        end_name = (match.group("end") or "").lower()
+        if open_void.get(end_name):
+            open_void[end_name] -= 1
+            continue
+        flush_text()
+
+        if match.group("comment") is not None:
+            add(match.group(0))
+        elif end_name:
+            name = end_name
+            # close any tags opened since the matching open tag;
+            # ignore closing tags with no matching open tag
+            if name in stack:
+                while stack[-1] != name:
+                    close_tag()
+                close_tag()
+        else:
+            name = match.group("start").lower()
+            tag = _format_start_tag(name, match.group("attrs"))
+            if name in VOID_TAGS:
+                add(tag)
+                if not match.group("attrs").endswith("/"):
+                    open_void[name] = open_void.get(name, 0) + 1
+            elif literal_depth is None and name in PRESERVE_WHITESPACE_TAGS:
+                # start as-is content: indent before, no newline after
+                add(tag, newline=False)
+                literal_depth = len(stack)
+                stack.append(name)
+            else:
+                add(tag)
+                stack.append(name)
+            # self-closing non-void tags, e.g. <span/>, are closed immediately
+            if name not in VOID_TAGS and match.group("attrs").endswith("/"):
+                close_tag()
+
+    text.append(html_snippet[position:])
+    flush_text()
+    while stack:
+        close_tag()
+    return "".join(output)
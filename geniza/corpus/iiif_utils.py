@@ -63,6 +63,41 @@ def empty_iiif_canvas():
     return canvas
 
 
+def djiffy_canvas(canvas):
+    """Build a IIIF Presentation 2 canvas from a :class:`djiffy.models.Canvas`,
+    so imported manifests can be used without loading the remote manifest.
+    Only includes the canvas details stored on import: label, size, image,
+    and rendering when present."""
+    image = {
+        "@type": "oa:Annotation",
+        "motivation": "sc:painting",
+        "on": canvas.uri,
+        "resource": {
+            "@id": str(canvas.image),
+            "@type": "dctypes:Image",
+            "format": "image/jpeg",
+            "service": {
+                "@context": "http://iiif.io/api/image/2/context.json",
+                "@id": canvas.iiif_image_id,
+                "profile": "http://iiif.io/api/image/2/level1.json",
+            },
+        },
+    }
+    iiif_canvas = {
+        "@id": canvas.uri,
+        "@type": "sc:Canvas",
+        "label": canvas.label,
+        "images": [image],
+    }
+    if canvas.width and canvas.height:
+        iiif_canvas.update({"width": canvas.width, "height": canvas.height})
+        image["resource"].update({"width": canvas.width, "height": canvas.height})
+    rendering = canvas.extra_data.get("rendering")
+    if rendering:
+        iiif_canvas["rendering"] = rendering
+    return iiif_canvas
+
+
 class AttrDictEncoder(DjangoJSONEncoder):
     # make attrdict json-serializable
     def default(self, obj):
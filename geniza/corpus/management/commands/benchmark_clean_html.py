@@ -0,0 +1,96 @@
+"""
+**benchmark_clean_html** is a custom manage command to benchmark balancing
+Solr highlight snippets of transcription and translation HTML for
+:func:`~geniza.corpus.solr_queryset.clean_html` with
+:func:`~geniza.corpus.html_snippets.balance_html`, against the previous
+implementation, which parsed each snippet with BeautifulSoup and
+pretty-printed it. For each sample snippet (or snippets passed as
+arguments), it reports the mean time for each implementation and whether
+their output is the same. Nothing is sent to Solr.
+
+Example usage::
+
+    # benchmark the built-in sample snippets
+    python manage.py benchmark_clean_html
+    # benchmark specific snippets with more repetitions
+    python manage.py benchmark_clean_html '<li value="3">foo <em>bar</em>' -n 5000
+
+"""
+
+import timeit
+
+from bs4 import BeautifulSoup
+from django.core.management.base import BaseCommand
+
+from geniza.corpus.html_snippets import balance_html
+
+
+def prettify_html(html_snippet):
+    """Previous implementation of snippet cleanup, for comparison: parse
+    with BeautifulSoup and pretty-print"""
+    return BeautifulSoup(
+        html_snippet,
+        "html.parser",
+        preserve_whitespace_tags=["li", "em"],
+    ).prettify(formatter="minimal")
+
+
+class Command(BaseCommand):
+    """Benchmark highlight snippet cleanup"""
+
+    help = __doc__
+
+    #: sample snippets in the shapes Solr returns for transcription and
+    #: translation highlights: partial lines, unclosed and unopened tags
+    sample_snippets = [
+        '<li value="4">בש רח נקול נחן <em>אלשהוד</em> [אלוא]צעין כטוטנא</li>\n'
+        '<li value="5">תחת הדה אלאחרף אן למא אן כאן יום</li>',
+        'אלסבת אלסאדס מן שהר אב</li>\n<li value="8">יהפך לשמחה שנת '
+        "<em>אתקו</em> לשטרות בעיר קליוב",
+        '<p>In the name of the Merciful.</p>\n</li>\n<li value="2"><p>We, '
+        "the <em>witnesses</em> whose signatures appear below, "
+        "attest that on Saturday, the sixth of Av</p></li>",
+        "<h3>Verso</h3>\n<ol>\n"
+        + "".join(
+            '<li value="%d"><span class="x">הסמוכה</span> לעיר <em>המלוכה</em>'
+            " הס[מו]כה לפסטאט &amp; מצרים</li>\n" % i
+            for i in range(1, 10)
+        ),
+    ]
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "snippets",
+            nargs="*",
+            help="HTML snippets to benchmark (default: built-in samples)",
+        )
+        parser.add_argument(
+            "-n",
+            "--number",
+            type=int,
+            default=1000,
+            help="Number of times to clean each snippet (default: %(default)s)",
+        )
+
+    def handle(self, *args, **options):
+        snippets = options.get("snippets") or self.sample_snippets
+        number = options.get("number")
+
+        self.stdout.write(
+            "%10s %10s %8s %5s  snippet" % ("prettify", "balance", "speedup", "same")
+        )
+        for snippet in snippets:
+            prettify_time = timeit.timeit(lambda: prettify_html(snippet), number=number)
+            balance_time = timeit.timeit(lambda: balance_html(snippet), number=number)
+            same = prettify_html(snippet) == balance_html(snippet)
+            preview = " ".join(snippet.split())
+            self.stdout.write(
+                "%8.1fµs %8.1fµs %7.1fx %5s  %s"
+                % (
+                    prettify_time / number * 10**6,
+                    balance_time / number * 10**6,
+                    prettify_time / balance_time if balance_time else 0,
+                    "yes" if same else "no",
+                    preview if len(preview) <= 50 else "%s…" % preview[:49],
+                )
+            )
@@ -0,0 +1,85 @@
+"""
+**benchmark_query_rewrite** is a custom manage command to benchmark
+rewriting keyword search queries for Solr with
+:meth:`~geniza.corpus.solr_queryset.DocumentSolrQuerySet.plan_query`.
+For each sample query (or queries passed as arguments), it reports the
+mean time to parse and rewrite the query without the plan cache, and the
+mean time for a cached plan. Nothing is sent to Solr.
+
+Example usage::
+
+    # benchmark the built-in sample of long, multi-phrase queries
+    python manage.py benchmark_query_rewrite
+    # benchmark specific queries with more repetitions
+    python manage.py benchmark_query_rewrite 'אלמרכב "deed of sale"' -n 5000
+
+"""
+
+import timeit
+
+from django.core.management.base import BaseCommand
+
+from geniza.corpus.solr_queryset import DocumentSolrQuerySet
+
+
+class Command(BaseCommand):
+    """Benchmark keyword search query rewriting"""
+
+    help = __doc__
+
+    #: sample queries: long, multi-phrase, with field aliases, hebrew
+    #: prefixes, and arabic/judaeo-arabic text
+    sample_queries = [
+        '"deed of sale" AND "marriage contract" shelfmark:"T-S 13J" tag:legal',
+        '"מרכב אלצלטאן" AND "אלמרכב אלצלטאן" OR ולד כבוד משיח בית אלדאר',
+        'دينار "عشرة دنانير" AND دار OR بيت "حق الدار" description:payment',
+        " ".join(
+            [
+                '"he divorced" pgpid:950 OR old_pgpid:1234',
+                'BL OR 5565 + T-S NS 320.4 + ENA 2747.12 "letter of appeal"',
+                'אלמרכב אלבית "כתאב אלי" دينار فضة translation:"silver coins"',
+                'notes:"needs review" tag:"marriage payment" הכהן לאבו',
+            ]
+        ),
+    ]
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "queries",
+            nargs="*",
+            help="Search queries to benchmark (default: built-in samples)",
+        )
+        parser.add_argument(
+            "-n",
+            "--number",
+            type=int,
+            default=1000,
+            help="Number of times to rewrite each query (default: %(default)s)",
+        )
+
+    def handle(self, *args, **options):
+        queries = options.get("queries") or self.sample_queries
+        number = options.get("number")
+        plan_query = DocumentSolrQuerySet.plan_query
+
+        self.stdout.write("%10s %10s %8s  query" % ("uncached", "cached", "speedup"))
+        for query in queries:
+
+            def uncached():
+                plan_query.__wrapped__(DocumentSolrQuerySet, query)
+
+            uncached_time = timeit.timeit(uncached, number=number) / number
+            # populate the cache, then time cached lookups
+            plan_query(query)
+            cached_time = (
+                timeit.timeit(lambda: plan_query(query), number=number) / number
+            )
+            self.stdout.write(
+                "%8.1fµs %8.1fµs %7.0fx  %s"
+                % (
+                    uncached_time * 10**6,
+                    cached_time * 10**6,
+                    uncached_time / cached_time if cached_time else 0,
+                    query if len(query) <= 60 else "%s…" % query[:59],
+                )
+            )
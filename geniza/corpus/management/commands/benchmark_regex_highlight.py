@@ -0,0 +1,122 @@
+"""
+**benchmark_regex_highlight** is a custom manage command to benchmark
+highlighting regular expression search results with
+:class:`~geniza.corpus.regex_highlight.RegexHighlighter` over large
+transcriptions. By default it highlights a synthetic page of results, made
+by repeating a sample transcription; use ``--documents`` to highlight the
+longest transcriptions in the database (from rendered footnote content)
+instead. For each pattern, it reports the time to highlight the page, the
+number of matches, and whether the time or match budget was used up.
+Nothing is sent to Solr.
+
+Example usage::
+
+    # benchmark sample patterns over 50 transcriptions of ~20,000 characters
+    python manage.py benchmark_regex_highlight
+    # benchmark a pattern over the 50 longest transcriptions in the database
+    python manage.py benchmark_regex_highlight 'אל\\w+' --documents
+
+"""
+
+import time
+
+from django.core.management.base import BaseCommand
+from django.db.models.fields.json import KT
+from django.db.models.functions import Length
+
+from geniza.corpus.regex_highlight import RegexHighlighter
+from geniza.footnotes.models import Footnote
+
+
+class Command(BaseCommand):
+    """Benchmark regex search highlighting over large transcriptions"""
+
+    help = __doc__
+
+    #: sample patterns, including one with catastrophic backtracking
+    sample_patterns = [
+        "אלאחרף אן למא",
+        r"אל\w+ מן",
+        r"\[[^\]]+\]",
+        r"\w",
+        r"(\w+\s?)+!",
+    ]
+
+    #: sample transcription text to repeat for synthetic results
+    sample_text = (
+        "בש רח נקול נחן אלשהוד [אלוא]צעין כטוטנא תחת הדה אלאחרף אן למא אן כאן "
+        "יום אלסבת אלסאדס מן שהר אב יהפך לשמחה שנת אתקו לשטרות בעיר קליוב "
+        "הסמוכה לעיר המלוכה הס[מו]כה לפסטאט מצרים דעל נילוס נהרה מותבה רשותא\n"
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "patterns",
+            nargs="*",
+            help="Regular expressions to benchmark (default: built-in samples)",
+        )
+        parser.add_argument(
+            "-r",
+            "--results",
+            type=int,
+            default=50,
+            help="Number of transcriptions per page of results "
+            + "(default: %(default)s)",
+        )
+        parser.add_argument(
+            "-s",
+            "--size",
+            type=int,
+            default=20000,
+            help="Approximate length in characters of each synthetic "
+            + "transcription (default: %(default)s)",
+        )
+        parser.add_argument(
+            "--documents",
+            action="store_true",
+            help="Highlight the longest transcriptions in the database "
+            + "instead of synthetic text",
+        )
+
+    def get_transcriptions(self, results, size, documents=False):
+        """Return a list of transcription texts to highlight"""
+        if documents:
+            # use plain text transcriptions from rendered footnote content,
+            # which is what is indexed for regex search
+            return list(
+                Footnote.objects.annotate(text=KT("render_cache__text"))
+                .filter(text__isnull=False)
+                .annotate(length=Length("text"))
+                .order_by("-length")
+                .values_list("text", flat=True)[:results]
+            )
+        repeat = max(size // len(self.sample_text), 1)
+        return [self.sample_text * repeat] * results
+
+    def handle(self, *args, **options):
+        patterns = options.get("patterns") or self.sample_patterns
+        transcriptions = self.get_transcriptions(
+            options.get("results"), options.get("size"), options.get("documents")
+        )
+        total_chars = sum(len(text) for text in transcriptions)
+        self.stdout.write(
+            "Highlighting %d transcriptions, %d characters in total"
+            % (len(transcriptions), total_chars)
+        )
+
+        self.stdout.write("%10s %8s %10s  pattern" % ("time", "matches", "stopped"))
+        for pattern in patterns:
+            highlighter = RegexHighlighter(pattern)
+            start = time.perf_counter()
+            for text in transcriptions:
+                highlighter.highlight(text)
+            elapsed = time.perf_counter() - start
+            self.stdout.write(
+                "%8.1fms %8d %10s  %s"
+                % (
+                    elapsed * 1000,
+                    highlighter.matches,
+                    "yes" if highlighter.exhausted else "no",
+                    pattern,
+                )
+            )
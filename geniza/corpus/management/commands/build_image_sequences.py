@@ -0,0 +1,44 @@
+"""
+**build_image_sequences** is a custom manage command to precompute the
+ordered IIIF images stored on each document, for use in document detail
+pages, admin thumbnails, and indexing. Image sequences are rebuilt
+automatically when fragments, image overrides, or annotations change; this
+command populates them for existing documents.
+
+Only documents without a stored image sequence are updated, unless
+``--all`` is specified. Sequences are not stored for documents on fragments
+whose IIIF manifests have not been imported.
+
+Example usage::
+
+    python manage.py build_image_sequences
+    # rebuild image sequences for all documents
+    python manage.py build_image_sequences --all
+
+"""
+
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import pluralize
+
+from geniza.corpus.models import Document
+
+
+class Command(BaseCommand):
+    __doc__ = help = __doc__
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--all",
+            action="store_true",
+            help="Rebuild image sequences for all documents",
+        )
+
+    def handle(self, *args, **kwargs):
+        if kwargs["all"]:
+            Document.objects.update(image_sequence=None)
+        waiting = Document.objects.filter(image_sequence__isnull=True).count()
+        stored = Document.rebuild_image_sequences()
+        self.stdout.write(
+            "Stored image sequence%s for %d of %d document%s"
+            % (pluralize(stored), stored, waiting, pluralize(waiting))
+        )
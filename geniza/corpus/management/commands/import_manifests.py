@@ -2,15 +2,25 @@
 Importing IIIF manifests to be cached in the database.
 
 """
+import hashlib
+import json
 import urllib
+from collections import Counter
+from concurrent.futures import ThreadPoolExecutor, as_completed
+from urllib.parse import urlparse
 
 from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.utils import timezone
 from django.utils.text import slugify
 from djiffy.importer import ManifestImporter
 from djiffy.models import Manifest
+from piffle.presentation import IIIFException, IIIFPresentation
 
+from geniza.common.indexing import IndexQueue
 from geniza.corpus.iiif_utils import GenizaManifestImporter
-from geniza.corpus.models import Fragment
+from geniza.corpus.manifest_client import ManifestClient
+from geniza.corpus.models import Document, Fragment
 
 
 class Command(BaseCommand):
@@ -18,6 +28,14 @@ class Command(BaseCommand):
 
     help = __doc__
 
+    #: number of manifests to request at once per worker in concurrent mode,
+    #: to limit how many retrieved manifests are held in memory
+    batch_size_per_worker = 10
+
+    #: key in manifest extra data for a digest of the imported content,
+    #: used to skip unchanged manifests in concurrent mode
+    digest_key = "import_digest"
+
     def add_arguments(self, parser):
         parser.add_argument(
             "path",
@@ -36,6 +54,14 @@ class Command(BaseCommand):
             action="store_true",
             help="Only associate fragments with imported manifests (no import)",
         )
+        parser.add_argument(
+            "--workers",
+            type=int,
+            default=1,
+            help="Number of manifests to retrieve concurrently, using cached "
+            "responses and conditional requests, and skipping manifests that "
+            "are unchanged since they were imported (default: 1, import serially)",
+        )
 
     def handle(self, *args, **kwargs):
         # if fragment-manifest association is requested, run it and bail out
@@ -67,22 +93,105 @@ class Command(BaseCommand):
                 "%d IIIF urls associated with fragments to import" % len(iiif_urls)
             )
 
-        GenizaManifestImporter(
+        importer = GenizaManifestImporter(
             stdout=self.stdout,
             stderr=self.stderr,
             style=self.style,
             update=kwargs["update"],
-        ).import_paths(iiif_urls)
+        )
+        if kwargs.get("workers", 1) > 1:
+            self.import_concurrently(importer, iiif_urls, kwargs["workers"])
+        else:
+            importer.import_paths(iiif_urls)
+
+        if kwargs["update"]:
+            # canvases of updated manifests may have changed, so rebuild
+            # image sequences for documents on the associated fragments
+            Document.clear_image_sequences(
+                Document.objects.filter(fragments__iiif_url__in=iiif_urls).values_list(
+                    "pk", flat=True
+                )
+            )
 
         self.associate_manifests()
 
+    def import_concurrently(self, importer, iiif_urls, workers):
+        """Retrieve manifests with a pool of threads and import them.
+        Manifests are retrieved with :class:`~geniza.corpus.manifest_client.ManifestClient`,
+        so cached responses are used or revalidated with conditional requests.
+        A digest of the imported content is stored in the manifest's extra
+        data, and previously imported manifests whose content matches it
+        are skipped. Database updates are made as manifests are retrieved,
+        from the main thread. Local file paths are imported serially."""
+        iiif_urls = list(iiif_urls)
+        local_paths = [
+            path for path in iiif_urls if urlparse(path).scheme not in ["http", "https"]
+        ]
+        if local_paths:
+            importer.import_paths(local_paths)
+            iiif_urls = [path for path in iiif_urls if path not in local_paths]
+
+        client = ManifestClient()
+        imported_digests = dict(
+            Manifest.objects.values_list("uri", f"extra_data__{self.digest_key}")
+        )
+        stats = Counter()
+        batch_size = workers * self.batch_size_per_worker
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            for start in range(0, len(iiif_urls), batch_size):
+                futures = {
+                    executor.submit(client.get, url): url
+                    for url in iiif_urls[start : start + batch_size]
+                }
+                for future in as_completed(futures):
+                    url = futures[future]
+                    try:
+                        content = future.result()
+                    except IIIFException as err:
+                        importer.error_msg(str(err))
+                        stats["error"] += 1
+                        continue
+                    # compare with the imported version rather than the
+                    # cached response, which may have been updated by
+                    # requests from the site since the last import
+                    digest = self.content_digest(content)
+                    if imported_digests.get(url) == digest:
+                        stats["unchanged"] += 1
+                        continue
+
+                    manifest = IIIFPresentation(content)
+                    if manifest.type == "sc:Collection":
+                        importer.import_collection(manifest)
+                    if manifest.type == "sc:Manifest":
+                        db_manifest = importer.import_manifest(manifest, url)
+                        # record the imported version, unless the import
+                        # was skipped for a previously imported manifest
+                        if db_manifest and (
+                            importer.update or url not in imported_digests
+                        ):
+                            db_manifest.extra_data[self.digest_key] = digest
+                            db_manifest.save(update_fields=["extra_data"])
+                    stats["imported"] += 1
+
+        self.stdout.write(
+            "Imported %d manifests; skipped %d unchanged; %d errors"
+            % (stats["imported"], stats["unchanged"], stats["error"])
+        )
+
+    @staticmethod
+    def content_digest(content):
+        """Stable digest of manifest content"""
+        return hashlib.sha1(json.dumps(content, sort_keys=True).encode()).hexdigest()
+
     def associate_manifests(self):
         """update fragments with iiif urls to add foreign keys to the new manifests"""
         fragments = Fragment.objects.exclude(iiif_url="").filter(manifest__isnull=True)
         self.stdout.write(
             "%d fragments with iiif url but unlinked manifest" % fragments.count()
         )
-        updated = 0
+        manifest_ids = dict(Manifest.objects.values_list("uri", "pk"))
+        now = timezone.now()
+        updated = []
         for fragment in fragments:
             # a set of ~200 manifest urls were entered with double slashes,
             # resulting in a mismatch with the imported manifest objects.
@@ -95,9 +204,25 @@ class Command(BaseCommand):
                     (parsed.scheme, parsed.netloc, url_path, "", "", "")
                 )
 
-            fragment.manifest = Manifest.objects.filter(uri=fragment.iiif_url).first()
-            if fragment.manifest:
-                fragment.save()
-                updated += 1
+            fragment.manifest_id = manifest_ids.get(fragment.iiif_url)
+            if fragment.manifest_id:
+                # bulk update does not set auto_now fields
+                fragment.last_modified = now
+                updated.append(fragment)
+
+        # update all fragments at once and reindex their documents in a single
+        # batch when the transaction commits, rather than saving (and
+        # reindexing) each fragment individually
+        with transaction.atomic():
+            Fragment.objects.bulk_update(
+                updated, ["iiif_url", "manifest", "last_modified"], batch_size=1000
+            )
+            doc_ids = set(
+                Document.objects.filter(fragments__in=updated).values_list(
+                    "pk", flat=True
+                )
+            )
+            Document.clear_image_sequences(doc_ids)
+            IndexQueue.add(Document, doc_ids)
 
-        self.stdout.write("Updated %d fragments with link to manifest" % updated)
+        self.stdout.write("Updated %d fragments with link to manifest" % len(updated))
@@ -0,0 +1,185 @@
+"""
+**index_changes** is a custom manage command for incremental reindexing.
+It finds :class:`~geniza.corpus.models.Document`,
+:class:`~geniza.entities.models.Person`, and
+:class:`~geniza.entities.models.Place` records that have changed since
+the last run, either directly or through one of the related records that
+trigger reindexing when they are saved, and reindexes only those records.
+
+Changes are identified by automatic modification timestamps (e.g.
+``last_modified``) and admin log entries. Deleted related records are
+identified by deletion log entries recorded by
+:func:`geniza.corpus.signals.log_related_deletion`, which captures the
+records they belonged to before they are deleted.
+The first run, or a run with no record of a previous run, reindexes
+everything. Records whose index data is identical to what is already in
+Solr are not sent again, unless ``--force`` is specified.
+
+Example usage::
+
+    # reindex records changed since the last run
+    python manage.py index_changes
+    # reindex records changed since a specific date
+    python manage.py index_changes --since 2024-06-01
+    # send changed records to Solr even if their index data is unchanged
+    python manage.py index_changes --force
+
+"""
+
+import os.path
+import time
+from datetime import datetime
+
+import requests
+from django.apps import apps
+from django.contrib.admin.models import LogEntry
+from django.contrib.contenttypes.models import ContentType
+from django.core.management.base import CommandError
+from django.db.models import Q
+from django.template.defaultfilters import pluralize
+from django.utils import timezone
+from parasolr.django import SolrClient
+
+from geniza.common.indexing import IndexDigestMixin
+from geniza.corpus.management.lastrun_command import LastRunCommand
+from geniza.corpus.signals import LOGGED_DELETIONS, RELATED_MODELS, deleted_related_ids
+
+
+def modified_fields(model):
+    """Names of datetime fields on a model that are updated automatically on save"""
+    return [
+        field.name for field in model._meta.fields if getattr(field, "auto_now", False)
+    ]
+
+
+def logged_object_ids(model, since):
+    """Ids for records of the specified model with log entries since
+    the specified time"""
+    return set(
+        LogEntry.objects.filter(
+            content_type=ContentType.objects.get_for_model(model),
+            action_time__gte=since,
+        ).values_list("object_id", flat=True)
+    )
+
+
+class Command(LastRunCommand):
+    """Reindex documents, people, and places changed since the last run"""
+
+    help = __doc__
+
+    # filename for last run information (stored in current user's home)
+    lastrun_filename = os.path.join(os.path.expanduser("~"), ".pgp_index_lastrun")
+    # id for this script in the last run file info
+    script_id = "index_changes"
+
+    #: normal verbosity level
+    v_normal = 1
+    verbosity = v_normal
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--since",
+            type=datetime.fromisoformat,
+            help="Reindex records changed since this date or time "
+            + "(ISO format; default: last run)",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Index all changed records, including those with unchanged index data",
+        )
+
+    def handle(self, *args, **options):
+        self.verbosity = options.get("verbosity", self.v_normal)
+
+        since = options.get("since") or self.get_lastrun()
+        if since and timezone.is_naive(since):
+            since = timezone.make_aware(since)
+        # record start time before querying, so changes made while the
+        # reindex is running are picked up by the next run
+        new_lastrun = timezone.now()
+
+        if self.verbosity >= self.v_normal:
+            if since:
+                self.stdout.write("Indexing records changed since %s" % since)
+            else:
+                self.stdout.write("No previous run found; indexing all records")
+
+        start = time.time()
+        total = 0
+        skipped = IndexDigestMixin.index_stats["skipped"]
+        try:
+            for label in RELATED_MODELS:
+                model = apps.get_model(label)
+                items = model.items_to_index()
+                if since:
+                    items = items.filter(pk__in=self.changed_ids(model, since))
+                count = model.index_items(items, force=options.get("force", False))
+                total += count
+                if self.verbosity >= self.v_normal:
+                    model_name = (
+                        model._meta.verbose_name
+                        if count == 1
+                        else model._meta.verbose_name_plural
+                    )
+                    self.stdout.write("Indexed %d %s" % (count, model_name.lower()))
+            # commit all the indexed changes
+            if total:
+                SolrClient().update.index([], commit=True)
+        except requests.exceptions.ConnectionError as err:
+            # bail out without updating last run, so changes are indexed next time
+            raise CommandError(err)
+
+        if self.verbosity >= self.v_normal:
+            self.stdout.write(
+                "Indexed %d record%s in %.1fs"
+                % (total, pluralize(total), time.time() - start)
+            )
+            skipped = IndexDigestMixin.index_stats["skipped"] - skipped
+            if skipped:
+                self.stdout.write(
+                    "%d unchanged record%s not sent to Solr"
+                    % (skipped, pluralize(skipped))
+                )
+
+        # update the last run for the next time
+        self.update_lastrun_info(new_lastrun)
+
+    def get_lastrun(self):
+        """Time of the last run of this script, if there is one"""
+        lastrun_data = self.get_lastrun_info()
+        if lastrun_data and self.script_id in lastrun_data:
+            return datetime.fromisoformat(lastrun_data[self.script_id])
+
+    def changed_ids(self, model, since):
+        """Ids of records of the specified model that have changed since
+        the specified time, based on modification time and log entries
+        for the records themselves and for the related models configured
+        in :data:`~geniza.corpus.signals.RELATED_MODELS`, including
+        related records deleted since then."""
+        conditions = [Q(pk__in=logged_object_ids(model, since))]
+        for field in modified_fields(model):
+            conditions.append(Q(**{"%s__gte" % field: since}))
+        changed = set()
+
+        for label, lookups in RELATED_MODELS[model._meta.label].items():
+            related_model = apps.get_model(label)
+            # deleted records can't be found by lookup; use the ids
+            # captured when they were deleted
+            if label in LOGGED_DELETIONS:
+                changed.update(deleted_related_ids(model, related_model, since))
+            if not isinstance(lookups, list):
+                lookups = [lookups]
+            logged_ids = logged_object_ids(related_model, since)
+            for lookup in lookups:
+                if logged_ids:
+                    conditions.append(Q(**{"%s__pk__in" % lookup: logged_ids}))
+                for field in modified_fields(related_model):
+                    conditions.append(Q(**{"%s__%s__gte" % (lookup, field): since}))
+
+        # query each condition separately rather than combining them,
+        # to avoid joining across all related tables at once
+        for condition in conditions:
+            changed.update(model.objects.filter(condition).values_list("pk", flat=True))
+        return changed
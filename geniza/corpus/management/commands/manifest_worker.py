@@ -0,0 +1,220 @@
+"""
+**manifest_worker** is a custom manage command to import IIIF manifests for
+fragments queued on save, for use when **IIIF_MANIFEST_IMPORT_BACKGROUND**
+is enabled in Django settings.
+
+Fragments are claimed in batches with ``SELECT ... FOR UPDATE SKIP LOCKED``,
+so multiple workers can run at the same time without importing the same
+manifest. Manifests are retrieved and imported after the claim is committed,
+so row locks are not held during network requests; fragments are locked and
+re-read before the manifest is associated, and skipped if their IIIF URL was
+changed or the import is no longer waiting. Failed imports are retried with an
+increasing delay until they reach the maximum number of attempts, and are then
+marked as failed.
+
+Example usage::
+
+    # run continuously, polling for queued imports
+    python manage.py manifest_worker
+    # import all waiting manifests and then exit
+    python manage.py manifest_worker --once
+    # report how many imports are waiting or failed
+    python manage.py manifest_worker --status
+
+"""
+
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand
+from django.db import transaction
+from django.template.defaultfilters import pluralize
+from django.utils import timezone
+from piffle.presentation import IIIFException
+
+from geniza.common.indexing import IndexQueue
+from geniza.corpus.iiif_utils import GenizaManifestImporter
+from geniza.corpus.manifest_client import CachedIIIFPresentation
+from geniza.corpus.models import Document, Fragment
+
+
+class Command(BaseCommand):
+    __doc__ = help = __doc__
+
+    #: normal verbosity level
+    v_normal = 1
+    verbosity = v_normal
+
+    #: base delay in seconds before retrying a failed import; doubled on each attempt
+    retry_delay = 60
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "--batch-size",
+            type=int,
+            default=10,
+            help="Number of fragments to claim at once (default: %(default)s)",
+        )
+        parser.add_argument(
+            "--max-attempts",
+            type=int,
+            default=5,
+            help="Number of times to try an import before giving up (default: %(default)s)",
+        )
+        parser.add_argument(
+            "--sleep",
+            type=float,
+            default=5,
+            help="Seconds to wait when no imports are waiting (default: %(default)s)",
+        )
+        parser.add_argument(
+            "--once",
+            action="store_true",
+            help="Process waiting imports and exit instead of polling",
+        )
+        parser.add_argument(
+            "--status",
+            action="store_true",
+            help="Report the number of waiting and failed imports and exit",
+        )
+
+    def handle(self, *args, **kwargs):
+        self.verbosity = kwargs.get("verbosity", self.v_normal)
+        self.batch_size = kwargs["batch_size"]
+        self.max_attempts = kwargs["max_attempts"]
+
+        if kwargs["status"]:
+            self.report_status()
+            return
+
+        total = 0
+        try:
+            while True:
+                processed = self.process_batch()
+                total += processed
+                if not processed:
+                    if kwargs["once"]:
+                        break
+                    time.sleep(kwargs["sleep"])
+        except KeyboardInterrupt:
+            pass
+
+        if self.verbosity >= self.v_normal:
+            self.stdout.write(
+                "Processed %d manifest import%s" % (total, pluralize(total))
+            )
+
+    def report_status(self):
+        """Report counts of waiting and failed imports"""
+        waiting = Fragment.objects.filter(
+            manifest_status=Fragment.MANIFEST_PENDING
+        ).count()
+        self.stdout.write("%d import%s waiting" % (waiting, pluralize(waiting)))
+        failed = Fragment.objects.filter(
+            manifest_status=Fragment.MANIFEST_FAILED
+        ).count()
+        if failed:
+            self.stdout.write(
+                self.style.WARNING(
+                    "%d import%s failed after %d attempts"
+                    % (failed, pluralize(failed), self.max_attempts)
+                )
+            )
+
+    def process_batch(self):
+        """Claim a batch of fragments waiting for manifest import and import
+        them. Returns the number of fragments processed."""
+        # claim fragments in a short transaction, by making them unavailable
+        # to other workers until the retry delay, so that row locks are not
+        # held while manifests are retrieved
+        with transaction.atomic():
+            fragments = list(
+                Fragment.objects.filter(
+                    manifest_status=Fragment.MANIFEST_PENDING,
+                    manifest_import_available__lte=timezone.now(),
+                )
+                .select_for_update(skip_locked=True, of=("self",))
+                .order_by("manifest_import_available")[: self.batch_size]
+            )
+            Fragment.objects.filter(pk__in=[f.pk for f in fragments]).update(
+                manifest_import_available=timezone.now()
+                + timedelta(seconds=self.retry_delay)
+            )
+        for fragment in fragments:
+            self.import_manifest(fragment)
+        return len(fragments)
+
+    def import_manifest(self, fragment):
+        """Import the manifest for a single fragment and associate it, or
+        record a failed attempt and schedule a retry."""
+        try:
+            # load the manifest with the shared client, which uses request
+            # timeouts, and report errors instead of skipping them
+            manifest = CachedIIIFPresentation.from_url(fragment.iiif_url)
+            with transaction.atomic():
+                # the fragment may have been edited while the manifest was
+                # retrieved; lock and re-read it, and only update manifest fields
+                current = (
+                    Fragment.objects.select_for_update().filter(pk=fragment.pk).first()
+                )
+                if (
+                    current is None
+                    or current.iiif_url != fragment.iiif_url
+                    or current.manifest_status != Fragment.MANIFEST_PENDING
+                ):
+                    if self.verbosity > self.v_normal:
+                        self.stdout.write(
+                            "Skipping %s; import is no longer waiting" % fragment
+                        )
+                    return
+                imported = GenizaManifestImporter(
+                    stderr=self.stderr, style=self.style
+                ).import_manifest(manifest, fragment.iiif_url)
+                if not imported:
+                    raise IIIFException("Manifest could not be imported")
+                current.manifest = imported
+                current.manifest_status = ""
+                current.manifest_import_attempts = 0
+                current.manifest_import_error = ""
+                current.save(
+                    update_fields=[
+                        "manifest",
+                        "manifest_status",
+                        "manifest_import_attempts",
+                        "manifest_import_error",
+                    ]
+                )
+                # documents on this fragment include its images in the index
+                IndexQueue.add(Document, current.documents.values_list("pk", flat=True))
+        except Exception as err:
+            # any error, including a malformed manifest, counts as a failed
+            # attempt, so that one fragment can't stop the worker
+            self.record_failure(fragment, err)
+            return
+
+        if self.verbosity > self.v_normal:
+            self.stdout.write("Imported manifest for %s" % fragment)
+
+    def record_failure(self, fragment, err):
+        """Record a failed import attempt for a fragment, and schedule a retry
+        or mark the import as failed after the maximum number of attempts"""
+        self.stderr.write("Error importing manifest for %s: %s" % (fragment, err))
+        attempts = fragment.manifest_import_attempts + 1
+        updates = {
+            "manifest_import_attempts": attempts,
+            "manifest_import_error": str(err) or err.__class__.__name__,
+        }
+        if attempts >= self.max_attempts:
+            updates["manifest_status"] = Fragment.MANIFEST_FAILED
+        else:
+            updates["manifest_import_available"] = timezone.now() + timedelta(
+                seconds=self.retry_delay * 2 ** (attempts - 1)
+            )
+        # update without saving, since nothing has changed that would need
+        # to be reindexed; leave the fragment alone if its IIIF URL was changed
+        # or the import is no longer waiting
+        Fragment.objects.filter(
+            pk=fragment.pk,
+            iiif_url=fragment.iiif_url,
+            manifest_status=Fragment.MANIFEST_PENDING,
+        ).update(**updates)
@@ -0,0 +1,253 @@
+"""
+**parallel_index** is a custom manage command to reindex
+:class:`~geniza.corpus.models.Document` records in Solr using multiple
+worker processes. Documents are split into primary key ranges (using
+keyset pagination, so no large offsets are needed), and each range is
+prepped and indexed by a worker process that posts its own batches to Solr.
+
+Completed ranges are recorded in a state file as they finish, so an
+interrupted reindex can be resumed without repeating finished work.
+
+Example usage::
+
+    # reindex all documents with the default number of workers
+    python manage.py parallel_index
+    # reindex with four workers and ranges of 500 documents
+    python manage.py parallel_index --workers 4 --range-size 500
+    # resume an interrupted reindex from the last finished range
+    python manage.py parallel_index --resume
+    # send every document to Solr, even if its index data is unchanged
+    python manage.py parallel_index --force
+    # stream documents to Solr in update requests of up to 5MB
+    python manage.py parallel_index --batch-bytes 5000000
+
+"""
+
+import json
+import multiprocessing
+import os
+import os.path
+import time
+from collections import defaultdict
+from functools import partial
+
+import requests
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connections
+from django.template.defaultfilters import pluralize
+from parasolr.django import SolrClient
+from parasolr.indexing import Indexable
+
+from geniza.common.indexing import SolrUpdateStream
+from geniza.corpus.models import Document
+
+
+def pk_ranges(queryset, size):
+    """Generator of (first, last) primary key tuples that split the
+    queryset into ranges of at most `size` records, using keyset pagination
+    on the primary key."""
+    pks = queryset.order_by("pk").values_list("pk", flat=True)
+    last_pk = None
+    while True:
+        page = pks if last_pk is None else pks.filter(pk__gt=last_pk)
+        batch = list(page[:size])
+        if not batch:
+            break
+        yield (batch[0], batch[-1])
+        last_pk = batch[-1]
+
+
+def init_worker():
+    """Initialize a worker process: connections inherited from the parent
+    process can't be shared, so close database connections and reset the
+    Solr client so that each worker opens its own."""
+    connections.close_all()
+    Indexable.solr = None
+
+
+def index_pk_range(pk_range, force=False, batch_bytes=None):
+    """Index all documents in a (first, last) primary key range; documents
+    with unchanged index data are skipped unless `force` is True. If
+    `batch_bytes` is specified, documents are streamed to Solr in update
+    requests of at most that size. Returns a dictionary with the range, the
+    process id of the worker, the number of documents indexed and skipped
+    as unchanged, and elapsed time in seconds."""
+    first, last = pk_range
+    start = time.time()
+    skipped = Document.index_stats["skipped"]
+    stream = None
+    if batch_bytes:
+        Indexable._init_solr()
+        stream = SolrUpdateStream(Indexable.solr, batch_bytes=batch_bytes)
+    count = Document.index_items(
+        Document.items_to_index().filter(pk__gte=first, pk__lte=last).order_by("pk"),
+        force=force,
+        stream=stream,
+    )
+    return {
+        "range": [first, last],
+        "pid": os.getpid(),
+        "count": count,
+        "skipped": Document.index_stats["skipped"] - skipped,
+        "elapsed": time.time() - start,
+    }
+
+
+class Command(BaseCommand):
+    """Reindex documents in Solr in parallel worker processes"""
+
+    help = __doc__
+
+    #: filename for state of the current reindex (stored in current user's home)
+    state_filename = os.path.join(os.path.expanduser("~"), ".pgp_parallel_index")
+
+    #: default number of documents per primary key range
+    default_range_size = 1000
+
+    #: normal verbosity level
+    v_normal = 1
+    verbosity = v_normal
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "-w",
+            "--workers",
+            type=int,
+            default=os.cpu_count(),
+            help="Number of worker processes (default: number of CPUs)",
+        )
+        parser.add_argument(
+            "--range-size",
+            type=int,
+            default=self.default_range_size,
+            help="Number of documents in each primary key range (default: %d)"
+            % self.default_range_size,
+        )
+        parser.add_argument(
+            "--resume",
+            action="store_true",
+            help="Resume an interrupted reindex, skipping completed ranges",
+        )
+        parser.add_argument(
+            "--force",
+            action="store_true",
+            help="Index all documents, including those with unchanged index data",
+        )
+        parser.add_argument(
+            "--batch-bytes",
+            type=int,
+            help="Stream documents to Solr in update requests of at most "
+            + "this many bytes",
+        )
+
+    def handle(self, *args, **options):
+        self.verbosity = options.get("verbosity", self.v_normal)
+        workers = max(options.get("workers") or 1, 1)
+        range_size = options.get("range_size") or self.default_range_size
+
+        state = self.get_state() if options.get("resume") else None
+        if state:
+            completed = [tuple(r) for r in state["completed"]]
+            ranges = [tuple(r) for r in state["ranges"] if tuple(r) not in completed]
+            if self.verbosity >= self.v_normal:
+                self.stdout.write(
+                    "Resuming reindex; skipping %d completed range%s"
+                    % (len(completed), pluralize(len(completed)))
+                )
+        else:
+            completed = []
+            ranges = list(pk_ranges(Document.objects.all(), range_size))
+            state = {"ranges": ranges, "completed": completed}
+            self.save_state(state)
+
+        if self.verbosity >= self.v_normal:
+            self.stdout.write(
+                "Indexing %d document range%s with %d worker%s"
+                % (len(ranges), pluralize(len(ranges)), workers, pluralize(workers))
+            )
+
+        start = time.time()
+        worker_stats = defaultdict(lambda: {"count": 0, "skipped": 0, "elapsed": 0})
+        try:
+            for result in self.run_ranges(
+                ranges,
+                workers,
+                force=options.get("force", False),
+                batch_bytes=options.get("batch_bytes"),
+            ):
+                # record finished range so an interrupted run can be resumed
+                completed.append(tuple(result["range"]))
+                self.save_state(state)
+                worker_stats[result["pid"]]["count"] += result["count"]
+                worker_stats[result["pid"]]["skipped"] += result["skipped"]
+                worker_stats[result["pid"]]["elapsed"] += result["elapsed"]
+        except requests.exceptions.ConnectionError as err:
+            # bail out if we error connecting to Solr; state file is kept for resume
+            raise CommandError(err)
+
+        # commit all the indexed changes
+        SolrClient().update.index([], commit=True)
+        # reindex is complete; remove state so the next run starts fresh
+        self.clear_state()
+
+        if self.verbosity >= self.v_normal:
+            self.report(worker_stats, time.time() - start)
+
+    def run_ranges(self, ranges, workers, force=False, batch_bytes=None):
+        """Index the given primary key ranges, in a pool of worker processes
+        when more than one worker is requested. Yields results as each
+        range is completed."""
+        index_range = partial(index_pk_range, force=force, batch_bytes=batch_bytes)
+        if workers == 1:
+            # index in the current process
+            for pk_range in ranges:
+                yield index_range(pk_range)
+            return
+
+        # close database connections before forking worker processes
+        connections.close_all()
+        with multiprocessing.Pool(workers, initializer=init_worker) as pool:
+            yield from pool.imap_unordered(index_range, ranges)
+
+    def report(self, worker_stats, elapsed):
+        """Report documents indexed and throughput for each worker and overall"""
+        total = skipped = 0
+        for pid, stats in sorted(worker_stats.items()):
+            total += stats["count"]
+            skipped += stats["skipped"]
+            self.stdout.write(
+                "Worker {}: indexed {:,} document{} in {:.1f}s ({:.1f}/s)".format(
+                    pid,
+                    stats["count"],
+                    pluralize(stats["count"]),
+                    stats["elapsed"],
+                    stats["count"] / stats["elapsed"] if stats["elapsed"] else 0,
+                )
+            )
+        self.stdout.write(
+            "Indexed {:,} document{} in {:.1f}s ({:.1f}/s)".format(
+                total, pluralize(total), elapsed, total / elapsed if elapsed else 0
+            )
+        )
+        if skipped:
+            self.stdout.write(
+                "{:,} unchanged document{} not sent to Solr".format(
+                    skipped, pluralize(skipped)
+                )
+            )
+
+    def get_state(self):
+        """Load state for an interrupted reindex, if there is one"""
+        if os.path.exists(self.state_filename):
+            with open(self.state_filename) as statefile:
+                return json.load(statefile)
+
+    def save_state(self, state):
+        """Save list of ranges and completed ranges for the current reindex"""
+        with open(self.state_filename, "w") as statefile:
+            json.dump(state, statefile)
+
+    def clear_state(self):
+        """Remove state file after a completed reindex"""
+        if os.path.exists(self.state_filename):
+            os.remove(self.state_filename)
@@ -0,0 +1,88 @@
+"""
+**profile_index** is a custom manage command to profile generating Solr
+index data for :class:`~geniza.corpus.models.Document`,
+:class:`~geniza.entities.models.Person`, and
+:class:`~geniza.entities.models.Place` records. It reports the time and
+number of database queries spent on each group of index fields (e.g. dating,
+footnotes, transcription, images, relations), to identify which fields
+dominate indexing cost. Nothing is sent to Solr.
+
+Example usage::
+
+    # profile 500 records of each type and print a summary table
+    python manage.py profile_index
+    # profile 100 documents and save results as JSON
+    python manage.py profile_index document --limit 100 --json profile.json
+
+"""
+
+import json
+
+from django.core.management.base import BaseCommand
+from django.template.defaultfilters import pluralize
+
+from geniza.common.indexing import IndexProfiler
+from geniza.corpus.models import Document
+from geniza.entities.models import Person, Place
+
+
+class Command(BaseCommand):
+    """Profile time and queries for generating index data by field group"""
+
+    help = __doc__
+
+    #: indexed models that can be profiled, keyed on name
+    indexed_models = {
+        "document": Document,
+        "person": Person,
+        "place": Place,
+    }
+
+    #: normal verbosity level
+    v_normal = 1
+    verbosity = v_normal
+
+    def add_arguments(self, parser):
+        parser.add_argument(
+            "models",
+            nargs="*",
+            choices=list(self.indexed_models.keys()),
+            help="Record types to profile (default: all)",
+        )
+        parser.add_argument(
+            "-l",
+            "--limit",
+            type=int,
+            default=500,
+            help="Maximum number of records of each type to profile "
+            + "(default: %(default)s)",
+        )
+        parser.add_argument(
+            "--json",
+            help="Save profiling results as JSON to the specified file",
+        )
+
+    def handle(self, *args, **options):
+        self.verbosity = options.get("verbosity", self.v_normal)
+        model_names = options.get("models") or list(self.indexed_models.keys())
+        limit = options.get("limit")
+
+        with IndexProfiler() as profiler:
+            for model_name in model_names:
+                model = self.indexed_models[model_name]
+                # order by primary key so that repeated runs profile the same records
+                items = model.items_to_index().order_by("pk")
+                count = profiler.profile(model, items[:limit] if limit else items)
+                if self.verbosity >= self.v_normal:
+                    self.stdout.write(
+                        "Profiled %d %s record%s"
+                        % (count, model_name, pluralize(count))
+                    )
+
+        self.stdout.write(profiler.summary())
+
+        if options.get("json"):
+            with open(options["json"], "w") as outfile:
+                json.dump(profiler.results(), outfile, indent=2)
+            if self.verbosity >= self.v_normal:
+                self.stdout.write("Saved results to %s" % options["json"])
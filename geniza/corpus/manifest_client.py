@@ -0,0 +1,229 @@
+"""Shared client for loading remote IIIF manifests, with an HTTP response
+cache, conditional requests, timeouts, and a circuit breaker for each remote
+host, so that a slow or unavailable holding institution does not hold up
+requests to this site."""
+
+import hashlib
+import logging
+import time
+from urllib.parse import urlparse
+
+import requests
+from django.conf import settings
+from django.core.cache import InvalidCacheBackendError, caches
+from piffle.presentation import IIIFException, IIIFPresentation
+
+logger = logging.getLogger(__name__)
+
+
+def cache_max_age(headers):
+    """Number of seconds a response can be used without revalidating it,
+    based on its Cache-Control header; returns None if the response should
+    not be stored. Uses **IIIF_MANIFEST_DEFAULT_MAX_AGE** when the response
+    does not specify a max age.
+
+    :param headers: response headers
+    """
+    directives = {}
+    for directive in headers.get("Cache-Control", "").split(","):
+        name, _, value = directive.strip().partition("=")
+        directives[name.lower()] = value.strip('"')
+    if "no-store" in directives:
+        return None
+    if "no-cache" in directives:
+        return 0
+    for name in ["s-maxage", "max-age"]:
+        try:
+            return int(directives[name])
+        except (KeyError, ValueError):
+            pass
+    return getattr(settings, "IIIF_MANIFEST_DEFAULT_MAX_AGE", 0)
+
+
+class ManifestClient:
+    """Load remote IIIF manifests, caching responses in a Django cache
+    (default: **IIIF_MANIFEST_CACHE**). Cached responses are used until they
+    expire according to their Cache-Control headers, and then revalidated
+    with a conditional request using their ETag and Last-Modified headers.
+
+    Requests use **IIIF_MANIFEST_CONNECT_TIMEOUT** and
+    **IIIF_MANIFEST_READ_TIMEOUT**. After **IIIF_MANIFEST_MAX_FAILURES**
+    consecutive errors or timeouts from the same host, no requests are made
+    to that host for **IIIF_MANIFEST_RETRY_AFTER** seconds; expired cached
+    responses are used instead when available. Circuit breaker state is
+    stored in the cache, so it is shared across processes.
+
+    If the configured cache is not defined, e.g. in local settings that
+    replace **CACHES**, the default cache is used instead.
+
+    :param cache: Django cache alias (default: **IIIF_MANIFEST_CACHE**)
+    """
+
+    #: prefix for cache keys
+    key_prefix = "iiif-manifest"
+
+    def __init__(self, cache=None):
+        cache = cache or getattr(settings, "IIIF_MANIFEST_CACHE", "default")
+        try:
+            self.cache = caches[cache]
+        except InvalidCacheBackendError:
+            logger.warning(
+                "IIIF manifest cache %s is not configured; using default cache", cache
+            )
+            self.cache = caches["default"]
+        self.timeout = (
+            getattr(settings, "IIIF_MANIFEST_CONNECT_TIMEOUT", 3),
+            getattr(settings, "IIIF_MANIFEST_READ_TIMEOUT", 10),
+        )
+        self.cache_timeout = getattr(settings, "IIIF_MANIFEST_CACHE_TIMEOUT", None)
+        self.max_failures = getattr(settings, "IIIF_MANIFEST_MAX_FAILURES", 5)
+        self.retry_after = getattr(settings, "IIIF_MANIFEST_RETRY_AFTER", 300)
+
+    def cache_key(self, url):
+        """Cache key for the response for a url"""
+        return "%s:%s" % (self.key_prefix, hashlib.sha1(url.encode()).hexdigest())
+
+    def host_key(self, host, state):
+        """Cache key for circuit breaker state for a remote host"""
+        return "%s:host:%s:%s" % (self.key_prefix, state, host)
+
+    def is_available(self, host):
+        """Check if requests can be made to a host, i.e. whether the circuit
+        breaker for the host is closed"""
+        return not self.cache.get(self.host_key(host, "unavailable"), False)
+
+    def record_failure(self, host):
+        """Count an error or timeout from a host, and stop making requests to
+        it if there have been too many consecutive failures"""
+        key = self.host_key(host, "failures")
+        # add is a no-op if the counter already exists
+        self.cache.add(key, 0, timeout=self.retry_after)
+        try:
+            failures = self.cache.incr(key)
+        except ValueError:
+            # counter expired between add and incr
+            failures = 1
+            self.cache.set(key, failures, timeout=self.retry_after)
+        if failures >= self.max_failures:
+            logger.warning(
+                "Not requesting IIIF manifests from %s for %ds after %d failures",
+                host,
+                self.retry_after,
+                failures,
+            )
+            self.cache.set(
+                self.host_key(host, "unavailable"), True, timeout=self.retry_after
+            )
+            self.cache.delete(key)
+
+    def record_success(self, host):
+        """Reset the count of consecutive failures for a host"""
+        self.cache.delete(self.host_key(host, "failures"))
+
+    def get(self, url):
+        """Get the JSON content of a IIIF manifest.
+
+        :param url: manifest url
+        :returns: manifest content as a dict
+        :raises: :class:`~piffle.presentation.IIIFException` if the manifest
+            could not be retrieved and no cached response is available
+        """
+        return self.fetch(url)[0]
+
+    def fetch(self, url):
+        """Get the JSON content of a IIIF manifest, and whether it has
+        changed since it was cached; content is unchanged when a cached
+        response is used or the remote server reports it is not modified.
+
+        :param url: manifest url
+        :returns: tuple of manifest content as a dict and a boolean
+            indicating if the content was changed
+        :raises: :class:`~piffle.presentation.IIIFException` if the manifest
+            could not be retrieved and no cached response is available
+        """
+        key = self.cache_key(url)
+        cached = self.cache.get(key)
+        if cached and cached["expires"] > time.time():
+            return cached["content"], False
+
+        host = urlparse(url).netloc
+        if not self.is_available(host):
+            if cached:
+                return cached["content"], False
+            raise IIIFException(
+                "Not retrieving manifest at %s: %s is unavailable" % (url, host)
+            )
+
+        headers = {}
+        if cached and cached["etag"]:
+            headers["If-None-Match"] = cached["etag"]
+        if cached and cached["last_modified"]:
+            headers["If-Modified-Since"] = cached["last_modified"]
+        try:
+            response = requests.get(url, headers=headers, timeout=self.timeout)
+        except requests.RequestException as err:
+            self.record_failure(host)
+            if cached:
+                logger.warning("Using expired IIIF manifest for %s: %s", url, err)
+                return cached["content"], False
+            raise IIIFException("Error retrieving manifest at %s: %s" % (url, err))
+
+        # server errors count toward the circuit breaker; client errors
+        # mean the host is responding
+        if response.status_code >= 500:
+            self.record_failure(host)
+            if cached:
+                return cached["content"], False
+        else:
+            self.record_success(host)
+
+        changed = False
+        if cached and response.status_code == requests.codes.not_modified:
+            content = cached["content"]
+        elif response.status_code == requests.codes.ok:
+            try:
+                content = response.json()
+            except ValueError:
+                raise IIIFException("No JSON found at %s" % url)
+            # servers that don't support conditional requests may still
+            # return the same content
+            changed = not cached or content != cached["content"]
+            cached = None
+        else:
+            raise IIIFException(
+                "Error retrieving manifest at %s: %s %s"
+                % (url, response.status_code, response.reason)
+            )
+
+        max_age = cache_max_age(response.headers)
+        if max_age is None:
+            self.cache.delete(key)
+        else:
+            self.cache.set(
+                key,
+                {
+                    "content": content,
+                    # a not modified response may omit validators
+                    "etag": response.headers.get("ETag")
+                    or (cached["etag"] if cached else None),
+                    "last_modified": response.headers.get("Last-Modified")
+                    or (cached["last_modified"] if cached else None),
+                    "expires": time.time() + max_age,
+                },
+                timeout=self.cache_timeout,
+            )
+        return content, changed
+
+
+class CachedIIIFPresentation(IIIFPresentation):
+    """:class:`~piffle.presentation.IIIFPresentation` that loads remote
+    manifests with the shared :class:`ManifestClient`"""
+
+    @classmethod
+    def from_url(cls, uri):
+        """Initialize from a url, using a cached response when available.
+
+        :raises: :class:`~piffle.presentation.IIIFException` if the manifest
+            could not be retrieved
+        """
+        return cls(ManifestClient().get(uri))
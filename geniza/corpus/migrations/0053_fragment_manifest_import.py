@@ -0,0 +1,39 @@
+# Generated by Django 5.2.4 on 2025-09-12 14:10
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("corpus", "0052_alter_documenttype_options_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="fragment",
+            name="manifest_status",
+            field=models.CharField(
+                blank=True,
+                choices=[("P", "Import pending"), ("F", "Import failed")],
+                editable=False,
+                max_length=2,
+                verbose_name="IIIF manifest status",
+            ),
+        ),
+        migrations.AddField(
+            model_name="fragment",
+            name="manifest_import_available",
+            field=models.DateTimeField(editable=False, null=True),
+        ),
+        migrations.AddField(
+            model_name="fragment",
+            name="manifest_import_attempts",
+            field=models.PositiveSmallIntegerField(default=0, editable=False),
+        ),
+        migrations.AddField(
+            model_name="fragment",
+            name="manifest_import_error",
+            field=models.TextField(blank=True, editable=False),
+        ),
+    ]
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.4 on 2025-09-19 10:32
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("corpus", "0053_fragment_manifest_import"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="document",
+            name="image_sequence",
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+    ]
@@ -1,4 +1,3 @@
-import itertools
 import logging
 import re
 from collections import defaultdict
@@ -17,27 +16,29 @@ from django.contrib.humanize.templatetags.humanize import ordinal
 from django.contrib.postgres.fields import ArrayField
 from django.core.exceptions import ValidationError
 from django.core.validators import RegexValidator
-from django.db import models
+from django.db import models, transaction
 from django.db.models.functions import Concat
 from django.db.models.query import Prefetch
 from django.db.models.signals import pre_delete
 from django.templatetags.static import static
 from django.urls import reverse
+from django.utils import timezone
 from django.utils.html import strip_tags
 from django.utils.safestring import mark_safe
 from django.utils.translation import get_language
 from django.utils.translation import gettext as _
-from djiffy.models import Manifest
+from djiffy.models import IIIFImage, Manifest
 from modeltranslation.manager import MultilingualQuerySet
 from parasolr.django.indexing import ModelIndexable
 from piffle.image import IIIFImageClient
-from piffle.presentation import IIIFException, IIIFPresentation
+from piffle.presentation import IIIFException
 from requests.exceptions import ConnectionError
 from taggit.managers import TaggableManager
 from unidecode import unidecode
 from urllib3.exceptions import HTTPError, NewConnectionError
 
 from geniza.annotations.models import Annotation
+from geniza.common.indexing import IndexDigestMixin, IndexProfiler, IndexQueue
 from geniza.common.models import (
     DisplayLabelMixin,
     TaggableMixin,
@@ -49,6 +50,7 @@ from geniza.common.utils import absolutize_url
 from geniza.corpus.annotation_utils import document_id_from_manifest_uri
 from geniza.corpus.dates import DocumentDateMixin, PartialDate, standard_date_display
 from geniza.corpus.iiif_utils import GenizaManifestImporter, get_iiif_string
+from geniza.corpus.manifest_client import CachedIIIFPresentation
 from geniza.corpus.solr_queryset import DocumentSolrQuerySet
 from geniza.footnotes.models import Creator, Footnote
 
@@ -256,6 +258,32 @@ class Fragment(TrackChangesModel):
 
     manifest = models.ForeignKey(Manifest, null=True, on_delete=models.SET_NULL)
 
+    MANIFEST_PENDING = "P"
+    MANIFEST_STATUS_PENDING = "Import pending"
+    MANIFEST_FAILED = "F"
+    MANIFEST_STATUS_FAILED = "Import failed"
+    MANIFEST_STATUS_CHOICES = (
+        (MANIFEST_PENDING, MANIFEST_STATUS_PENDING),
+        (MANIFEST_FAILED, MANIFEST_STATUS_FAILED),
+    )
+    #: status of a background import of the IIIF manifest, when
+    #: **IIIF_MANIFEST_IMPORT_BACKGROUND** is enabled; blank if there is
+    #: no import waiting or failed
+    manifest_status = models.CharField(
+        "IIIF manifest status",
+        max_length=2,
+        choices=MANIFEST_STATUS_CHOICES,
+        blank=True,
+        editable=False,
+    )
+    #: manifest import should not be attempted before this time (used for retries)
+    manifest_import_available = models.DateTimeField(null=True, editable=False)
+    #: number of failed attempts to import the manifest
+    manifest_import_attempts = models.PositiveSmallIntegerField(
+        default=0, editable=False
+    )
+    manifest_import_error = models.TextField(blank=True, editable=False)
+
     created = models.DateTimeField(auto_now_add=True)
     last_modified = models.DateTimeField(auto_now=True)
 
@@ -279,8 +307,9 @@ class Fragment(TrackChangesModel):
         :class:`~piffle.image.IIIFImageClient` and corresponding list of labels,
         or None if this fragement has no IIIF url associated."""
 
-        # if there is no iiif for this fragment, bail out
-        if not self.iiif_url:
+        # if there is no iiif for this fragment, or the manifest is waiting
+        # to be imported in the background, bail out
+        if not self.iiif_url or self.manifest_status == self.MANIFEST_PENDING:
             return None
         images = []
         labels = []
@@ -300,7 +329,7 @@ class Fragment(TrackChangesModel):
         # if not cached, load from remote url
         elif allow_network_reqs:
             try:
-                manifest = IIIFPresentation.from_url(self.iiif_url)
+                manifest = CachedIIIFPresentation.from_url(self.iiif_url)
                 for canvas in manifest.sequences[0].canvases:
                     image_id = canvas.images[0].resource.service.id
                     images.append(IIIFImageClient(*image_id.rsplit("/", 1)))
@@ -401,13 +430,27 @@ class Fragment(TrackChangesModel):
         # if iiif url is set and manifest is not available, or iiif url has changed,
         # import the manifest
         if self.iiif_url and not self.manifest or self.has_changed("iiif_url"):
+            if self.iiif_url and getattr(
+                settings, "IIIF_MANIFEST_IMPORT_BACKGROUND", False
+            ):
+                # don't restart the retry schedule for an import already waiting
+                if (
+                    self.has_changed("iiif_url")
+                    or self.manifest_status != self.MANIFEST_PENDING
+                ):
+                    self.queue_manifest_import()
             # if iiif url has changed and there is a value, import and update
-            if self.iiif_url:
+            elif self.iiif_url:
                 try:
                     # importer should return the relevant manifest
                     # (either newly imported or already in the database)
                     imported = GenizaManifestImporter().import_paths([self.iiif_url])
                     self.manifest = imported[0] if imported else None
+                    # clear any background import state once a manifest is loaded
+                    if self.manifest:
+                        self.manifest_status = ""
+                        self.manifest_import_attempts = 0
+                        self.manifest_import_error = ""
                 except (IIIFException, NewConnectionError):
                     # clear out the manifest if there was an error
                     self.manifest = None
@@ -421,8 +464,30 @@ class Fragment(TrackChangesModel):
             else:
                 # otherwise, clear the associated manifest (iiif url has been removed)
                 self.manifest = None
+                self.manifest_status = ""
 
+        # stored image sequences include the shelfmark in image labels
+        images_changed = self.pk and (
+            self.has_changed("iiif_url")
+            or self.has_changed("manifest_id")
+            or self.has_changed("shelfmark")
+        )
         super(Fragment, self).save(*args, **kwargs)
+        if images_changed:
+            Document.clear_image_sequences(self.documents.values_list("pk", flat=True))
+
+    def queue_manifest_import(self):
+        """Mark the IIIF manifest to be imported in the background by the
+        ``manifest_worker`` manage command, instead of loading it from the
+        remote server during the current request."""
+        self.manifest = None
+        self.manifest_status = self.MANIFEST_PENDING
+        self.manifest_import_available = timezone.now()
+        self.manifest_import_attempts = 0
+        self.manifest_import_error = ""
+        # if saved via admin, let the user know
+        if hasattr(self, "request"):
+            messages.info(self.request, "IIIF manifest will be imported shortly")
 
 
 class DocumentTypeManager(models.Manager):
@@ -468,6 +533,17 @@ class DocumentSignalHandlers:
         "source": "footnotes__source",
         "creator": "footnotes__source__authorship__creator",
         "annotation": "footnotes__annotation",
+        "person document relation": "persondocumentrelation",
+        "document place relation": "documentplacerelation",
+    }
+
+    # lookup from model verbose name to attribute on documents and field on
+    # the changed object for related records that documents share; all
+    # documents sharing the record need reindexing for related documents
+    shared_filter = {
+        "Related Fragment": ("textblock__fragment", "fragment_id"),
+        "person document relation": ("persondocumentrelation__person", "person_id"),
+        "document place relation": ("documentplacerelation__place", "place_id"),
     }
 
     @staticmethod
@@ -488,16 +564,25 @@ class DocumentSignalHandlers:
             )
             return
 
-        doc_filter = {"%s__pk" % doc_attr: instance.pk}
-        docs = Document.items_to_index().filter(**doc_filter)
-        if docs.exists():
+        doc_filter = models.Q(**{"%s__pk" % doc_attr: instance.pk})
+        # documents that share the related record, e.g. other documents on
+        # the same fragment, have it in their related documents
+        if model_name in DocumentSignalHandlers.shared_filter:
+            shared_attr, instance_attr = DocumentSignalHandlers.shared_filter[
+                model_name
+            ]
+            doc_filter |= models.Q(
+                **{"%s__pk" % shared_attr: getattr(instance, instance_attr)}
+            )
+        doc_ids = set(Document.objects.filter(doc_filter).values_list("pk", flat=True))
+        if doc_ids:
             logger.debug(
-                "%s %s, reindexing %d related document(s)",
+                "%s %s, queueing %d related document(s) for reindexing",
                 model_name,
                 mode,
-                docs.count(),
+                len(doc_ids),
             )
-            ModelIndexable.index_items(docs)
+            IndexQueue.add(Document, doc_ids)
 
     @staticmethod
     def related_save(sender, instance=None, raw=False, **_kwargs):
@@ -511,6 +596,21 @@ class DocumentSignalHandlers:
         # delegate to common method
         DocumentSignalHandlers.related_change(instance, raw, "delete")
 
+    @staticmethod
+    def related_image_change(sender, instance=None, raw=False, **_kwargs):
+        """clear stored image sequences for associated documents when a
+        textblock or annotation is saved or deleted"""
+        # connected separately from indexing signals, so that image
+        # sequences are kept up to date when indexing is disconnected
+        if raw or not instance.pk:
+            return
+        doc_attr = DocumentSignalHandlers.model_filter[instance._meta.verbose_name]
+        Document.clear_image_sequences(
+            Document.objects.filter(**{"%s__pk" % doc_attr: instance.pk}).values_list(
+                "pk", flat=True
+            )
+        )
+
 
 class TagSignalHandlers:
     """Signal handlers for :class:`taggit.Tag` records."""
@@ -525,8 +625,8 @@ class TagSignalHandlers:
         """Ensure document (=instance) is indexed after the tags m2m relationship is saved and the
         list of tags is pulled from the database, on any tag change."""
         if action in ["post_add", "post_remove", "post_clear"]:
-            logger.debug("taggit.TaggedItem %s, reindexing related document", action)
-            ModelIndexable.index_items(Document.objects.filter(pk=instance.pk))
+            logger.debug("taggit.TaggedItem %s, queueing related document", action)
+            IndexQueue.add(Document, [instance.pk])
 
 
 class DocumentQuerySet(MultilingualQuerySet):
@@ -583,7 +683,9 @@ class DescriptionAuthorship(models.Model):
         )
 
 
-class Document(ModelIndexable, DocumentDateMixin, PermalinkMixin, TaggableMixin):
+class Document(
+    IndexDigestMixin, ModelIndexable, DocumentDateMixin, PermalinkMixin, TaggableMixin
+):
     """A unified document such as a letter or legal document that
     appears on one or more fragments."""
 
@@ -595,6 +697,11 @@ class Document(ModelIndexable, DocumentDateMixin, PermalinkMixin, TaggableMixin)
     image_overrides = models.JSONField(
         null=False, blank=True, default=dict, verbose_name="Image Order/Rotation"
     )
+    #: precomputed list of this document's IIIF canvases in display order,
+    #: with image service, label, and rotation, as used by :meth:`iiif_images`;
+    #: None when it needs to be rebuilt from fragments, image overrides, and
+    #: annotations
+    image_sequence = models.JSONField(null=True, blank=True, editable=False)
     shelfmark_override = models.CharField(
         "Shelfmark Override",
         blank=True,
@@ -700,7 +807,24 @@ class Document(ModelIndexable, DocumentDateMixin, PermalinkMixin, TaggableMixin)
                 desc = re.sub(r"[\xa0 ]+", " ", desc)
                 setattr(self, "description_%s" % lang_code, desc)
 
+        # rebuild the stored image sequence on commit only when image overrides
+        # have changed (fragment changes are handled by textblock signals);
+        # otherwise keep the stored sequence, which may have been rebuilt
+        # since this instance was loaded
+        stored = (
+            Document.objects.filter(pk=self.pk)
+            .values("image_overrides", "image_sequence")
+            .first()
+            if self.pk
+            else None
+        )
+        images_changed = (
+            stored is None or stored["image_overrides"] != self.image_overrides
+        )
+        self.image_sequence = None if images_changed else stored["image_sequence"]
         super().save(*args, **kwargs)
+        if images_changed:
+            transaction.on_commit(lambda: Document.rebuild_image_sequences([self.pk]))
 
     # NOTE: inherits clean() method from DocumentDateMixin
     # make sure to call super().clean() if extending!
@@ -860,9 +984,16 @@ class Document(ModelIndexable, DocumentDateMixin, PermalinkMixin, TaggableMixin)
         Dict of IIIF images and labels for images of the Document's Fragments, keyed on canvas.
 
 
+        Uses the precomputed :attr:`image_sequence` when available.
+
         :param filter_side: if TextBlocks have side info, filter images by side (default: False)
         :param with_placeholders: if there are digital editions with canvases missing images,
             include placeholder images for each additional canvas (default: False)"""
+        if self.image_sequence is not None:
+            return self.sequence_images(
+                filter_side=filter_side, with_placeholders=with_placeholders
+            )
+
         iiif_images = {}
         textblocks = self.textblock_set.all()
 
@@ -952,6 +1083,80 @@ class Document(ModelIndexable, DocumentDateMixin, PermalinkMixin, TaggableMixin)
         )
         return ordered_images
 
+    def sequence_images(self, filter_side=False, with_placeholders=False):
+        """Dict of IIIF images and labels keyed on canvas, in the same format as
+        :meth:`iiif_images`, from the precomputed :attr:`image_sequence`."""
+        iiif_images = {}
+        for image_info in self.image_sequence:
+            image_info = dict(image_info)
+            canvas = image_info.pop("canvas")
+            if image_info.get("placeholder"):
+                if with_placeholders:
+                    iiif_images[canvas] = {
+                        **deepcopy(Document.PLACEHOLDER_CANVAS),
+                        **image_info,
+                    }
+            # excluded images are those not on the selected side
+            elif not filter_side or not image_info["excluded"]:
+                iiif_images[canvas] = {
+                    **image_info,
+                    "canvas": canvas,
+                    "image": IIIFImage(*image_info["image"].rsplit("/", 1)),
+                }
+        return iiif_images
+
+    def update_image_sequence(self):
+        """Compute and store :attr:`image_sequence` from fragments, image
+        overrides, and annotations. The sequence is not stored if any
+        fragment with a IIIF url does not have an imported manifest,
+        so that remote manifests are not requested; returns True if it
+        was stored."""
+        if any(
+            b.fragment.iiif_url and not b.fragment.manifest_id
+            for b in self.textblock_set.all()
+        ):
+            return False
+        self.image_sequence = None
+        sequence = []
+        for canvas, image_info in self.iiif_images(with_placeholders=True).items():
+            if image_info.get("placeholder"):
+                # placeholder image is a static file, added when read
+                image_info = {k: v for k, v in image_info.items() if k != "image"}
+            else:
+                # store image service id, i.e. remove /info.json
+                image_info = {**image_info, "image": image_info["image"].info()[:-10]}
+            sequence.append({**image_info, "canvas": canvas})
+        # update directly to avoid triggering a save and reindex
+        Document.objects.filter(pk=self.pk).update(image_sequence=sequence)
+        self.image_sequence = sequence
+        return True
+
+    @classmethod
+    def clear_image_sequences(cls, pks):
+        """Clear the stored image sequence for the specified documents, so
+        that images are computed from related records, and rebuild them when
+        the current transaction is committed."""
+        pks = set(pks)
+        if not pks:
+            return
+        cls.objects.filter(pk__in=pks).update(image_sequence=None)
+        transaction.on_commit(lambda: cls.rebuild_image_sequences(pks))
+
+    @classmethod
+    def rebuild_image_sequences(cls, pks=None):
+        """Rebuild image sequences for documents that do not have one,
+        optionally limited to the specified primary keys. Returns the number
+        of sequences stored."""
+        documents = cls.objects.filter(image_sequence__isnull=True).prefetch_related(
+            "textblock_set__fragment__manifest__canvases"
+        )
+        if pks is not None:
+            documents = documents.filter(pk__in=pks)
+        return sum(
+            document.update_image_sequence()
+            for document in documents.iterator(chunk_size=500)
+        )
+
     def list_thumbnail(self):
         """generate html for thumbnail of first image, for display in related documents lists"""
         iiif_images = self.iiif_images(thumbnail=True)
@@ -1014,9 +1219,12 @@ class Document(ModelIndexable, DocumentDateMixin, PermalinkMixin, TaggableMixin)
     @cached_property
     def related_documents(self):
         """List of other documents with any of the same shelfmarks as this
-        document; does not include suppressed documents. Queries Solr and
-        returns a list of :class:`dict` objects."""
-        return DocumentSolrQuerySet().related_to(self)
+        document; does not include suppressed documents. Queries Solr once,
+        using related document ids stored at index time, and returns a
+        queryset with results cached for iterating and counting."""
+        related = DocumentSolrQuerySet().related_to(self)
+        related.get_response()
+        return related
 
     def has_transcription(self):
         """Admin display field indicating if document has a transcription."""
@@ -1195,25 +1403,33 @@ class Document(ModelIndexable, DocumentDateMixin, PermalinkMixin, TaggableMixin)
         return set([fn.source for fn in self.footnotes.all()])
         # return Source.objects.filter(footnote__document=self).distinct()
 
-    def attribution(self):
+    def attribution(self, extra_attributions=None):
         """Generate a tuple of three attribution components for use in IIIF manifests
-        or wherever images/transcriptions need attribution."""
+        or wherever images/transcriptions need attribution.
+
+        :param extra_attributions: optional list of attributions from image
+            manifests that have already been loaded; if not specified,
+            attributions are loaded from the remote manifests
+        """
 
         # NOTE: For individual fragment attribution, use :class:`Fragment` method instead.
 
         # keep track of unique attributions so we can include them all
         extra_attrs_set = set()
-        for url in self.iiif_urls():
-            # NOTE: If this url fails, may raise IIIFException
-            remote_manifest = IIIFPresentation.from_url(url)
-            # CUDL attribution has some variation in tags;
-            # would be nice to preserve tagged version,
-            # for now, ignore tags so we can easily de-dupe
-            try:
-                extra_attrs_set.add(strip_tags(remote_manifest.attribution))
-            except AttributeError:
-                # attribution is optional, so ignore if not present
-                pass
+        if extra_attributions is None:
+            extra_attributions = []
+            for url in self.iiif_urls():
+                # NOTE: If this url fails, may raise IIIFException
+                remote_manifest = CachedIIIFPresentation.from_url(url)
+                try:
+                    extra_attributions.append(remote_manifest.attribution)
+                except AttributeError:
+                    # attribution is optional, so ignore if not present
+                    pass
+        # CUDL attribution has some variation in tags;
+        # would be nice to preserve tagged version,
+        # for now, ignore tags so we can easily de-dupe
+        extra_attrs_set.update(strip_tags(attr) for attr in extra_attributions)
         pgp = _("Princeton Geniza Project")
         # Translators: attribution for local IIIF manifests
         attribution = _("Compilation by %(pgp)s." % {"pgp": pgp})
@@ -1266,11 +1482,7 @@ class Document(ModelIndexable, DocumentDateMixin, PermalinkMixin, TaggableMixin)
                 "textblock_set",
                 queryset=TextBlock.objects.select_related(
                     "fragment", "fragment__collection", "fragment__manifest"
-                ).prefetch_related(
-                    "fragment__manifest__canvases",
-                    "fragment__textblock_set",
-                    "fragment__textblock_set__document",
-                ),
+                ).prefetch_related("fragment__manifest__canvases"),
             ),
             Prefetch(
                 "footnotes",
@@ -1296,17 +1508,11 @@ class Document(ModelIndexable, DocumentDateMixin, PermalinkMixin, TaggableMixin)
             "languages",
             "log_entries",
             "dating_set",
-            "persondocumentrelation_set",
-            "documentplacerelation_set",
             Prefetch(
                 "textblock_set",
                 queryset=TextBlock.objects.select_related(
                     "fragment", "fragment__collection", "fragment__manifest"
-                ).prefetch_related(
-                    "fragment__manifest__canvases",
-                    "fragment__textblock_set",
-                    "fragment__textblock_set__document",
-                ),
+                ).prefetch_related("fragment__manifest__canvases"),
             ),
             Prefetch(
                 "footnotes",
@@ -1320,113 +1526,248 @@ class Document(ModelIndexable, DocumentDateMixin, PermalinkMixin, TaggableMixin)
                 ),
             ),
         )
+        cls.prep_index_relations(chunk)
         return chunk
 
+    @classmethod
+    def prep_index_relations(cls, documents):
+        """Set related document ids, count of people, and related place ids
+        for indexing on each of the specified documents, using a few
+        aggregate queries for all of the documents at once. Related
+        documents are any other documents, of any status, that share a
+        fragment, a person, or a place with a document."""
+        pks = [doc.pk for doc in documents]
+
+        def shared_documents(model, via):
+            # pairs of document ids linked to the same object through the
+            # relation model, e.g. the same fragment through textblocks
+            lookup = "%s__%s__document" % (via, model._meta.model_name)
+            related = defaultdict(set)
+            for doc_pk, other_pk in (
+                model.objects.filter(**{"%s__pk__in" % lookup: pks})
+                .values_list(lookup, "document")
+                .distinct()
+            ):
+                if doc_pk != other_pk:
+                    related[doc_pk].add(other_pk)
+            return related
+
+        # relation models are defined in entities; access via reverse relations
+        # to avoid a circular import
+        person_relation = cls.persondocumentrelation_set.rel.related_model
+        place_relation = cls.documentplacerelation_set.rel.related_model
+
+        # related documents: any other document on one of the same fragments,
+        # or related to one of the same people or places
+        related_documents = shared_documents(TextBlock, "fragment")
+        people_documents = shared_documents(person_relation, "person")
+        place_documents = shared_documents(place_relation, "place")
+
+        people_counts = dict(
+            person_relation.objects.filter(document__pk__in=pks)
+            .values("document")
+            .annotate(total=models.Count("pk"))
+            .values_list("document", "total")
+            .order_by()
+        )
+
+        places = defaultdict(list)
+        place_pairs = place_relation.objects.filter(document__pk__in=pks).values_list(
+            "document", "place"
+        )
+        for doc_pk, place_pk in place_pairs:
+            places[doc_pk].append(place_pk)
+
+        for doc in documents:
+            doc.index_relations = {
+                "related_document_pks": related_documents[doc.pk],
+                "people_document_pks": people_documents[doc.pk],
+                "place_document_pks": place_documents[doc.pk],
+                "people_count": people_counts.get(doc.pk, 0),
+                "place_pks": places[doc.pk],
+            }
+
     def index_data(self):
         """data for indexing in Solr"""
         index_data = super().index_data()
 
+        with IndexProfiler.section(self, "metadata"):
+            index_data.update(self.index_metadata())
+        with IndexProfiler.section(self, "dating"):
+            index_data.update(self.index_dating())
+        with IndexProfiler.section(self, "images"):
+            index_data.update(self.index_images())
+        with IndexProfiler.section(self, "relations"):
+            index_data.update(self.index_relation_counts())
+        with IndexProfiler.section(self, "footnotes"):
+            index_data.update(self.index_footnotes())
+        with IndexProfiler.section(self, "transcription"):
+            index_data.update(self.index_transcriptions())
+        with IndexProfiler.section(self, "log entries"):
+            index_data.update(self.index_input_date())
+
+        return index_data
+
+    def index_metadata(self):
+        """basic metadata, fragment, and language fields for indexing"""
         # get fragments via textblocks for correct order
         # and to take advantage of prefetching
         fragments = [tb.fragment for tb in self.textblock_set.all()]
+        return {
+            "pgpid_i": self.id,
+            # type gets matched back to DocumentType object in get_result_document, for i18n;
+            # should always be indexed in English
+            "type_s": (
+                (
+                    self.doctype.display_label_en
+                    or self.doctype.name_en
+                    or str(self.doctype)
+                )
+                if self.doctype
+                else "Unknown type"
+            ),
+            # use english description for now
+            "description_en_bigram": strip_tags(self.description_en),
+            "notes_t": self.notes or None,
+            "needs_review_t": self.needs_review or None,
+            # index shelfmark label as a string (combined shelfmark OR shelfmark override)
+            "shelfmark_s": self.shelfmark_display,
+            # index individual shelfmarks for search (includes uncertain fragments)
+            "fragment_shelfmark_ss": [f.shelfmark for f in fragments],
+            # index any old/historic shelfmarks as a list
+            # split multiple shelfmarks on any one fragment into a list;
+            # flatten the lists into a single list
+            "fragment_old_shelfmark_ss": list(
+                chain(*[f.old_shelfmarks.split("; ") for f in fragments])
+            ),
+            # library/collection possibly redundant?
+            "collection_ss": [str(f.collection) for f in fragments],
+            "tags_ss_lower": [t.name for t in self.tags.all()],
+            "status_s": self.get_status_display(),
+            "old_pgpids_is": self.old_pgpids,
+            "language_code_s": self.primary_lang_code,
+            "language_script_s": self.primary_script,
+            "language_name_ss": [str(l) for l in self.languages.all()],
+        }
 
-        # get related documents: other textblocks on this document's fragments
-        other_textblocks_docs = [
-            f.textblock_set.exclude(document__pk=self.pk).values_list(
-                "document__pk", flat=True
-            )
-            for f in fragments
-        ]
-        related_document_pks = set(itertools.chain.from_iterable(other_textblocks_docs))
+    def index_dating(self):
+        """document date and inferred dating fields for indexing"""
+        dating_range = self.dating_range()
+        return {
+            # combined original/standard document date for display
+            "document_date_t": strip_tags(self.document_date) or None,
+            # inferred document date for display
+            "document_dating_t": standard_date_display(
+                "/".join([d.isoformat() for d in dating_range if d])
+            ),
+            # date range for filtering
+            "document_date_dr": self.solr_date_range(),
+            # date range for filtering, but including inferred datings if any exist
+            "document_dating_dr": self.solr_dating_range(),
+            # historic date, for searching
+            # start/end of document date or date range
+            "start_date_i": (
+                self.start_date.numeric_format() if self.start_date else None
+            ),
+            "end_date_i": (
+                self.end_date.numeric_format(mode="max") if self.end_date else None
+            ),
+            # start/end of document date or date range, including inferred datings, for sort
+            "start_dating_i": (
+                dating_range[0].numeric_format() if dating_range[0] else None
+            ),
+            "end_dating_i": (
+                dating_range[1].numeric_format(mode="max") if dating_range[1] else None
+            ),
+        }
+
+    def index_images(self):
+        """IIIF image fields for indexing"""
         # filter by side so that search results only show the relevant side image(s)
         images = self.iiif_images(filter_side=True).values()
+        return {
+            # use image info link without trailing info.json to easily convert back to iiif image client
+            # NOTE: if/when piffle supports initializing from full image uris, we could simplify this
+            # code to index the full image url, with rotation overrides applied
+            "iiif_images_ss": [
+                img["image"].info()[:-10] for img in images  # i.e., remove /info.json
+            ],
+            "iiif_labels_ss": [img["label"] for img in images],
+            "iiif_rotations_is": [img["rotation"] for img in images],
+            "has_image_b": len(images) > 0,
+        }
+
+    def index_relation_counts(self):
+        """related document, people, and place fields for indexing"""
+        # related documents and people/place relations are set for the
+        # whole chunk when indexing in bulk; otherwise, query for this document.
+        # remove once used, so that a later reindex does not use stale data
+        if not hasattr(self, "index_relations"):
+            Document.prep_index_relations([self])
+        index_relations = self.__dict__.pop("index_relations")
         # get related place IDs for join query on document dates
-        places = list(self.documentplacerelation_set.values_list("place", flat=True))
-        index_data.update(
-            {
-                "pgpid_i": self.id,
-                # type gets matched back to DocumentType object in get_result_document, for i18n;
-                # should always be indexed in English
-                "type_s": (
-                    (
-                        self.doctype.display_label_en
-                        or self.doctype.name_en
-                        or str(self.doctype)
-                    )
-                    if self.doctype
-                    else "Unknown type"
-                ),
-                # use english description for now
-                "description_en_bigram": strip_tags(self.description_en),
-                "notes_t": self.notes or None,
-                "needs_review_t": self.needs_review or None,
-                # index shelfmark label as a string (combined shelfmark OR shelfmark override)
-                "shelfmark_s": self.shelfmark_display,
-                # index individual shelfmarks for search (includes uncertain fragments)
-                "fragment_shelfmark_ss": [f.shelfmark for f in fragments],
-                # index any old/historic shelfmarks as a list
-                # split multiple shelfmarks on any one fragment into a list;
-                # flatten the lists into a single list
-                "fragment_old_shelfmark_ss": list(
-                    chain(*[f.old_shelfmarks.split("; ") for f in fragments])
-                ),
-                # combined original/standard document date for display
-                "document_date_t": strip_tags(self.document_date) or None,
-                # inferred document date for display
-                "document_dating_t": standard_date_display(
-                    "/".join([d.isoformat() for d in self.dating_range() if d])
-                ),
-                # date range for filtering
-                "document_date_dr": self.solr_date_range(),
-                # date range for filtering, but including inferred datings if any exist
-                "document_dating_dr": self.solr_dating_range(),
-                # historic date, for searching
-                # start/end of document date or date range
-                "start_date_i": (
-                    self.start_date.numeric_format() if self.start_date else None
-                ),
-                "end_date_i": (
-                    self.end_date.numeric_format(mode="max") if self.end_date else None
-                ),
-                # start/end of document date or date range, including inferred datings, for sort
-                "start_dating_i": (
-                    self.dating_range()[0].numeric_format()
-                    if self.dating_range()[0]
-                    else None
-                ),
-                "end_dating_i": (
-                    self.dating_range()[1].numeric_format(mode="max")
-                    if self.dating_range()[1]
-                    else None
-                ),
-                # library/collection possibly redundant?
-                "collection_ss": [str(f.collection) for f in fragments],
-                "tags_ss_lower": [t.name for t in self.tags.all()],
-                "status_s": self.get_status_display(),
-                "old_pgpids_is": self.old_pgpids,
-                "language_code_s": self.primary_lang_code,
-                "language_script_s": self.primary_script,
-                "language_name_ss": [str(l) for l in self.languages.all()],
-                # use image info link without trailing info.json to easily convert back to iiif image client
-                # NOTE: if/when piffle supports initializing from full image uris, we could simplify this
-                # code to index the full image url, with rotation overrides applied
-                "iiif_images_ss": [
-                    img["image"].info()[:-10]  # i.e., remove /info.json
-                    for img in images
-                ],
-                "iiif_labels_ss": [img["label"] for img in images],
-                "iiif_rotations_is": [img["rotation"] for img in images],
-                "has_image_b": len(images) > 0,
-                "people_count_i": self.persondocumentrelation_set.count(),
-                "places_count_i": len(places),
-                "places_ids_ss": [f"place.{id}" for id in places],
-                "documents_count_i": len(related_document_pks),
-            }
-        )
+        places = index_relations["place_pks"]
+        return {
+            "people_count_i": index_relations["people_count"],
+            "places_count_i": len(places),
+            "places_ids_ss": [f"place.{id}" for id in places],
+            "documents_count_i": len(index_relations["related_document_pks"]),
+            "people_documents_count_i": len(index_relations["people_document_pks"]),
+            "places_documents_count_i": len(index_relations["place_document_pks"]),
+            # related document ids, as index ids for join queries
+            "related_documents_ss": [
+                f"document.{id}" for id in index_relations["related_document_pks"]
+            ],
+            "people_related_documents_ss": [
+                f"document.{id}" for id in index_relations["people_document_pks"]
+            ],
+            "places_related_documents_ss": [
+                f"document.{id}" for id in index_relations["place_document_pks"]
+            ],
+        }
 
-        # count scholarship records by type
+    def index_footnotes(self):
+        """scholarship record counts and fields for indexing"""
         footnotes = self.footnotes.all()
+        # count scholarship records by type
         counts = defaultdict(int)
+        # dict of sets of relations; keys are each source attached to any footnote on this document
+        source_relations = defaultdict(set)
+        for fn in footnotes:
+            # add any doc relations to this footnote's source's set in source_relations
+            source_relations[fn.source] = source_relations[fn.source].union(
+                fn.doc_relation
+            )
+
+        # make sure digital editions/translations are also counted,
+        # whether or not there is a separate edition/translation footnote
+        for source, doc_relations in source_relations.items():
+            if Footnote.DIGITAL_EDITION in doc_relations:
+                source_relations[source].add(Footnote.EDITION)
+            if Footnote.DIGITAL_TRANSLATION in doc_relations:
+                source_relations[source].add(Footnote.TRANSLATION)
+
+        # flatten sets of relations by source into a list of relations
+        for relation in list(chain(*source_relations.values())):
+            # add one for each relation in the flattened list
+            counts[relation] += 1
+
+        return {
+            "num_editions_i": counts[Footnote.EDITION],
+            "num_translations_i": counts[Footnote.TRANSLATION],
+            "num_discussions_i": counts[Footnote.DISCUSSION],
+            # count each unique source as one scholarship record
+            "scholarship_count_i": len(source_relations.keys()),
+            # preliminary scholarship record indexing
+            # (may need splitting out and weighting based on type of scholarship)
+            "scholarship_t": [fn.display() for fn in footnotes],
+            "has_digital_edition_b": bool(counts[Footnote.DIGITAL_EDITION]),
+            "has_digital_translation_b": bool(counts[Footnote.DIGITAL_TRANSLATION]),
+            "has_discussion_b": bool(counts[Footnote.DISCUSSION]),
+        }
+
+    def index_transcriptions(self):
+        """transcription and translation content fields for indexing"""
         # collect transcription and translation texts for indexing
         transcription_texts = []
         transcription_texts_plaintext = []
@@ -1440,24 +1781,28 @@ class Document(ModelIndexable, DocumentDateMixin, PermalinkMixin, TaggableMixin)
         # keep track of translation language names for faceted filtering
         translation_languages = []
 
-        # dict of sets of relations; keys are each source attached to any footnote on this document
-        source_relations = defaultdict(set)
-
-        for fn in footnotes:
+        for fn in self.footnotes.all():
+            # store rendered content if it is out of date, e.g. after changes
+            # to rendering code or annotations changed without signals
+            if (
+                Footnote.DIGITAL_EDITION in fn.doc_relation
+                or Footnote.DIGITAL_TRANSLATION in fn.doc_relation
+            ):
+                fn.update_render_cache()
             # if this is an edition/transcription, get html version for indexing
             if Footnote.DIGITAL_EDITION in fn.doc_relation:
-                content = fn.content_html_str
+                content = fn.content_html_lines
                 if content:
-                    transcription_texts.append(Footnote.explicit_line_numbers(content))
+                    transcription_texts.append(content)
                     fn_name = str(fn.source)
                     for canvas in fn.content_text_canvases:
                         # index plaintext only, per-canvas, for regex
                         transcription_texts_plaintext.append(canvas)
                         transcription_texts_plaintext_names.append(fn_name)
             elif Footnote.DIGITAL_TRANSLATION in fn.doc_relation:
-                content = fn.content_html_str
+                content = fn.content_html_lines
                 if content:
-                    translation_texts.append(Footnote.explicit_line_numbers(content))
+                    translation_texts.append(content)
                     fn_name = str(fn.source)
                     for canvas in fn.content_text_canvases:
                         # index plaintext only, per-canvas, for regex
@@ -1473,52 +1818,25 @@ class Document(ModelIndexable, DocumentDateMixin, PermalinkMixin, TaggableMixin)
                             for l in fn.source.languages.all()
                             if "Unspecified" not in l.name
                         ]
-            # add any doc relations to this footnote's source's set in source_relations
-            source_relations[fn.source] = source_relations[fn.source].union(
-                fn.doc_relation
-            )
 
-        # make sure digital editions/translations are also counted,
-        # whether or not there is a separate edition/translation footnote
-        for source, doc_relations in source_relations.items():
-            if Footnote.DIGITAL_EDITION in doc_relations:
-                source_relations[source].add(Footnote.EDITION)
-            if Footnote.DIGITAL_TRANSLATION in doc_relations:
-                source_relations[source].add(Footnote.TRANSLATION)
-
-        # flatten sets of relations by source into a list of relations
-        for relation in list(chain(*source_relations.values())):
-            # add one for each relation in the flattened list
-            counts[relation] += 1
-
-        index_data.update(
-            {
-                "num_editions_i": counts[Footnote.EDITION],
-                "num_translations_i": counts[Footnote.TRANSLATION],
-                "num_discussions_i": counts[Footnote.DISCUSSION],
-                # count each unique source as one scholarship record
-                "scholarship_count_i": len(source_relations.keys()),
-                # preliminary scholarship record indexing
-                # (may need splitting out and weighting based on type of scholarship)
-                "scholarship_t": [fn.display() for fn in footnotes],
-                # transcription content as html
-                "text_transcription": transcription_texts,
-                # transcription content as plaintext
-                "transcription_regex": transcription_texts_plaintext,
-                "transcription_regex_names_ss": transcription_texts_plaintext_names,
-                "translation_languages_ss": translation_languages,
-                "translation_language_code_s": translation_langcode,
-                "translation_language_direction_s": translation_langdir,
-                # translation content as html
-                "text_translation": translation_texts,
-                "translation_regex": translation_texts_plaintext,
-                "translation_regex_names_ss": translation_texts_plaintext_names,
-                "has_digital_edition_b": bool(counts[Footnote.DIGITAL_EDITION]),
-                "has_digital_translation_b": bool(counts[Footnote.DIGITAL_TRANSLATION]),
-                "has_discussion_b": bool(counts[Footnote.DISCUSSION]),
-            }
-        )
+        return {
+            # transcription content as html
+            "text_transcription": transcription_texts,
+            # transcription content as plaintext
+            "transcription_regex": transcription_texts_plaintext,
+            "transcription_regex_names_ss": transcription_texts_plaintext_names,
+            "translation_languages_ss": translation_languages,
+            "translation_language_code_s": translation_langcode,
+            "translation_language_direction_s": translation_langdir,
+            # translation content as html
+            "text_translation": translation_texts,
+            "translation_regex": translation_texts_plaintext,
+            "translation_regex_names_ss": translation_texts_plaintext_names,
+        }
 
+    def index_input_date(self):
+        """input date fields for indexing, based on log entries"""
+        index_data = {}
         # convert to list so we can do negative indexing, instead of calling last()
         # which incurs a database call
         try:
@@ -1544,7 +1862,6 @@ class Document(ModelIndexable, DocumentDateMixin, PermalinkMixin, TaggableMixin)
             index_data["input_date_dt"] = self.created.isoformat().replace(
                 "+00:00", "Z"
             )
-
         return index_data
 
     # define signal handlers to update the index based on changes
@@ -1582,6 +1899,14 @@ class Document(ModelIndexable, DocumentDateMixin, PermalinkMixin, TaggableMixin)
             "post_save": DocumentSignalHandlers.related_save,
             "pre_delete": DocumentSignalHandlers.related_delete,
         },
+        "entities.persondocumentrelation": {
+            "post_save": DocumentSignalHandlers.related_save,
+            "pre_delete": DocumentSignalHandlers.related_delete,
+        },
+        "entities.documentplacerelation": {
+            "post_save": DocumentSignalHandlers.related_save,
+            "pre_delete": DocumentSignalHandlers.related_delete,
+        },
     }
 
     @cached_property
@@ -0,0 +1,115 @@
+"""Highlighting for regular expression searches, which Solr cannot highlight"""
+
+import logging
+import time
+
+import regex
+from django.conf import settings
+
+logger = logging.getLogger(__name__)
+
+
+class RegexHighlighter:
+    """Highlight and truncate snippets of text for matches on a regular
+    expression search query. The query is compiled once, so a single
+    highlighter can be used for all text on a page of search results.
+
+    Matching for a highlighter is limited to a total budget of
+    **REGEX_HIGHLIGHT_TIMEOUT** seconds and **REGEX_HIGHLIGHT_MAX_MATCHES**
+    matches, so that a pathological pattern cannot tie up a worker; once
+    either is used up, no further text is highlighted.
+
+    :param query: regular expression search query
+    :param timeout: time budget in seconds (default: **REGEX_HIGHLIGHT_TIMEOUT**)
+    :param max_matches: maximum number of matches to highlight
+        (default: **REGEX_HIGHLIGHT_MAX_MATCHES**)
+    """
+
+    #: number of characters of context on either side of a match
+    context_chars = 150
+    #: separator for multiple matches in the same text
+    separator = "<br />[…]<br />"
+
+    def __init__(self, query, timeout=None, max_matches=None):
+        self.query = query
+        self.timeout = (
+            timeout
+            if timeout is not None
+            else getattr(settings, "REGEX_HIGHLIGHT_TIMEOUT", 2.0)
+        )
+        self.max_matches = max_matches or getattr(
+            settings, "REGEX_HIGHLIGHT_MAX_MATCHES", 1000
+        )
+        #: number of matches highlighted so far
+        self.matches = 0
+        #: set when the time or match budget is used up
+        self.exhausted = False
+        # time budget starts when the first text is highlighted
+        self.deadline = None
+        try:
+            # get ~150 characters of context plus a word on either side of
+            # the matched portion
+            self.pattern = regex.compile(
+                r"(\b\w*.{0,%(n)d})(%(q)s)(.{0,%(n)d}\w*\b)"
+                % {"n": self.context_chars, "q": query},
+                flags=regex.DOTALL,
+            )
+            # highlight any matches in added context (excluding HTML
+            # elements <em> and <br />)
+            self.context_pattern = regex.compile(
+                r"(?<!<em>)(?<!<)(?<!<\/)(%s)(?!>)(?!<\/em>)(?! \/>)" % query
+            )
+        except regex.error as err:
+            logger.warning("Cannot highlight regex query %r: %s", query, err)
+            self.pattern = None
+
+    def remaining(self):
+        """Seconds remaining in the time budget"""
+        if self.deadline is None:
+            self.deadline = time.monotonic() + self.timeout
+        return self.deadline - time.monotonic()
+
+    def stop(self, reason):
+        """Mark the budget as used up and log why"""
+        self.exhausted = True
+        logger.warning("Regex highlighting stopped (%s): %r", reason, self.query)
+
+    def highlight(self, text):
+        """Return highlighted snippets for matches in the text, or None if
+        there are no matches or the budget has been used up."""
+        if self.pattern is None or self.exhausted:
+            return None
+
+        snippets = []
+        try:
+            remaining = self.remaining()
+            if remaining <= 0:
+                self.stop("time limit")
+                return None
+            # last group is context after the match, since the query
+            # itself may contain groups
+            last_group = self.pattern.groups
+            for match in self.pattern.finditer(text, timeout=remaining):
+                # surround matched portion in <em> so it is visible in search results
+                snippets.append(
+                    "%s<em>%s</em>%s"
+                    % (match.group(1), match.group(2), match.group(last_group))
+                )
+                self.matches += 1
+                if self.matches >= self.max_matches:
+                    self.stop("match limit")
+                    break
+            if not snippets:
+                return None
+            # separate multiple matches by HTML line breaks and ellipsis
+            all_matches = self.context_pattern.sub(
+                r"<em>\1</em>",
+                self.separator.join(snippets),
+                timeout=max(self.remaining(), 0.001),
+            )
+        except TimeoutError:
+            self.stop("time limit")
+            return None
+
+        # ensure adjacent <em> elements with space between them can display properly
+        return all_matches.replace("</em> <em>", '</em> <em class="adjacent-em">')
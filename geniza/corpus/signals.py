@@ -0,0 +1,145 @@
+"""Signal handlers for recording deleted records that indexed records depend
+on, for incremental reindexing with the ``index_changes`` manage command"""
+
+import json
+
+from django.apps import apps
+from django.conf import settings
+from django.contrib.admin.models import DELETION, LogEntry
+from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.db.models import Q
+
+#: indexed models, with the related models (by app label) that trigger
+#: reindexing when they are saved or deleted and the lookups from the indexed
+#: model to each one; corresponds to the signal handler model filters
+RELATED_MODELS = {
+    "corpus.Document": {
+        "corpus.Fragment": "fragments",
+        "taggit.Tag": "tags",
+        "corpus.DocumentType": "doctype",
+        "corpus.TextBlock": "textblock",
+        "footnotes.Footnote": "footnotes",
+        "footnotes.Source": "footnotes__source",
+        "footnotes.Creator": "footnotes__source__authorship__creator",
+        "annotations.Annotation": "footnotes__annotation",
+        "entities.PersonDocumentRelation": "persondocumentrelation",
+        "entities.DocumentPlaceRelation": "documentplacerelation",
+    },
+    "entities.Person": {
+        "entities.Name": "names",
+        "entities.PersonRole": "roles",
+        "corpus.Document": "documents",
+        "entities.PersonPersonRelation": ["to_person", "from_person"],
+        "entities.PersonPlaceRelation": "personplacerelation",
+        "entities.PersonDocumentRelation": "persondocumentrelation",
+        "entities.PersonDocumentRelationType": "persondocumentrelation__type",
+    },
+    "entities.Place": {
+        "entities.Name": "names",
+        "entities.PersonPlaceRelation": "personplacerelation",
+        "entities.DocumentPlaceRelation": "documentplacerelation",
+    },
+}
+
+#: related models in :data:`RELATED_MODELS` whose deletions are logged by
+#: :func:`log_related_deletion`. Fragments, sources, and documents are left
+#: out, since deleting them also deletes text blocks, footnotes, or document
+#: relations, which are logged.
+LOGGED_DELETIONS = [
+    "corpus.TextBlock",
+    "taggit.Tag",
+    "corpus.DocumentType",
+    "footnotes.Footnote",
+    "footnotes.Creator",
+    "annotations.Annotation",
+    "entities.PersonDocumentRelation",
+    "entities.DocumentPlaceRelation",
+    "entities.Name",
+    "entities.PersonRole",
+    "entities.PersonPersonRelation",
+    "entities.PersonPlaceRelation",
+    "entities.PersonDocumentRelationType",
+]
+
+
+def related_ids(model, related_model, pks):
+    """Ids for records of the specified indexed model related to records
+    of a related model with any of the specified primary keys"""
+    lookups = RELATED_MODELS[model._meta.label][related_model._meta.label]
+    if not isinstance(lookups, list):
+        lookups = [lookups]
+    condition = Q()
+    for lookup in lookups:
+        condition |= Q(**{"%s__pk__in" % lookup: pks})
+    return set(model.objects.filter(condition).values_list("pk", flat=True))
+
+
+def log_related_deletion(sender, instance=None, **_kwargs):
+    """Pre-delete signal handler for models in :data:`LOGGED_DELETIONS`.
+
+    Before the record is deleted, finds the indexed records it belongs to,
+    since they can't be found from it afterwards, and records their ids in
+    a deletion log entry. Adds them to the entry logged for the deletion
+    (e.g. by the admin or the annotation API) when there is one; otherwise
+    logs a new entry as the script user."""
+    if not instance or not instance.pk:
+        return
+    related_model = type(instance)
+    affected = {}
+    for label, related_models in RELATED_MODELS.items():
+        if related_model._meta.label in related_models:
+            model = apps.get_model(label)
+            ids = related_ids(model, related_model, [instance.pk])
+            if ids:
+                affected[model._meta.label] = sorted(ids)
+    if not affected:
+        return
+
+    content_type = ContentType.objects.get_for_model(related_model)
+    log_entry = (
+        LogEntry.objects.filter(
+            content_type=content_type,
+            object_id=str(instance.pk),
+            action_flag=DELETION,
+        )
+        .order_by("-action_time")
+        .first()
+    )
+    if log_entry:
+        try:
+            change_info = json.loads(log_entry.change_message or "{}")
+        except json.JSONDecodeError:
+            change_info = None
+        # don't overwrite a plain text change message
+        if isinstance(change_info, dict):
+            change_info["reindex"] = affected
+            log_entry.change_message = json.dumps(change_info)
+            log_entry.save(update_fields=["change_message"])
+            return
+
+    script_user = User.objects.filter(username=settings.SCRIPT_USERNAME).first()
+    if script_user:
+        LogEntry.objects.log_action(
+            user_id=script_user.pk,
+            content_type_id=content_type.pk,
+            object_id=instance.pk,
+            object_repr=str(instance)[:200],
+            change_message=json.dumps({"reindex": affected}),
+            action_flag=DELETION,
+        )
+
+
+def deleted_related_ids(model, related_model, since):
+    """Ids for records of the specified indexed model that records of a
+    related model deleted since the specified time belonged to, based on
+    log entries recorded by :func:`log_related_deletion`"""
+    ids = set()
+    for message in LogEntry.objects.filter(
+        content_type=ContentType.objects.get_for_model(related_model),
+        action_flag=DELETION,
+        action_time__gte=since,
+        change_message__contains='"reindex"',
+    ).values_list("change_message", flat=True):
+        ids.update(json.loads(message)["reindex"].get(model._meta.label, []))
+    return ids
@@ -0,0 +1,70 @@
+"""Filter document querysets by the results of a Solr query, for admin
+search and list filters. Matching PGPIDs are streamed from Solr a page at a
+time using a cursor, and passed to the database as a single parameter that
+is joined server-side, rather than as a ``pk__in`` list with one SQL
+parameter per document."""
+
+from django.db import connection
+from django.db.models.expressions import RawSQL
+
+#: number of PGPIDs to request from Solr for each page of results
+PAGE_SIZE = 10000
+
+
+def iter_pgpids(solr_queryset, page_size=PAGE_SIZE):
+    """Generate the PGPIDs for all results of a
+    :class:`~geniza.corpus.solr_queryset.DocumentSolrQuerySet`, in result
+    order, paging through results with a cursor so that only one page of
+    results is held at a time.
+
+    :param solr_queryset: document Solr queryset
+    :param page_size: number of results to request per page
+    """
+    sqs = solr_queryset.only("pgpid").cursor()
+    while sqs is not None:
+        page = sqs[:page_size]
+        results = page.get_results()
+        for result in results:
+            yield result["pgpid"]
+        # a partial page is the last one; no need to request another
+        next_cursor = page.get_next_cursor() if len(results) == page_size else None
+        sqs = sqs.cursor(next_cursor) if next_cursor else None
+
+
+def filter_by_solr(queryset, solr_queryset, relevance=False):
+    """Filter a :class:`~geniza.corpus.models.Document` queryset to the
+    results of a Solr query. PGPIDs are sent to the database as a single
+    JSON object mapping each id to its position in the Solr results, which
+    is used both to filter and, if requested, to order by relevance.
+
+    :param queryset: document queryset to filter
+    :param solr_queryset: document Solr queryset to match
+    :param relevance: if True, order the queryset by Solr relevance score
+    :returns: filtered queryset; empty if there are no Solr results
+    """
+    if relevance:
+        solr_queryset = solr_queryset.order_by("-score")
+    id_ranks = ",".join(
+        '"%d":%d' % (pgpid, rank)
+        for rank, pgpid in enumerate(iter_pgpids(solr_queryset))
+    )
+    if not id_ranks:
+        return queryset.none()
+    id_ranks = "{%s}" % id_ranks
+
+    queryset = queryset.filter(
+        pk__in=RawSQL("SELECT (jsonb_object_keys(%s::jsonb))::integer", [id_ranks])
+    )
+    if relevance:
+        # jsonb object keys are looked up by binary search, so ranking
+        # each row does not require scanning all of the ids
+        pk_column = "%s.%s" % (
+            connection.ops.quote_name(queryset.model._meta.db_table),
+            connection.ops.quote_name(queryset.model._meta.pk.column),
+        )
+        queryset = queryset.annotate(
+            solr_rank=RawSQL(
+                "(%%s::jsonb ->> %s::text)::integer" % pk_column, [id_ranks]
+            )
+        ).order_by("solr_rank")
+    return queryset
@@ -1,14 +1,18 @@
-import itertools
 import re
+from collections import namedtuple
+from functools import lru_cache
 
-from bs4 import BeautifulSoup
 from django.apps import apps
+from django.conf import settings
 from django.utils.safestring import mark_safe
 from django.utils.translation import gettext as _
 from parasolr.django import AliasedSolrQuerySet
 from piffle.image import IIIFImageClient
 
+from geniza.corpus.html_snippets import balance_html
 from geniza.corpus.ja import arabic_or_ja
+from geniza.corpus.regex_highlight import RegexHighlighter
+from geniza.corpus.trigrams import regex_trigrams
 
 
 def clean_html(html_snippet):
@@ -31,12 +35,25 @@ def clean_html(html_snippet):
         else:
             html_snippet = f"<li>{ellipsis}{html_snippet}"
 
-    return BeautifulSoup(
-        html_snippet,
-        "html.parser",
-        # ensure li and em tags don't get extra whitespace, as this may break display
-        preserve_whitespace_tags=["li", "em"],
-    ).prettify(formatter="minimal")
+    # close or drop unbalanced tags; li and em tags don't get extra whitespace,
+    # as this may break display
+    return balance_html(html_snippet)
+
+
+#: rewritten search query, with the exact phrases, solr fields, hebrew prefix
+#: variants (word, unprefixed word), and transliterated text found in it
+SearchQueryPlan = namedtuple(
+    "SearchQueryPlan",
+    [
+        "query",
+        "phrases",
+        "fields",
+        "prefixed_words",
+        "transliterated",
+        "highlight_query",
+        "shelfmark_query",
+    ],
+)
 
 
 class DocumentSolrQuerySet(AliasedSolrQuerySet):
@@ -94,6 +111,8 @@ class DocumentSolrQuerySet(AliasedSolrQuerySet):
         "related_people": "people_count_i",
         "related_places": "places_count_i",
         "related_documents": "documents_count_i",
+        "people_related_documents": "people_documents_count_i",
+        "places_related_documents": "places_documents_count_i",
         "transcription_regex": "transcription_regex",
         "transcription_regex_names": "transcription_regex_names_ss",
         "description_regex": "description_regex",
@@ -144,100 +163,110 @@ class DocumentSolrQuerySet(AliasedSolrQuerySet):
     # hebrew prefixes that should be removed to produce an additional keyword to search
     re_hebrew_prefix = re.compile(r"\b(אל|[ולבכמהשׁפ])[\u0590-\u05fe]+\b")
 
-    def _handle_hebrew_prefixes(self, search_term):
+    @staticmethod
+    def _unprefixed(word):
+        # handle two-charater prefix אל by removing 2 chars
+        return word[2:] if word.startswith("אל") else word[1:]
+
+    @classmethod
+    def _handle_hebrew_prefixes(cls, search_term):
         # if any word begins with one of the prefixes, update search to include the word
         # without that prefix as well
-        prefixed_words = self.re_hebrew_prefix.finditer(search_term)
-        prefixed_words = [w.group(0) for w in prefixed_words]
-        if prefixed_words:
-            prefixed_or_nonprefixed_query = [
-                # handle two-charater prefix אל by removing 2 chars
-                f"({word} OR {word[2:] if word.startswith('אל') else word[1:]})"
-                for word in prefixed_words
-            ]
-            # use a custom delimiter to split on, since we need a capturing
-            # group in the original expression, but it changes the split function's
-            # behavior in an undesirable way
-            delim = "!SPLITME!"
-            nonprefixed_words = [
-                n
-                for n in re.sub(self.re_hebrew_prefix, delim, search_term).split(delim)
-                if n
-            ]
+        return cls.re_hebrew_prefix.sub(
+            lambda m: f"({m.group(0)} OR {cls._unprefixed(m.group(0))})",
+            search_term,
+        )
 
-            # stitch the search query back together
-            return "".join(
-                itertools.chain.from_iterable(
-                    (
-                        itertools.zip_longest(
-                            nonprefixed_words,
-                            prefixed_or_nonprefixed_query,
-                            fillvalue="",
-                        )
-                    )
-                )
-            )
-        return search_term
-
-    def _search_term_cleanup(self, search_term):
-        # adjust user search string before sending to solr
+    @classmethod
+    @lru_cache(maxsize=512)
+    def plan_query(cls, search_term):
+        """Parse and rewrite a user search string for Solr, in a single pass
+        over exact phrases and the text between them. Plans are kept in an
+        LRU cache, since the same query is rewritten several times per
+        request (keyword search, highlighting, counts).
 
+        :returns: :class:`SearchQueryPlan`
+        """
         # ignore " + " in search strings, so users can search on shelfmark joins
         search_term = search_term.replace(" + ", " ")
         # convert uppercase OR in BL shelfmark to lowercase
         # to avoid it being interpreted as a boolean
-        search_term = self.re_shelfmark_nonbool.sub("BL or", search_term)
-
-        # look for exact search, indicated by double quotes
-        exact_queries = self.re_exact_match.findall(search_term)
-        if exact_queries:
-            # store unmodified query for highlighting
-            self.highlight_query = search_term
+        search_term = cls.re_shelfmark_nonbool.sub("BL or", search_term)
+
+        parts = []
+        phrases = []
+        prefixed_words = []
+        transliterated = []
+
+        def rewrite_text(text):
+            # hebrew prefix variants, then judaeo-arabic/arabic variants
+            # (double-quoted phrases should NOT be converted to JA, as this
+            # breaks if any brackets or other sigla are in doublequotes)
+            prefixed_words.extend(
+                (m.group(0), cls._unprefixed(m.group(0)))
+                for m in cls.re_hebrew_prefix.finditer(text)
+            )
+            prefixed = cls._handle_hebrew_prefixes(text)
+            converted = arabic_or_ja(prefixed)
+            if converted != prefixed:
+                transliterated.append(text)
+            return converted
+
+        # look for exact search, indicated by double quotes; keep text and
+        # phrases in order, so that boolean operators and phrase order are preserved
+        position = 0
+        for match in cls.re_exact_match.finditer(search_term):
+            parts.append(rewrite_text(search_term[position : match.start()]))
+            phrase = match.group(0)
+            phrases.append(phrase)
             # limit any exact phrase searches to non-stemmed field
-            exact_phrases = [
-                f"(description_nostem:{m} OR transcription_nostem:{m})"
-                for m in self.re_exact_match.findall(search_term)
-            ]
-            # add in judaeo-arabic conversion for the rest (double-quoted phrase should NOT be
-            # converted to JA, as this breaks if any brackets or other sigla are in doublequotes)
-            remaining_phrases = [
-                arabic_or_ja(self._handle_hebrew_prefixes(p))
-                for p in self.re_exact_match.split(search_term)
-            ]
-            # stitch the search query back together, in order, so that boolean operators
-            # and phrase order are preserved
-            search_term = "".join(
-                itertools.chain.from_iterable(
-                    (
-                        itertools.zip_longest(
-                            remaining_phrases, exact_phrases, fillvalue=""
-                        )
-                    )
-                )
+            parts.append(
+                f"(description_nostem:{phrase} OR transcription_nostem:{phrase})"
             )
-        else:
-            search_term = arabic_or_ja(self._handle_hebrew_prefixes(search_term))
+            position = match.end()
+        parts.append(rewrite_text(search_term[position:]))
+        query = "".join(parts)
 
         # convert any field aliases used in search terms to actual solr fields
         # (i.e. "pgpid:950 shelfmark:ena" -> "pgpid_i:950 shelfmark_t:ena")
-        if ":" in search_term:
-            # if any of the field aliases occur with a colon, replace with actual solr field
-            search_term = self.re_solr_fields.sub(
-                lambda x: "%s:" % self.search_aliases[x.group(1)], search_term
-            )
-            # special case: shelfmark edismax query should NOT have colon
-            # like other fields
-            search_term = search_term.replace(
-                "%s:" % self.shelfmark_qf, self.shelfmark_qf
-            )
+        fields = []
+        shelfmark_query = None
+        if ":" in query:
+
+            def solr_field(match):
+                field = cls.search_aliases[match.group(1)]
+                fields.append(field)
+                # special case: shelfmark edismax query should NOT have colon
+                # like other fields
+                return field if field == cls.shelfmark_qf else "%s:" % field
+
+            query = cls.re_solr_fields.sub(solr_field, query)
             # special case: just a shelfmark query, in quotes
             quoted_shelfmark_query = re.fullmatch(
-                rf'{re.escape(self.shelfmark_qf)}".+?"', search_term
+                rf'{re.escape(cls.shelfmark_qf)}".+?"', query
             )
             if quoted_shelfmark_query:
-                self.shelfmark_query = quoted_shelfmark_query.group(0)
+                shelfmark_query = quoted_shelfmark_query.group(0)
+
+        return SearchQueryPlan(
+            query=query,
+            phrases=tuple(phrases),
+            fields=tuple(fields),
+            prefixed_words=tuple(prefixed_words),
+            transliterated=tuple(transliterated),
+            # if there are exact phrases, store unmodified query for highlighting
+            highlight_query=search_term if phrases else None,
+            shelfmark_query=shelfmark_query,
+        )
 
-        return search_term
+    def _search_term_cleanup(self, search_term):
+        # adjust user search string before sending to solr
+        plan = self.plan_query(search_term)
+        if plan.highlight_query:
+            self.highlight_query = plan.highlight_query
+        if plan.shelfmark_query:
+            self.shelfmark_query = plan.shelfmark_query
+        return plan.query
 
     # (adapted from mep)
     # edismax alias for searching on admin document pseudo-field;
@@ -288,6 +317,13 @@ class DocumentSolrQuerySet(AliasedSolrQuerySet):
             )
         return search
 
+    #: trigram fields used to prefilter regex searches, keyed on regex field
+    regex_trigram_fields = {
+        "transcription_regex": "transcription_trigram",
+        "translation_regex": "translation_trigram",
+        "description_regex": "description_trigram",
+    }
+
     def regex_search(self, field, search_term):
         """Build a Lucene query for searching with regular expressions.
         NOTE: this function may cause Lucene errors if input is not validated beforehand.
@@ -296,28 +332,63 @@ class DocumentSolrQuerySet(AliasedSolrQuerySet):
         # and slashes so that it is interpreted as regex by Lucene;
         # except shelfmark, since shelfmark regex must match entire field
         match_any = ".*" if "shelfmark" not in field else ""
-        search_term = f"/{match_any}{search_term}{match_any}/"
+        regex_term = f"/{match_any}{search_term}{match_any}/"
         # if this is shelfmark_regex, also search old_shelfmark_regex
         fields = [field] if "shelfmark" not in field else [field, f"old_{field}"]
         # match in the non-analyzed *_regex field
-        search = self.search(" OR ".join([f"{f}:{search_term}" for f in fields]))
+        search = self.search(" OR ".join([f"{f}:{regex_term}" for f in fields]))
+
+        # if enabled, filter to records that contain all of the literal
+        # trigrams any match must contain
+        trigram_field = self.regex_trigram_fields.get(field)
+        if trigram_field and getattr(settings, "REGEX_SEARCH_TRIGRAM_FILTER", False):
+            # escape backslashes and quotes for quoted terms
+            trigrams = [
+                t.replace("\\", "\\\\").replace('"', '\\"')
+                for t in regex_trigrams(search_term)
+            ]
+            if trigrams:
+                search = search.filter(
+                    " AND ".join(f'{trigram_field}:"{t}"' for t in trigrams)
+                )
         return search
 
     def related_to(self, document):
-        "Return documents related to the given document (i.e. shares any shelfmarks)"
-
-        # NOTE: using a string query filter because parasolr queryset
-        # currently doesn't provide any kind of not/exclude filter
-        return (
-            self.filter(status=document.PUBLIC_LABEL)
-            .filter("NOT pgpid_i:%d" % document.id)
-            .filter(
-                fragment_shelfmark_ss__in=[
-                    '"%s"' % f.shelfmark for f in document.fragments.all()
-                ]
-            )
+        """Return documents related to the given document (i.e. shares any
+        shelfmarks), based on the related document ids indexed for it"""
+        # join from the related document ids stored on the given document
+        # to the id of each related document; suppressed documents are
+        # indexed as related, so filter on status at query time
+        return self.filter(status=document.PUBLIC_LABEL).filter(
+            '{!join from=related_documents_ss to=id}id:"%s"' % document.index_id()
         )
 
+    #: cursor mark for the first page of results
+    FIRST_CURSOR = "*"
+
+    def cursor(self, cursor_mark=FIRST_CURSOR):
+        """Return a copy of this queryset that pages through results with a
+        Solr cursor instead of a start offset, so that deep pages cost no
+        more than the first. Solr requires the sort to include the unique
+        key field, so ``id`` is added as a final tiebreaker if not already
+        sorted on. Use slicing from 0 to set the number of rows."""
+        qs_copy = self.raw_query_parameters(cursorMark=cursor_mark)
+        if not any(opt.split()[0] == "id" for opt in qs_copy.sort_options):
+            qs_copy = qs_copy.order_by("id")
+        return qs_copy
+
+    def get_next_cursor(self):
+        """Cursor mark for the page of results after this one; None if this
+        queryset is not using a cursor, there are no more results, or Solr
+        returned an error."""
+        cursor_mark = self.raw_params.get("cursorMark")
+        response = self.get_response() if cursor_mark else None
+        if response:
+            next_cursor = response.response.get("nextCursorMark")
+            # solr returns the same cursor mark once results are exhausted
+            if next_cursor != cursor_mark:
+                return next_cursor
+
     def get_result_document(self, doc):
         # default implementation converts from attrdict to dict
         doc = super().get_result_document(doc)
@@ -344,32 +415,24 @@ class DocumentSolrQuerySet(AliasedSolrQuerySet):
 
         return doc
 
-    def get_regex_highlight(self, field, text):
-        """Helper method to manually highlight and truncate a snippet for regex matches
-        (automatic highlight unavailable due to solr regex search limitations)"""
-        # remove solr field name and lucene-required "match all" logic to get original query
-        regex_query = (
-            self.search_qs[0].replace(f"{field}:/.*", "").rsplit(".*/", maxsplit=1)[0]
-        )
-        # get ~150 characters of context plus a word on either side of the matched portion
-        pattern = r"(\b\w*.{0,150})(%s)(.{0,150}\w*\b)" % regex_query
-        # find all matches in the snippet
-        matches = re.findall(pattern, text, flags=re.DOTALL)
-        # separate multiple matches by HTML line breaks and ellipsis
-        separator = "<br />[…]<br />"
-        # surround matched portion in <em> so it is visible in search results; join all into string
-        joined_string = separator.join(
-            [f"{m[0]}<em>{m[1]}</em>{m[-1]}" for m in matches if m]
-        )
-        if not matches:
+    def get_regex_highlighter(self, field):
+        """Return a :class:`~geniza.corpus.regex_highlight.RegexHighlighter`
+        for the current regex search, if it is a search on the specified field;
+        otherwise None."""
+        prefix = f"{field}:/.*"
+        if not self.search_qs or not self.search_qs[0].startswith(prefix):
             return None
-        # highlight any matches in added context (excluding HTML elements <em> and <br />)
-        additional_matches_query = (
-            r"(?<!<em>)(?<!<)(?<!<\/)(%s)(?!>)(?!<\/em>)(?! \/>)" % regex_query
-        )
-        all_matches = re.sub(additional_matches_query, r"<em>\1</em>", joined_string)
-        # ensure adjacent <em> elements with space between them can display properly
-        return re.sub(r"<\/em> <em>", '</em> <em class="adjacent-em">', all_matches)
+        # remove solr field name and lucene-required "match all" logic to get original query
+        regex_query = self.search_qs[0][len(prefix) :].rsplit(".*/", maxsplit=1)[0]
+        return RegexHighlighter(regex_query)
+
+    def get_regex_highlight(self, field, text, highlighter=None):
+        """Helper method to manually highlight and truncate a snippet for regex matches
+        (automatic highlight unavailable due to solr regex search limitations).
+        Pass in a highlighter to reuse the compiled query and time budget across
+        multiple snippets."""
+        highlighter = highlighter or self.get_regex_highlighter(field)
+        return highlighter.highlight(text) if highlighter else None
 
     def get_old_shelfmark_regex_highlight(self, doc, text):
         """Get any matches on the old_shelfmark_regex field, then join them by semicolon"""
@@ -380,10 +443,11 @@ class DocumentSolrQuerySet(AliasedSolrQuerySet):
             [s for s in doc.get("old_shelfmark_regex", []) if re.fullmatch(query, s)]
         )
 
-    def get_highlights_and_labels(self, doc, regex_field):
+    def get_highlights_and_labels(self, doc, regex_field, highlighter=None):
         """For transcription_regex and translation_regex, which are multi-valued
         fields possibly pulling from multiple records, include citation label
         for each set of highlights."""
+        highlighter = highlighter or self.get_regex_highlighter(regex_field)
         return [
             {
                 "text": highlight,
@@ -392,7 +456,7 @@ class DocumentSolrQuerySet(AliasedSolrQuerySet):
             # these fields are split by block-level annotation/group
             for (highlight, label) in (
                 (
-                    self.get_regex_highlight(regex_field, block),
+                    self.get_regex_highlight(regex_field, block, highlighter),
                     # since the order of multivalued fields is stable in solr, we can
                     # map each entry of the names field to each entry of the text field
                     (
@@ -427,25 +491,54 @@ class DocumentSolrQuerySet(AliasedSolrQuerySet):
         if is_regex_search:
             # highlight regex results manually due to solr limitation
             highlights = {}
-            # highlighting takes place *after* solr, so use get_results()
-            for doc in self.get_results():
+            # compile the query once for all results; only the searched
+            # field has a highlighter
+            highlighters = {
+                field: self.get_regex_highlighter(field)
+                for field in [
+                    "transcription_regex",
+                    "translation_regex",
+                    "description_regex",
+                ]
+            }
+            # highlighting takes place *after* solr; use results already
+            # retrieved for this page, if there are any
+            if self._result_cache:
+                results = [
+                    self.get_result_document(doc) for doc in self._result_cache.docs
+                ]
+            else:
+                results = self.get_results()
+            for doc in results:
                 # highlight per document, keyed on id as expected in results
                 highlights[doc["id"]] = {
                     # include labels in case of matches across multiple transcriptions
                     "transcription": (
-                        self.get_highlights_and_labels(doc, "transcription_regex")
+                        self.get_highlights_and_labels(
+                            doc,
+                            "transcription_regex",
+                            highlighters["transcription_regex"],
+                        )
                         if "transcription_regex" in doc
                         else []
                     ),
                     "translation": (
-                        self.get_highlights_and_labels(doc, "translation_regex")
+                        self.get_highlights_and_labels(
+                            doc,
+                            "translation_regex",
+                            highlighters["translation_regex"],
+                        )
                         if "translation_regex" in doc
                         else []
                     ),
                     "description": [
                         hl
                         for hl in (
-                            self.get_regex_highlight("description_regex", block)
+                            self.get_regex_highlight(
+                                "description_regex",
+                                block,
+                                highlighters["description_regex"],
+                            )
                             for block in doc.get("description_regex", [])
                         )
                         if hl
@@ -0,0 +1,26 @@
+from io import StringIO
+
+from django.core.management import call_command
+
+from geniza.corpus.management.commands import benchmark_clean_html
+
+
+def test_handle():
+    stdout = StringIO()
+    call_command("benchmark_clean_html", "-n", "5", stdout=stdout)
+    output = stdout.getvalue()
+    assert "prettify" in output
+    # one line per sample snippet, plus the header
+    lines = output.strip().split("\n")
+    assert len(lines) == len(benchmark_clean_html.Command.sample_snippets) + 1
+    # both implementations give the same output for all samples
+    assert all(" yes " in line for line in lines[1:])
+
+
+def test_handle_snippets():
+    stdout = StringIO()
+    command = benchmark_clean_html.Command(stdout=stdout)
+    command.handle(snippets=["<li>foo <em>bar</em>"], number=5)
+    output = stdout.getvalue()
+    assert "<li>foo <em>bar</em>" in output
+    assert "Verso" not in output
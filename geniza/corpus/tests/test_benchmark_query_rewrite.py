@@ -0,0 +1,25 @@
+from io import StringIO
+
+from django.core.management import call_command
+
+from geniza.corpus.management.commands import benchmark_query_rewrite
+
+
+def test_handle():
+    stdout = StringIO()
+    call_command("benchmark_query_rewrite", "-n", "5", stdout=stdout)
+    output = stdout.getvalue()
+    assert "uncached" in output
+    # one line per sample query, plus the header
+    assert len(output.strip().split("\n")) == (
+        len(benchmark_query_rewrite.Command.sample_queries) + 1
+    )
+
+
+def test_handle_queries():
+    stdout = StringIO()
+    command = benchmark_query_rewrite.Command(stdout=stdout)
+    command.handle(queries=['"he divorced" tag:legal'], number=5)
+    output = stdout.getvalue()
+    assert '"he divorced" tag:legal' in output
+    assert "deed of sale" not in output
@@ -0,0 +1,25 @@
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+
+from geniza.corpus.management.commands import benchmark_regex_highlight
+
+
+def test_handle():
+    stdout = StringIO()
+    call_command("benchmark_regex_highlight", "-r", "2", "-s", "500", stdout=stdout)
+    output = stdout.getvalue()
+    assert "Highlighting 2 transcriptions" in output
+    for pattern in benchmark_regex_highlight.Command.sample_patterns:
+        assert pattern in output
+
+
+@pytest.mark.django_db
+def test_handle_documents(document):
+    stdout = StringIO()
+    command = benchmark_regex_highlight.Command(stdout=stdout)
+    command.handle(patterns=["test"], results=50, size=500, documents=True)
+    output = stdout.getvalue()
+    assert "Highlighting" in output
+    assert "test" in output
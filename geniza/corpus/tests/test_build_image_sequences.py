@@ -0,0 +1,23 @@
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+
+from geniza.corpus.models import Document
+
+
+@pytest.mark.django_db
+def test_build_image_sequences(document, join):
+    Document.objects.update(image_sequence=None)
+    stdout = StringIO()
+    call_command("build_image_sequences", stdout=stdout)
+    assert "Stored image sequences for 2 of 2 documents" in stdout.getvalue()
+    assert not Document.objects.filter(image_sequence__isnull=True).exists()
+
+    # only documents without a sequence are updated, unless all is requested
+    stdout = StringIO()
+    call_command("build_image_sequences", stdout=stdout)
+    assert "for 0 of 0 documents" in stdout.getvalue()
+    stdout = StringIO()
+    call_command("build_image_sequences", "--all", stdout=stdout)
+    assert "for 2 of 2 documents" in stdout.getvalue()
@@ -618,17 +618,15 @@ class TestDateListFilter:
         all_option = next(filter.choices(changelist))
         assert all_option["display"] == "All"
 
+    @patch("geniza.corpus.solr_filter.iter_pgpids")
     @patch("geniza.corpus.admin.DocumentSolrQuerySet")
-    def test_get_queryset_date_after(self, mock_dqs):
+    def test_get_queryset_date_after(self, mock_dqs, mock_iter_pgpids):
         Document.objects.create(doc_date_standard="2000")
         Document.objects.create(doc_date_standard="1240")
         queryset = Document.objects.all()
 
         # include all but one document in results
-        pks = [{"pgpid": doc.pk} for doc in queryset][1:]
-        mock_dqs.return_value.filter.return_value.only.return_value.get_results.return_value = (
-            pks
-        )
+        mock_iter_pgpids.return_value = [doc.pk for doc in queryset][1:]
 
         date_after_filter = DateAfterListFilter(
             request=Mock(),
@@ -678,12 +676,11 @@ class TestDateListFilter:
         # error message should be displayed
         mock_messages.error.assert_called()
 
+    @patch("geniza.corpus.solr_filter.iter_pgpids")
     @patch("geniza.corpus.admin.DocumentSolrQuerySet")
-    def test_get_queryset_empty_result(self, mock_dqs):
+    def test_get_queryset_empty_result(self, mock_dqs, mock_iter_pgpids):
         # set the result to empty list []
-        mock_dqs.return_value.filter.return_value.only.return_value.get_results.return_value = (
-            []
-        )
+        mock_iter_pgpids.return_value = []
         date_before_filter = DateBeforeListFilter(
             request=Mock(),
             params={DateBeforeListFilter.parameter_name: "1900"},
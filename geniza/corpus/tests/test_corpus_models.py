@@ -12,6 +12,7 @@ from django.contrib.contenttypes.models import ContentType
 from django.contrib.sites.models import Site
 from django.core.exceptions import ValidationError
 from django.db import IntegrityError
+from django.test import override_settings
 from django.urls import Resolver404, reverse
 from django.utils import timezone
 from django.utils.html import strip_tags
@@ -169,7 +170,7 @@ class TestFragment(TestCase):
         frag = Fragment.objects.create(shelfmark="TS 1")
         assert Fragment.objects.get_by_natural_key(frag.shelfmark) == frag
 
-    @patch("geniza.corpus.models.IIIFPresentation")
+    @patch("geniza.corpus.models.CachedIIIFPresentation")
     def test_iiif_thumbnails(self, mockiifpres):
         # no iiif, should use placeholders
         frag = Fragment(shelfmark="TS 1")
@@ -276,8 +277,10 @@ class TestFragment(TestCase):
     @pytest.mark.django_db
     @patch("geniza.corpus.models.GenizaManifestImporter")
     def test_iiif_images_iiifexception(self, mock_manifestimporter):
-        # patch IIIFPresentation.from_url to always raise IIIFException
-        with patch("geniza.corpus.models.IIIFPresentation") as mock_iiifpresentation:
+        # patch CachedIIIFPresentation.from_url to always raise IIIFException
+        with patch(
+            "geniza.corpus.models.CachedIIIFPresentation"
+        ) as mock_iiifpresentation:
             mock_iiifpresentation.from_url = Mock()
             mock_iiifpresentation.from_url.side_effect = IIIFException
             mock_manifestimporter.return_value.import_paths.return_value = []
@@ -432,6 +435,52 @@ class TestFragment(TestCase):
             frag.request, "Error loading IIIF manifest"
         )
 
+    @pytest.mark.django_db
+    @override_settings(IIIF_MANIFEST_IMPORT_BACKGROUND=True)
+    @patch("geniza.corpus.models.GenizaManifestImporter")
+    @patch("geniza.corpus.models.messages")
+    def test_save_queue_manifest_import(self, mock_messages, mock_manifestimporter):
+        frag = Fragment(shelfmark="TS 1", iiif_url="http://example.io/manifests/1")
+        frag.request = Mock()
+        frag.save()
+        # should be queued instead of imported
+        assert mock_manifestimporter.call_count == 0
+        assert frag.manifest_status == Fragment.MANIFEST_PENDING
+        assert frag.manifest_import_available <= timezone.now()
+        mock_messages.info.assert_called_with(
+            frag.request, "IIIF manifest will be imported shortly"
+        )
+        # no images until the manifest is imported
+        assert frag.iiif_images() is None
+
+        # retry schedule is kept when saved again with the same url
+        frag.manifest_import_attempts = 2
+        frag.save()
+        assert frag.manifest_import_attempts == 2
+        # but restarted when the url changes
+        frag.iiif_url = "http://example.io/manifests/2"
+        frag.save()
+        assert frag.manifest_import_attempts == 0
+
+        # status is cleared when url is removed
+        frag.iiif_url = ""
+        frag.save()
+        assert not frag.manifest_status
+
+        # status is cleared when a manifest is imported directly
+        frag.iiif_url = "http://example.io/manifests/3"
+        frag.save()
+        frag.manifest_import_attempts = 3
+        frag.manifest_import_error = "not found"
+        manifest = Manifest.objects.create(uri=frag.iiif_url, short_id="m3")
+        mock_manifestimporter.return_value.import_paths.return_value = [manifest]
+        with override_settings(IIIF_MANIFEST_IMPORT_BACKGROUND=False):
+            frag.save()
+        assert frag.manifest == manifest
+        assert not frag.manifest_status
+        assert frag.manifest_import_attempts == 0
+        assert not frag.manifest_import_error
+
     def test_clean(self):
         manifest_uri = "http://example.com/manifest/1"
         # strips out redundant uri when present
@@ -840,7 +889,7 @@ class TestDocument:
         # reactivate previous default (in case it matters for other tests)
         activate(current_lang)
 
-    @patch("geniza.corpus.models.IIIFPresentation")
+    @patch("geniza.corpus.models.CachedIIIFPresentation")
     def test_iiif_urls(self, mock_pres):
         # create example doc with two fragments with URLs
         doc = Document.objects.create()
@@ -1013,6 +1062,149 @@ class TestDocument:
             # should never have any selected
             assert 'class="selected"' not in thumbs
 
+    def test_update_image_sequence(self, source):
+        manifest = Manifest.objects.create(
+            uri="http://example.io/manifests/1", short_id="m1"
+        )
+        for i, label in enumerate(["1r", "1v"]):
+            Canvas.objects.create(
+                manifest=manifest,
+                label=label,
+                uri="canvas%d" % i,
+                iiif_image_id="http://example.co/iiif/ts-1/0000%d" % i,
+                short_id="c%d" % i,
+                order=i,
+            )
+        frag = Fragment.objects.create(
+            shelfmark="T-S 8J22.21", iiif_url=manifest.uri, manifest=manifest
+        )
+        doc = Document.objects.create(
+            image_overrides={"canvas1": {"order": 0, "rotation": 90}}
+        )
+        tb = TextBlock.objects.create(document=doc, fragment=frag, selected_images=[0])
+        fn = Footnote.objects.create(
+            source=source, content_object=doc, doc_relation=[Footnote.DIGITAL_EDITION]
+        )
+        canvas_str = f"{doc.permalink}iiif/textblock/{tb.pk}/canvas/2/"
+        Annotation.objects.create(
+            content={
+                "body": [{"value": "test annotation"}],
+                "target": {"source": {"id": canvas_str}},
+            },
+            footnote=fn,
+        )
+        images = doc.iiif_images(with_placeholders=True)
+
+        assert doc.update_image_sequence()
+        doc.refresh_from_db()
+        assert [img["canvas"] for img in doc.image_sequence] == [
+            "canvas1",
+            "canvas0",
+            canvas_str,
+        ]
+        assert doc.image_sequence[0]["image"] == "http://example.co/iiif/ts-1/00001"
+        assert doc.image_sequence[0]["rotation"] == 90
+        # stored sequence should produce the same images
+        with patch.object(Fragment, "iiif_images") as mock_frag_iiif:
+            stored_images = doc.iiif_images(with_placeholders=True)
+            mock_frag_iiif.assert_not_called()
+        assert list(stored_images.keys()) == list(images.keys())
+        for canvas, image_info in images.items():
+            stored_info = stored_images[canvas]
+            assert stored_info["label"] == image_info["label"]
+            assert stored_info.get("rotation") == image_info.get("rotation")
+        assert (
+            stored_images["canvas1"]["image"].info()
+            == images["canvas1"]["image"].info()
+        )
+        assert (
+            stored_images[canvas_str]["image"] == Document.PLACEHOLDER_CANVAS["image"]
+        )
+        # placeholders only when requested; filtered by selected side
+        assert list(doc.iiif_images().keys()) == ["canvas1", "canvas0"]
+        assert list(doc.iiif_images(filter_side=True).keys()) == ["canvas0"]
+
+    def test_update_image_sequence_not_imported(self):
+        doc = Document.objects.create()
+        frag = Fragment.objects.create(shelfmark="T-S 1", iiif_url="http://ex.io/1")
+        TextBlock.objects.create(document=doc, fragment=frag)
+        # manifest not imported; should not be stored
+        assert not doc.update_image_sequence()
+        doc.refresh_from_db()
+        assert doc.image_sequence is None
+
+    @patch.object(Document, "index_items")
+    def test_clear_image_sequences(
+        self, mock_indexitems, django_capture_on_commit_callbacks
+    ):
+        doc = Document.objects.create()
+        frag = Fragment.objects.create(shelfmark="T-S 1")
+        with django_capture_on_commit_callbacks(execute=True):
+            TextBlock.objects.create(document=doc, fragment=frag)
+        # rebuilt when the transaction is committed
+        doc.refresh_from_db()
+        assert doc.image_sequence == []
+
+        # changing the fragment iiif url clears the sequence
+        frag.iiif_url = "http://ex.io/1"
+        with django_capture_on_commit_callbacks(execute=False) as callbacks:
+            frag.save()
+        doc.refresh_from_db()
+        assert doc.image_sequence is None
+        # not rebuilt, since the manifest is not imported
+        for callback in callbacks:
+            callback()
+        doc.refresh_from_db()
+        assert doc.image_sequence is None
+
+        # changing the shelfmark clears the sequence, since labels include it
+        frag.iiif_url = ""
+        with django_capture_on_commit_callbacks(execute=True):
+            frag.save()
+        doc.refresh_from_db()
+        assert doc.image_sequence == []
+        frag.shelfmark = "T-S 2"
+        with django_capture_on_commit_callbacks(execute=False):
+            frag.save()
+        doc.refresh_from_db()
+        assert doc.image_sequence is None
+
+    @patch.object(Document, "index_items")
+    def test_save_image_sequence(
+        self, mock_indexitems, django_capture_on_commit_callbacks
+    ):
+        doc = Document.objects.create()
+        frag = Fragment.objects.create(shelfmark="T-S 1")
+        with django_capture_on_commit_callbacks(execute=True):
+            TextBlock.objects.create(document=doc, fragment=frag)
+        doc.refresh_from_db()
+        sequence = doc.image_sequence
+        assert sequence is not None
+
+        # unrelated changes keep the stored sequence
+        doc.description = "new description"
+        with patch.object(Document, "rebuild_image_sequences") as mock_rebuild:
+            with django_capture_on_commit_callbacks(execute=True):
+                doc.save()
+            mock_rebuild.assert_not_called()
+        doc.refresh_from_db()
+        assert doc.image_sequence == sequence
+
+        # stale sequence on the instance is not saved over the stored one
+        Document.objects.filter(pk=doc.pk).update(image_sequence=[{"canvas": "c1"}])
+        doc.save()
+        doc.refresh_from_db()
+        assert doc.image_sequence == [{"canvas": "c1"}]
+
+        # changed image overrides clear and rebuild the sequence
+        doc.image_overrides = {"c1": {"rotation": 90}}
+        with patch.object(Document, "rebuild_image_sequences") as mock_rebuild:
+            with django_capture_on_commit_callbacks(execute=True):
+                doc.save()
+            mock_rebuild.assert_called_once_with([doc.pk])
+        doc.refresh_from_db()
+        assert doc.image_sequence is None
+
     def test_fragment_urls(self):
         # create example doc with two fragments with URLs
         doc = Document.objects.create()
@@ -1311,6 +1503,64 @@ class TestDocument:
         all_old_shelfmarks.append(fragment2.old_shelfmarks)
         assert index_data["fragment_old_shelfmark_ss"] == all_old_shelfmarks
 
+    def test_prep_index_relations(self, document, join, person):
+        place = Place.objects.create()
+        DocumentPlaceRelation.objects.create(document=document, place=place)
+        PersonDocumentRelation.objects.create(document=document, person=person)
+        Document.prep_index_relations([document, join])
+        # document and join share a fragment
+        assert document.index_relations == {
+            "related_document_pks": {join.pk},
+            "people_document_pks": set(),
+            "place_document_pks": set(),
+            "people_count": 1,
+            "place_pks": [place.pk],
+        }
+        assert join.index_relations == {
+            "related_document_pks": {document.pk},
+            "people_document_pks": set(),
+            "place_document_pks": set(),
+            "people_count": 0,
+            "place_pks": [],
+        }
+        # should be used and removed by index_data
+        index_data = document.index_data()
+        assert not hasattr(document, "index_relations")
+        assert index_data["documents_count_i"] == 1
+        assert index_data["related_documents_ss"] == [f"document.{join.pk}"]
+        assert index_data["people_count_i"] == 1
+        assert index_data["places_ids_ss"] == [f"place.{place.pk}"]
+
+        # documents related to the same person or place are related documents
+        PersonDocumentRelation.objects.create(document=join, person=person)
+        DocumentPlaceRelation.objects.create(document=join, place=place)
+        Document.prep_index_relations([document])
+        assert document.index_relations["people_document_pks"] == {join.pk}
+        assert document.index_relations["place_document_pks"] == {join.pk}
+        index_data = document.index_data()
+        assert index_data["people_documents_count_i"] == 1
+        assert index_data["people_related_documents_ss"] == [f"document.{join.pk}"]
+        assert index_data["places_documents_count_i"] == 1
+        assert index_data["places_related_documents_ss"] == [f"document.{join.pk}"]
+
+    def test_prep_index_chunk_queries(
+        self, document, join, django_assert_max_num_queries
+    ):
+        # query count should not depend on the number of fragments
+        chunk = list(Document.items_to_index().filter(pk__in=[document.pk, join.pk]))
+        with django_assert_max_num_queries(40) as captured:
+            Document.prep_index_chunk(chunk)
+            [doc.index_data() for doc in chunk]
+        base_count = len(captured)
+        for i in range(3):
+            TextBlock.objects.create(
+                document=join, fragment=Fragment.objects.create(shelfmark=f"T-S {i}")
+            )
+        chunk = list(Document.items_to_index().filter(pk__in=[document.pk, join.pk]))
+        with django_assert_max_num_queries(base_count):
+            Document.prep_index_chunk(chunk)
+            [doc.index_data() for doc in chunk]
+
     def test_index_data_input_date(self):
         doc = Document.objects.create()
         # when no logentry exists, should still get the year from created attr
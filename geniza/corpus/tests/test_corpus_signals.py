@@ -1,98 +1,174 @@
+import json
 from unittest.mock import patch
 
 import pytest
-from parasolr.django.indexing import ModelIndexable
+from django.apps import apps
+from django.contrib.admin.models import DELETION, LogEntry
+from django.contrib.contenttypes.models import ContentType
 from taggit.models import Tag
 
+from geniza.common.indexing import IndexDigestMixin, IndexQueue
 from geniza.corpus.models import (
     Document,
     DocumentSignalHandlers,
     DocumentType,
     Fragment,
+    TextBlock,
 )
+from geniza.corpus.signals import LOGGED_DELETIONS, RELATED_MODELS
+from geniza.entities.models import DocumentPlaceRelation, PersonDocumentRelation, Place
 
 
 @pytest.mark.django_db
-@patch.object(ModelIndexable, "index_items")
-def test_related_save(mock_indexitems, document, join, footnote, annotation):
+@patch.object(IndexDigestMixin, "index_items")
+def test_related_save(
+    mock_indexitems,
+    document,
+    join,
+    footnote,
+    annotation,
+    django_capture_on_commit_callbacks,
+):
     # unsaved fragment should be ignored
     frag = Fragment(shelfmark="T-S 123")
 
     # unsaved - ignore
-    DocumentSignalHandlers.related_save(Fragment, frag)
+    with django_capture_on_commit_callbacks(execute=True):
+        DocumentSignalHandlers.related_save(Fragment, frag)
     mock_indexitems.assert_not_called()
     # raw - ignore
-    DocumentSignalHandlers.related_save(Fragment, frag, raw=True)
+    with django_capture_on_commit_callbacks(execute=True):
+        DocumentSignalHandlers.related_save(Fragment, frag, raw=True)
     mock_indexitems.assert_not_called()
     # saved but no associated documents
     frag.save()
-    DocumentSignalHandlers.related_save(Fragment, frag)
+    with django_capture_on_commit_callbacks(execute=True):
+        DocumentSignalHandlers.related_save(Fragment, frag)
     mock_indexitems.assert_not_called()
 
-    # fragment associated with a document
-    DocumentSignalHandlers.related_save(Fragment, document.fragments.first())
+    # fragment associated with a document; discard reindexing queued by
+    # fixture creation, so only the handler's records are flushed
+    IndexQueue.clear()
+    with django_capture_on_commit_callbacks(execute=True):
+        DocumentSignalHandlers.related_save(Fragment, document.fragments.first())
     assert mock_indexitems.call_count == 1
     assert document in mock_indexitems.call_args[0][0]
     assert join in mock_indexitems.call_args[0][0]
 
     # doctype
     mock_indexitems.reset_mock()
-    DocumentSignalHandlers.related_save(DocumentType, document.doctype)
+    with django_capture_on_commit_callbacks(execute=True):
+        DocumentSignalHandlers.related_save(DocumentType, document.doctype)
     assert mock_indexitems.call_count == 1
     assert document in mock_indexitems.call_args[0][0]
     assert join not in mock_indexitems.call_args[0][0]
 
     # footnote
     mock_indexitems.reset_mock()
-    DocumentSignalHandlers.related_save(DocumentType, document.footnotes.first())
+    with django_capture_on_commit_callbacks(execute=True):
+        DocumentSignalHandlers.related_save(DocumentType, document.footnotes.first())
     assert mock_indexitems.call_count == 1
     assert document in mock_indexitems.call_args[0][0]
 
     # source
     mock_indexitems.reset_mock()
-    DocumentSignalHandlers.related_save(DocumentType, document.footnotes.first().source)
+    with django_capture_on_commit_callbacks(execute=True):
+        DocumentSignalHandlers.related_save(
+            DocumentType, document.footnotes.first().source
+        )
     assert mock_indexitems.call_count == 1
     assert document in mock_indexitems.call_args[0][0]
 
     # creator
     mock_indexitems.reset_mock()
-    DocumentSignalHandlers.related_save(
-        DocumentType, document.footnotes.first().source.authorship_set.first().creator
-    )
+    with django_capture_on_commit_callbacks(execute=True):
+        DocumentSignalHandlers.related_save(
+            DocumentType,
+            document.footnotes.first().source.authorship_set.first().creator,
+        )
     assert mock_indexitems.call_count == 1
     assert document in mock_indexitems.call_args[0][0]
 
     # annotation
     mock_indexitems.reset_mock()
-    DocumentSignalHandlers.related_save(
-        DocumentType,
-        document.footnotes.filter(annotation__isnull=False)
-        .first()
-        .annotation_set.first(),
-    )
+    with django_capture_on_commit_callbacks(execute=True):
+        DocumentSignalHandlers.related_save(
+            DocumentType,
+            document.footnotes.filter(annotation__isnull=False)
+            .first()
+            .annotation_set.first(),
+        )
     assert mock_indexitems.call_count == 1
     assert document in mock_indexitems.call_args[0][0]
 
     # unhandled model should be ignored, no error
     mock_indexitems.reset_mock()
-    DocumentSignalHandlers.related_save(Document, document)
+    with django_capture_on_commit_callbacks(execute=True):
+        DocumentSignalHandlers.related_save(Document, document)
     mock_indexitems.assert_not_called()
 
 
 @pytest.mark.django_db
-@patch.object(ModelIndexable, "index_items")
-def test_related_delete(mock_indexitems, document, join):
+@patch.object(IndexDigestMixin, "index_items")
+def test_related_delete(
+    mock_indexitems, document, join, django_capture_on_commit_callbacks
+):
     # delegates to same method as save, just check a few cases
+    # (discard reindexing queued by fixture creation)
+    IndexQueue.clear()
 
     # fragment associated with a document
-    DocumentSignalHandlers.related_delete(Fragment, document.fragments.first())
+    with django_capture_on_commit_callbacks(execute=True):
+        DocumentSignalHandlers.related_delete(Fragment, document.fragments.first())
     assert mock_indexitems.call_count == 1
     assert document in mock_indexitems.call_args[0][0]
     assert join in mock_indexitems.call_args[0][0]
 
     # doctype
     mock_indexitems.reset_mock()
-    DocumentSignalHandlers.related_delete(DocumentType, document.doctype)
+    with django_capture_on_commit_callbacks(execute=True):
+        DocumentSignalHandlers.related_delete(DocumentType, document.doctype)
+    assert mock_indexitems.call_count == 1
+    assert document in mock_indexitems.call_args[0][0]
+    assert join not in mock_indexitems.call_args[0][0]
+
+
+@pytest.mark.django_db
+@patch.object(IndexDigestMixin, "index_items")
+def test_related_save_shared(
+    mock_indexitems, document, join, person, django_capture_on_commit_callbacks
+):
+    # textblock: documents on the same fragment should also be reindexed,
+    # since their related documents change
+    textblock = document.textblock_set.first()
+    # discard reindexing queued by fixture creation
+    IndexQueue.clear()
+    with django_capture_on_commit_callbacks(execute=True):
+        DocumentSignalHandlers.related_save(TextBlock, textblock)
+    assert mock_indexitems.call_count == 1
+    assert document in mock_indexitems.call_args[0][0]
+    assert join in mock_indexitems.call_args[0][0]
+
+    # person document relation: other documents related to the same person
+    PersonDocumentRelation.objects.create(document=join, person=person)
+    relation = PersonDocumentRelation.objects.create(document=document, person=person)
+    mock_indexitems.reset_mock()
+    IndexQueue.clear()
+    with django_capture_on_commit_callbacks(execute=True):
+        DocumentSignalHandlers.related_save(PersonDocumentRelation, relation)
+    assert mock_indexitems.call_count == 1
+    assert document in mock_indexitems.call_args[0][0]
+    assert join in mock_indexitems.call_args[0][0]
+
+    # document place relation: only the document, if no other documents
+    # are related to the place
+    relation = DocumentPlaceRelation.objects.create(
+        document=document, place=Place.objects.create()
+    )
+    mock_indexitems.reset_mock()
+    IndexQueue.clear()
+    with django_capture_on_commit_callbacks(execute=True):
+        DocumentSignalHandlers.related_delete(DocumentPlaceRelation, relation)
     assert mock_indexitems.call_count == 1
     assert document in mock_indexitems.call_args[0][0]
     assert join not in mock_indexitems.call_args[0][0]
@@ -106,16 +182,51 @@ def test_unidecode_tags():
 
 
 @pytest.mark.django_db
-@patch.object(ModelIndexable, "index_items")
-def test_tagged_item_change(mock_indexitems, document):
+@patch.object(IndexDigestMixin, "index_items")
+def test_tagged_item_change(
+    mock_indexitems, document, django_capture_on_commit_callbacks
+):
     tag_count = document.tags.count()
     tag = Tag.objects.create(name="mu'ālim", slug="mualim")
     tag2 = Tag.objects.create(name="tag2", slug="tag2")
-    # should reindex document with the updated set of tags on save
-    document.tags.add(tag)
-    document.tags.add(tag2)
-    document.save()
-    # should be called at least once for the document post-save & once for the tags M2M change
-    assert mock_indexitems.call_count >= 2
-    # most recent call should have the full updated set of tags
+    IndexQueue.clear()
+    # should reindex document with the updated set of tags on commit
+    with django_capture_on_commit_callbacks(execute=True):
+        document.tags.add(tag)
+        document.tags.add(tag2)
+    # tag changes in the same transaction should be de-duplicated
+    # into a single reindex for the document
+    assert mock_indexitems.call_count == 1
+    # reindex should have the full updated set of tags
     assert mock_indexitems.call_args.args[0][0].tags.count() == tag_count + 2
+
+
+def test_related_models():
+    # related models are identified by app label, since verbose names are
+    # ambiguous (e.g. wagtail documents and corpus documents)
+    assert RELATED_MODELS["entities.Person"]["corpus.Document"] == "documents"
+    related_labels = set()
+    for label, related_models in RELATED_MODELS.items():
+        apps.get_model(label)
+        for related_label in related_models:
+            assert apps.get_model(related_label)._meta.label == related_label
+        related_labels.update(related_models)
+    # only related models are logged
+    assert set(LOGGED_DELETIONS) < related_labels
+
+
+@pytest.mark.django_db
+def test_log_related_deletion_cascade(document, fragment):
+    # deleting a fragment deletes its text blocks, which are logged instead
+    fragment.delete()
+    assert not LogEntry.objects.filter(
+        content_type=ContentType.objects.get_for_model(Fragment),
+        action_flag=DELETION,
+    ).exists()
+    entry = LogEntry.objects.get(
+        content_type=ContentType.objects.get_for_model(TextBlock),
+        action_flag=DELETION,
+    )
+    assert json.loads(entry.change_message) == {
+        "reindex": {"corpus.Document": [document.pk]}
+    }
@@ -1,11 +1,17 @@
-from unittest.mock import patch
+from unittest.mock import Mock, patch
 
 import pytest
+from django.test import override_settings
 from parasolr.django import AliasedSolrQuerySet, SolrClient
 from piffle.image import IIIFImageClient
 
 from geniza.corpus.models import Document, DocumentType, TextBlock
-from geniza.corpus.solr_queryset import DocumentSolrQuerySet, clean_html
+from geniza.corpus.regex_highlight import RegexHighlighter
+from geniza.corpus.solr_queryset import (
+    DocumentSolrQuerySet,
+    SearchQueryPlan,
+    clean_html,
+)
 
 
 class TestDocumentSolrQuerySet:
@@ -232,6 +238,55 @@ class TestDocumentSolrQuerySet:
             == "((אלמרכב^100.0 OR المركب OR المرخب) OR (מרכב^100.0 OR مركب OR مرخب))"
         )
 
+    def test_handle_hebrew_prefixes__start(self):
+        # prefixed word at the start of the query should stay in place
+        assert (
+            DocumentSolrQuerySet._handle_hebrew_prefixes("משיח two")
+            == "(משיח OR שיח) two"
+        )
+
+    def test_plan_query(self):
+        plan = DocumentSolrQuerySet.plan_query('אלמרכב "he divorced" tag:legal')
+        assert isinstance(plan, SearchQueryPlan)
+        assert plan.phrases == ('"he divorced"',)
+        assert plan.fields == ("tags_ss_lower",)
+        assert plan.prefixed_words == (("אלמרכב", "מרכב"),)
+        assert plan.transliterated == ("אלמרכב ",)
+        assert plan.highlight_query == 'אלמרכב "he divorced" tag:legal'
+        assert plan.shelfmark_query is None
+        assert "tags_ss_lower:legal" in plan.query
+        assert (
+            '(description_nostem:"he divorced" OR transcription_nostem:"he divorced")'
+            in plan.query
+        )
+
+        # no phrases, aliases, prefixes or transliteration
+        plan = DocumentSolrQuerySet.plan_query("deed of sale")
+        assert plan.query == "deed of sale"
+        assert not any(
+            [
+                plan.phrases,
+                plan.fields,
+                plan.prefixed_words,
+                plan.transliterated,
+                plan.highlight_query,
+                plan.shelfmark_query,
+            ]
+        )
+
+    def test_plan_query__cached(self):
+        DocumentSolrQuerySet.plan_query.cache_clear()
+        dqs = DocumentSolrQuerySet()
+        dqs.keyword_search('"he divorced" shelfmark:NS')
+        dqs.keyword_search('"he divorced" shelfmark:NS')
+        cache_info = DocumentSolrQuerySet.plan_query.cache_info()
+        assert cache_info.misses == 1
+        assert cache_info.hits == 1
+        # cached plan still sets highlight query on each queryset
+        dqs = DocumentSolrQuerySet()
+        dqs._search_term_cleanup('"he divorced" shelfmark:NS')
+        assert dqs.highlight_query == '"he divorced" shelfmark:NS'
+
     def test_keyword_search__quoted_shelfmark(self):
         dqs = DocumentSolrQuerySet()
         with patch.object(dqs, "search") as mocksearch:
@@ -272,6 +327,36 @@ class TestDocumentSolrQuerySet:
         # should include related
         assert related_docs.filter(pgpid=join.id).count() == 1
 
+    def test_cursor(self):
+        dqs = DocumentSolrQuerySet()
+        # first page by default; unique key added to sort
+        cursor_qs = dqs.order_by("shelfmark_natsort").cursor()
+        assert cursor_qs.raw_params["cursorMark"] == "*"
+        assert cursor_qs.sort_options == ["shelfmark_natsort asc", "id asc"]
+        # unique key not added again if already sorted on
+        cursor_qs = dqs.order_by("-id").cursor("AoE")
+        assert cursor_qs.raw_params["cursorMark"] == "AoE"
+        assert cursor_qs.sort_options == ["id desc"]
+        # original queryset is unchanged
+        assert "cursorMark" not in dqs.raw_params
+
+    def test_get_next_cursor(self):
+        dqs = DocumentSolrQuerySet()
+        with patch.object(DocumentSolrQuerySet, "get_response") as mock_get_response:
+            # no cursor: no next cursor, and no query
+            assert dqs.get_next_cursor() is None
+            mock_get_response.assert_not_called()
+
+            cursor_qs = dqs.cursor()
+            mock_get_response.return_value.response = {"nextCursorMark": "AoE"}
+            assert cursor_qs.get_next_cursor() == "AoE"
+            # same cursor mark: no more results
+            mock_get_response.return_value.response = {"nextCursorMark": "*"}
+            assert cursor_qs.get_next_cursor() is None
+            # solr error
+            mock_get_response.return_value = None
+            assert cursor_qs.get_next_cursor() is None
+
     def test_clean_html(self):
         # whitespace should be unmodified within <li> tags; minimal prettifier in others
         assert clean_html("<li>foo</li><p>bar</p>") == "<li>foo</li>\n<p>\n bar\n</p>\n"
@@ -429,6 +514,35 @@ class TestDocumentSolrQuerySet:
                 assert "label" not in highlighting["document.1"]["transcription"][1]
                 assert highlighting["document.1"]["transcription"][2]["label"] == "src2"
 
+    def test_get_highlighting__regex__result_cache(self):
+        dqs = DocumentSolrQuerySet()
+        dqs.search_qs = ["transcription_regex:/.*test.*/"]
+        # results already retrieved for the page should be reused
+        dqs._result_cache = Mock(
+            docs=[{"id": "document.1", "transcription_regex": ["a test text"]}]
+        )
+        with patch.object(dqs, "get_results") as mock_get_results:
+            with patch.object(
+                dqs, "get_result_document", side_effect=lambda doc: doc
+            ) as mock_get_result_doc:
+                highlighting = dqs.get_highlighting()
+                mock_get_results.assert_not_called()
+                mock_get_result_doc.assert_called_once()
+        assert (
+            highlighting["document.1"]["transcription"][0]["text"]
+            == "a <em>test</em> text"
+        )
+
+    def test_get_regex_highlighter(self):
+        dqs = DocumentSolrQuerySet()
+        assert dqs.get_regex_highlighter("transcription_regex") is None
+        dqs.search_qs = ["transcription_regex:/.*te.*st.*/"]
+        highlighter = dqs.get_regex_highlighter("transcription_regex")
+        assert isinstance(highlighter, RegexHighlighter)
+        assert highlighter.query == "te.*st"
+        # not a search on this field
+        assert dqs.get_regex_highlighter("description_regex") is None
+
     def test_get_highlighting__old_shelfmark_regex(self):
         dqs = DocumentSolrQuerySet()
         # typical shelfmark_regex query (see DocumentSolrQueryset.regex_search)
@@ -464,6 +578,29 @@ class TestDocumentSolrQuerySet:
             dqs.regex_search(field, query)
             mocksearch.assert_called_with(f"{field}:/{query}/ OR old_{field}:/{query}/")
 
+    def test_regex_search__trigram_filter(self):
+        dqs = DocumentSolrQuerySet()
+        with patch.object(dqs, "search") as mocksearch:
+            # disabled by default
+            with override_settings(REGEX_SEARCH_TRIGRAM_FILTER=False):
+                dqs.regex_search("transcription_regex", "six apartments")
+                mocksearch.return_value.filter.assert_not_called()
+
+            with override_settings(REGEX_SEARCH_TRIGRAM_FILTER=True):
+                # should filter on trigrams required by the pattern
+                dqs.regex_search("transcription_regex", 'si\\"x.*apa')
+                mocksearch.return_value.filter.assert_called_with(
+                    'transcription_trigram:"si\\"" AND transcription_trigram:"i\\"x" '
+                    'AND transcription_trigram:"apa"'
+                )
+                mocksearch.reset_mock()
+                # no required trigrams: no filter
+                dqs.regex_search("transcription_regex", "ab|cd")
+                mocksearch.return_value.filter.assert_not_called()
+                # no trigram field for shelfmarks
+                dqs.regex_search("shelfmark_regex", "T-S 13J")
+                mocksearch.return_value.filter.assert_not_called()
+
     def test_get_regex_highlight(self):
         dqs = DocumentSolrQuerySet()
         field = "transcription_regex"
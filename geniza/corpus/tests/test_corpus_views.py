@@ -9,15 +9,17 @@ from django.contrib.admin.models import ADDITION, LogEntry
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
 from django.core.exceptions import ValidationError
-from django.test import TestCase
+from django.test import TestCase, override_settings
 from django.urls import resolve, reverse
 from django.utils.text import Truncator, slugify
 from django.utils.timezone import get_current_timezone, make_aware
+from djiffy.models import Canvas
 from parasolr.django import SolrClient
 from pytest_django.asserts import assertContains, assertNotContains
 from taggit.models import Tag
 
 from geniza.annotations.models import Annotation
+from geniza.common.solr_cache import CachedSolrClient, SolrIndexStats
 from geniza.common.utils import absolutize_url
 from geniza.corpus.iiif_utils import EMPTY_CANVAS_ID, new_iiif_canvas
 from geniza.corpus.models import Document, DocumentType, Fragment, TextBlock
@@ -28,6 +30,7 @@ from geniza.corpus.views import (
     DocumentManifestView,
     DocumentMerge,
     DocumentScholarshipView,
+    DocumentSearchAPIView,
     DocumentSearchView,
     DocumentTranscriptionText,
     SourceAutocompleteView,
@@ -477,7 +480,7 @@ class TestDocumentSearchView:
             docsearch_view.get_range_stats = Mock(return_value={})
             qs = docsearch_view.get_queryset()
 
-            mock_queryset_cls.assert_called_with()
+            mock_queryset_cls.assert_called_with(solr=docsearch_view.solr_client)
             mock_sqs = mock_queryset_cls.return_value
             mock_sqs.keyword_search.assert_called_with("six apartments")
             mock_sqs.keyword_search.return_value.highlight.assert_any_call(
@@ -602,6 +605,8 @@ class TestDocumentSearchView:
             }
             docsearch_view = DocumentSearchView()
             docsearch_view.request = Mock()
+            # disable stats caching
+            docsearch_view.solr_stats = SolrIndexStats(cache=False)
 
             # should not error if solr returns none
             stats = docsearch_view.get_range_stats(
@@ -1436,6 +1441,118 @@ class TestDocumentSearchView:
         assert dsv.get_apd_link("ואגב") == f"{dsv.apd_base_url}وا[غج]ب"
 
 
+class TestSolrQueryCacheMixin:
+    @patch("geniza.corpus.views.SolrQuerySet")
+    def test_solr_index_version(self, mock_sqs_cls):
+        mock_sqs = mock_sqs_cls.return_value
+        for method in ["filter", "order_by", "only"]:
+            getattr(mock_sqs, method).return_value = mock_sqs
+        mock_sqs.get_response.return_value.docs = [
+            {"last_modified": "2024-01-02T03:04:05Z"}
+        ]
+        mock_sqs.get_response.return_value.numFound = 12
+        dsv = DocumentSearchView()
+        dsv.request = Mock(GET={"sort": "relevance"})
+        assert dsv.solr_index_version == {
+            "last_modified": "2024-01-02T03:04:05Z",
+            "total": 12,
+        }
+        mock_sqs.filter.assert_called_with(item_type_s="document")
+        mock_sqs.order_by.assert_called_with("-last_modified")
+        mock_sqs.get_response.assert_called_with(rows=1)
+        assert dsv.get_solr_index_key() == "12-2024-01-02T03:04:05Z"
+        assert dsv.last_modified() == datetime(2024, 1, 2, 3, 4, 5).replace(
+            tzinfo=dsv.last_modified().tzinfo
+        )
+        # only queried once per view
+        assert mock_sqs.get_response.call_count == 1
+
+        # no results: no version
+        mock_sqs.get_response.return_value.docs = []
+        dsv = DocumentSearchView()
+        dsv.request = Mock(GET={"sort": "relevance"})
+        assert dsv.solr_index_version is None
+        assert dsv.get_solr_index_key() is None
+        assert dsv.last_modified() is None
+
+    def test_solr_client(self):
+        with override_settings(SOLR_QUERY_CACHE="default"):
+            dsv = DocumentSearchView()
+            assert isinstance(dsv.solr_client, CachedSolrClient)
+            assert dsv.solr_client.version == dsv.get_solr_index_key
+        with override_settings(SOLR_QUERY_CACHE=None):
+            dsv = DocumentSearchView()
+            assert isinstance(dsv.solr_client, SolrClient)
+
+
+class TestDocumentSearchAPIView:
+    def test_get(self, client, document, multifragment, empty_solr):
+        doc2 = Document.objects.create(description_en="Letter of appeal")
+        TextBlock.objects.create(document=doc2, fragment=multifragment)
+        doc3 = Document.objects.create(status=Document.SUPPRESSED)
+        SolrClient().update.index(
+            [document.index_data(), doc2.index_data(), doc3.index_data()],
+            commit=True,
+        )
+        api_url = reverse("corpus-uris:document-search-api")
+        # one result per page; sorted by shelfmark by default
+        response = client.get(api_url, {"per_page": 1})
+        assert response.status_code == 200
+        data = response.json()
+        # suppressed documents are not included
+        assert data["count"] == 2
+        assert data["cursor"] == "*"
+        assert len(data["results"]) == 1
+        result = data["results"][0]
+        assert result["pgpid"] == document.id
+        assert result["shelfmark"] == document.shelfmark
+        assert result["type"] == str(document.doctype)
+        assert result["url"] == absolutize_url(document.get_absolute_url())
+        # next page link preserves query parameters
+        assert data["next_cursor"]
+        assert "per_page=1" in data["next"]
+        assert "cursor=" in data["next"]
+
+        # next page
+        response = client.get(api_url, {"per_page": 1, "cursor": data["next_cursor"]})
+        data = response.json()
+        assert [r["pgpid"] for r in data["results"]] == [doc2.id]
+        # cursor does not change once results are exhausted
+        response = client.get(api_url, {"per_page": 1, "cursor": data["next_cursor"]})
+        data = response.json()
+        assert data["results"] == []
+        assert data["next_cursor"] is None
+        assert data["next"] is None
+
+        # search filters apply
+        response = client.get(api_url, {"q": "appeal"})
+        data = response.json()
+        assert data["count"] == 1
+        assert data["results"][0]["pgpid"] == doc2.id
+
+    def test_get_errors(self, client, empty_solr):
+        api_url = reverse("corpus-uris:document-search-api")
+        # invalid search options
+        response = client.get(api_url, {"sort": "relevance"})
+        assert response.status_code == 400
+        assert "q" in response.json()["errors"]
+        # invalid cursor
+        response = client.get(api_url, {"cursor": "foo"})
+        assert response.status_code == 400
+
+    def test_get_solr_sort(self):
+        api_view = DocumentSearchAPIView()
+        # random sort cannot be paged with a cursor
+        assert api_view.get_solr_sort("random") == "shelfmark_natsort"
+        assert api_view.get_solr_sort("scholarship_desc") == "-scholarship_count_i"
+
+    def test_random_no_redirect(self, client, empty_solr):
+        response = client.get(
+            reverse("corpus-uris:document-search-api"), {"sort": "random", "page": 2}
+        )
+        assert response.status_code == 200
+
+
 class TestDocumentScholarshipView:
     def test_page_title(self, document, client, source):
         """should incorporate doc title into scholarship page title"""
@@ -1506,8 +1623,8 @@ class TestDocumentScholarshipView:
         assert docsearch_view.get_paginate_by(qs) == 2
 
 
-@patch("geniza.corpus.views.IIIFPresentation")
-@patch("geniza.corpus.models.IIIFPresentation")
+@patch("geniza.corpus.views.CachedIIIFPresentation")
+@patch("geniza.corpus.models.CachedIIIFPresentation")
 class TestDocumentManifestView:
     view_name = "corpus-uris:document-manifest"
 
@@ -1553,7 +1670,10 @@ class TestDocumentManifestView:
         response = client.get(reverse(self.view_name, args=[document.pk]))
         assert response.status_code == 200
 
-        mock_view_iiifpres.from_url.assert_called_with(fragment.iiif_url)
+        # remote manifest is loaded in the view and not again for attribution
+        # (patches are applied bottom-up, so the view mock is the second argument)
+        mock_model_iiifpres.from_url.assert_called_with(fragment.iiif_url)
+        assert mock_view_iiifpres.from_url.call_count == 0
 
         # should not contain annotation list, since there is no transcription
         assertNotContains(response, "otherContent")
@@ -1655,6 +1775,94 @@ class TestDocumentManifestView:
             response, reverse("corpus-uris:document-annotations", args=[document.pk])
         )
 
+    def test_imported_canvases(
+        self, mock_view_iiifpres, mock_model_iiifpres, client, document, fragment
+    ):
+        # canvases imported with the fragment manifest should be used
+        fragment.manifest.label = "Imported content"
+        fragment.manifest.extra_data = {"attribution": "Imported attribution"}
+        fragment.manifest.save()
+        Canvas.objects.create(
+            manifest=fragment.manifest,
+            label="1r",
+            short_id="c1",
+            uri="urn:m1/c1",
+            iiif_image_id="https://iiif.example.io/images/c1",
+            order=0,
+            extra_data={"width": 100, "height": 200},
+        )
+        response = client.get(reverse(self.view_name, args=[document.pk]))
+        assert response.status_code == 200
+        # should not load the remote manifest
+        assert mock_view_iiifpres.from_url.call_count == 0
+        assert mock_model_iiifpres.from_url.call_count == 0
+        result = response.json()
+        assert "Imported attribution" in result["attribution"]
+        canvas_1 = result["sequences"][0]["canvases"][0]
+        assert canvas_1["@id"] == "urn:m1/c1"
+        assert canvas_1["width"] == 100
+        assert (
+            canvas_1["images"][0]["resource"]["service"]["@id"]
+            == "https://iiif.example.io/images/c1"
+        )
+        assert canvas_1["partOf"][0]["@id"] == fragment.manifest.uri
+        assert (
+            canvas_1["partOf"][0]["label"]["en"][0]
+            == "original source: Imported content"
+        )
+
+    @override_settings(DOCUMENT_MANIFEST_CACHE="default")
+    def test_cache_etag(
+        self, mock_view_iiifpres, mock_model_iiifpres, client, document, fragment
+    ):
+        mock_model_iiifpres.from_url.return_value.sequences = [
+            Mock(canvases=[{"@type": "sc:Canvas", "@id": "urn:m1/c1"}])
+        ]
+        url = reverse(self.view_name, args=[document.pk])
+        response = client.get(url)
+        assert response.status_code == 200
+        etag = response["ETag"]
+        assert mock_model_iiifpres.from_url.call_count == 1
+
+        # second request should use the cached manifest
+        response = client.get(url)
+        assert response["ETag"] == etag
+        assert response.json()["sequences"][0]["canvases"][0]["@id"] == "urn:m1/c1"
+        assert mock_model_iiifpres.from_url.call_count == 1
+
+        # not modified if the client has the current version
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 304
+
+        # version should change when the document changes
+        document.image_overrides = {"urn:m1/c1": {"order": 0}}
+        document.save()
+        response = client.get(url, HTTP_IF_NONE_MATCH=etag)
+        assert response.status_code == 200
+        assert response["ETag"] != etag
+        assert mock_model_iiifpres.from_url.call_count == 2
+
+    @override_settings(DOCUMENT_MANIFEST_CACHE=None)
+    def test_cache_disabled(
+        self, mock_view_iiifpres, mock_model_iiifpres, client, document
+    ):
+        url = reverse(self.view_name, args=[document.pk])
+        client.get(url)
+        client.get(url)
+        # manifest should be built for each request
+        assert mock_model_iiifpres.from_url.call_count == 2
+
+    @override_settings(IIIF_MANIFEST_FETCH_WORKERS=2)
+    def test_fetch_remote_manifests(self, mock_view_iiifpres, mock_model_iiifpres):
+        view = DocumentManifestView()
+        assert view.fetch_remote_manifests([]) == {}
+        mock_model_iiifpres.from_url.side_effect = lambda url: "manifest: %s" % url
+        urls = ["urn:m%d" % i for i in range(5)]
+        assert view.fetch_remote_manifests(urls) == {
+            url: "manifest: %s" % url for url in urls
+        }
+        assert mock_model_iiifpres.from_url.call_count == 5
+
     def test_get_absolute_url(
         self, mock_view_iiifpres, mock_model_iiifpres, document, source
     ):
@@ -1667,7 +1875,7 @@ class TestDocumentManifestView:
         assert view.get_absolute_url() == f"{document.permalink}iiif/manifest/"
 
 
-@patch("geniza.corpus.views.IIIFPresentation")
+@patch("geniza.corpus.views.CachedIIIFPresentation")
 class TestDocumentAnnotationListView:
     view_name = DocumentAnnotationListView.viewname
 
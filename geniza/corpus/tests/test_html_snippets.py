@@ -0,0 +1,46 @@
+from geniza.corpus.html_snippets import balance_html
+
+
+def test_balance_html():
+    # formatted with one tag or string per line, nested tags indented
+    assert balance_html("<p>foo <span>bar</span></p>") == (
+        "<p>\n foo\n <span>\n  bar\n </span>\n</p>\n"
+    )
+    # whitespace within li and em tags is preserved
+    assert balance_html("<li> foo <span>bar</span> </li>") == (
+        "<li> foo <span>bar</span> </li>\n"
+    )
+    assert balance_html("<p><em>foo</em> bar</p>") == (
+        "<p>\n <em>foo</em>\n bar\n</p>\n"
+    )
+
+
+def test_balance_html_unbalanced():
+    # closing tags with no matching open tag are dropped
+    assert balance_html("foo</span></li>") == "foo\n"
+    # open tags are closed at the end
+    assert balance_html("<li>foo <em>bar") == "<li>foo <em>bar</em></li>\n"
+    # closing a tag closes any tags opened within it
+    assert balance_html("<p>foo <b>bar</p>") == (
+        "<p>\n foo\n <b>\n  bar\n </b>\n</p>\n"
+    )
+    # a tag cut off at the end of the fragment is removed
+    assert balance_html('<li>foo</li>\n<li value="2">bar <sp') == (
+        '<li>foo</li>\n<li value="2">bar </li>\n'
+    )
+
+
+def test_balance_html_tags():
+    # void tags are self-closed; redundant closing tags are dropped
+    assert balance_html("foo<br>bar</br>") == "foo\n<br/>\nbar\n"
+    assert balance_html("<li>foo<br />bar</li>") == "<li>foo<br/>bar</li>\n"
+    # attributes are sorted and normalized
+    assert balance_html('<SPAN Title=\'a"b\' class=" x  y">foo</SPAN>') == (
+        '<span class="x y" title=\'a"b\'>\n foo\n</span>\n'
+    )
+    # entities are normalized
+    assert balance_html("<li>a &amp; b &lt; c&nbsp;d</li>") == (
+        "<li>a &amp; b &lt; c\xa0d</li>\n"
+    )
+    # comments are kept
+    assert balance_html("<!-- foo --><p>bar</p>") == "<!-- foo -->\n<p>\n bar\n</p>\n"
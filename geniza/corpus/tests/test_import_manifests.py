@@ -4,8 +4,10 @@ from unittest.mock import mock_open, patch
 import pytest
 from django.core.management import call_command
 from djiffy.models import Manifest
+from piffle.presentation import IIIFException
 
 from geniza.corpus.management.commands import add_fragment_urls, import_manifests
+from geniza.corpus.models import Document, Fragment, TextBlock
 
 
 @pytest.mark.django_db
@@ -53,3 +55,97 @@ def test_call_command(mock_importer):
     args, kwargs = mock_importer.return_value.import_paths.call_args
     # both should be imported
     assert args[0] == [uri]
+
+
+@pytest.mark.django_db
+@patch("geniza.corpus.management.commands.import_manifests.GenizaManifestImporter")
+@patch("geniza.corpus.management.commands.import_manifests.ManifestClient")
+def test_import_concurrently(
+    mock_client, mock_importer, fragment_no_manifest, multifragment_no_manifest
+):
+    # one manifest previously imported and unchanged; one changed
+    unchanged = {"@type": "sc:Manifest", "@id": fragment_no_manifest.iiif_url}
+    Manifest.objects.create(
+        uri=fragment_no_manifest.iiif_url,
+        short_id="m1",
+        extra_data={
+            "import_digest": import_manifests.Command.content_digest(unchanged)
+        },
+    )
+    content = {"@type": "sc:Manifest", "@id": multifragment_no_manifest.iiif_url}
+    db_manifest = Manifest.objects.create(
+        uri=multifragment_no_manifest.iiif_url,
+        short_id="m2",
+        extra_data={"import_digest": "old"},
+    )
+    mock_client.return_value.get.side_effect = lambda url: (
+        content if url == multifragment_no_manifest.iiif_url else unchanged
+    )
+    mock_importer.return_value.import_manifest.return_value = db_manifest
+    stdout = StringIO()
+    command = import_manifests.Command(stdout=stdout)
+    command.handle(update=True, workers=2)
+    # should retrieve both, but not import with the serial importer
+    assert mock_client.return_value.get.call_count == 2
+    mock_importer.return_value.import_paths.assert_not_called()
+    # should only import the changed manifest
+    assert mock_importer.return_value.import_manifest.call_count == 1
+    args, kwargs = mock_importer.return_value.import_manifest.call_args
+    assert args[0].id == multifragment_no_manifest.iiif_url
+    assert args[1] == multifragment_no_manifest.iiif_url
+    assert "Imported 1 manifests; skipped 1 unchanged; 0 errors" in stdout.getvalue()
+    # imported version should be recorded
+    db_manifest.refresh_from_db()
+    assert db_manifest.extra_data["import_digest"] == command.content_digest(content)
+
+    # errors are reported and do not stop the import
+    mock_importer.reset_mock()
+    mock_client.return_value.get.side_effect = IIIFException("unavailable")
+    command.handle(update=True, workers=2)
+    assert mock_importer.return_value.error_msg.call_count == 2
+    mock_importer.return_value.import_manifest.assert_not_called()
+
+    # local files are imported serially
+    mock_importer.reset_mock()
+    mock_client.reset_mock()
+    command.handle(
+        path=["/tmp/manifest.json", multifragment_no_manifest.iiif_url],
+        update=True,
+        workers=2,
+    )
+    mock_importer.return_value.import_paths.assert_called_with(["/tmp/manifest.json"])
+    mock_client.return_value.get.assert_called_once_with(
+        multifragment_no_manifest.iiif_url
+    )
+
+
+@pytest.mark.django_db
+@patch("geniza.corpus.management.commands.import_manifests.IndexQueue")
+def test_associate_manifests(
+    mock_indexqueue, fragment_no_manifest, multifragment_no_manifest
+):
+    document = Document.objects.create()
+    TextBlock.objects.create(document=document, fragment=fragment_no_manifest)
+    manifest = Manifest.objects.create(uri=fragment_no_manifest.iiif_url)
+    # url with extra slash should be cleaned up to match manifest
+    fragment_no_manifest.iiif_url = fragment_no_manifest.iiif_url.replace(
+        ".uk/", ".uk//"
+    )
+    Fragment.objects.filter(pk=fragment_no_manifest.pk).update(
+        iiif_url=fragment_no_manifest.iiif_url
+    )
+    stdout = StringIO()
+    command = import_manifests.Command(stdout=stdout)
+    command.associate_manifests()
+    assert "Updated 1 fragments with link to manifest" in stdout.getvalue()
+
+    fragment_no_manifest.refresh_from_db()
+    assert fragment_no_manifest.manifest == manifest
+    assert fragment_no_manifest.iiif_url == manifest.uri
+    multifragment_no_manifest.refresh_from_db()
+    assert multifragment_no_manifest.manifest is None
+    # documents for updated fragments should be reindexed together
+    mock_indexqueue.add.assert_called_once()
+    args, kwargs = mock_indexqueue.add.call_args
+    assert args[0] == Document
+    assert list(args[1]) == [document.pk]
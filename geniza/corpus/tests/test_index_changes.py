@@ -0,0 +1,214 @@
+import json
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+import pytest
+from django.contrib.admin.models import CHANGE, DELETION, LogEntry
+from django.contrib.contenttypes.models import ContentType
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from django.utils import timezone
+from requests.exceptions import ConnectionError
+
+from geniza.corpus.management.commands import index_changes
+from geniza.corpus.models import Document
+from geniza.entities.models import (
+    Person,
+    PersonDocumentRelation,
+    PersonDocumentRelationType,
+)
+from geniza.footnotes.models import Footnote, Source
+
+
+def test_modified_fields():
+    assert index_changes.modified_fields(Document) == ["last_modified"]
+    assert index_changes.modified_fields(Person) == []
+
+
+@pytest.mark.django_db
+def test_changed_ids(document, join, source, admin_user):
+    command = index_changes.Command()
+    since = timezone.now()
+    # nothing changed yet
+    assert command.changed_ids(Document, since) == set()
+
+    # document modified directly
+    document.save()
+    assert command.changed_ids(Document, since) == {document.pk}
+
+    # related fragment modified
+    since = timezone.now()
+    join.fragments.exclude(pk=document.fragments.first().pk).first().save()
+    assert command.changed_ids(Document, since) == {join.pk}
+
+    # log entry for a related source
+    since = timezone.now()
+    document.footnotes.create(source=source)
+    # clear out document modification
+    Document.objects.filter(pk=document.pk).update(
+        last_modified=since - timedelta(days=1)
+    )
+    assert command.changed_ids(Document, since) == set()
+    LogEntry.objects.log_action(
+        user_id=admin_user.id,
+        content_type_id=ContentType.objects.get_for_model(Source).pk,
+        object_id=source.pk,
+        object_repr=str(source),
+        change_message="edited",
+        action_flag=CHANGE,
+    )
+    assert command.changed_ids(Document, since) == {document.pk}
+
+
+@pytest.mark.django_db
+def test_changed_ids_person(person, document):
+    command = index_changes.Command()
+    since = timezone.now()
+    assert command.changed_ids(Person, since) == set()
+    # related document modified
+    person.documents.add(document)
+    document.save()
+    assert command.changed_ids(Person, since) == {person.pk}
+
+
+@pytest.mark.django_db
+def test_changed_ids_deleted(document, join, footnote, person, admin_user):
+    command = index_changes.Command()
+    relation = PersonDocumentRelation.objects.create(document=join, person=person)
+    since = timezone.now()
+    Document.objects.filter(pk__in=[document.pk, join.pk]).update(
+        last_modified=since - timedelta(days=1)
+    )
+    assert command.changed_ids(Document, since) == set()
+
+    # deleted footnote: document can no longer be found through it,
+    # so it is recorded when the footnote is deleted
+    footnote.delete()
+    entry = LogEntry.objects.get(
+        content_type=ContentType.objects.get_for_model(Footnote),
+        action_flag=DELETION,
+    )
+    assert json.loads(entry.change_message) == {
+        "reindex": {"corpus.Document": [document.pk]}
+    }
+    assert command.changed_ids(Document, since) == {document.pk}
+
+    # deleted relation, with a deletion already logged (e.g. by the admin):
+    # both the document and the person are added to the existing log entry
+    relation_ctype = ContentType.objects.get_for_model(PersonDocumentRelation)
+    LogEntry.objects.log_action(
+        user_id=admin_user.id,
+        content_type_id=relation_ctype.pk,
+        object_id=relation.pk,
+        object_repr=str(relation),
+        change_message="",
+        action_flag=DELETION,
+    )
+    relation.delete()
+    entry = LogEntry.objects.get(content_type=relation_ctype)
+    assert entry.user == admin_user
+    assert json.loads(entry.change_message) == {
+        "reindex": {"corpus.Document": [join.pk], "entities.Person": [person.pk]}
+    }
+    assert command.changed_ids(Document, since) == {document.pk, join.pk}
+    assert command.changed_ids(Person, since) == {person.pk}
+
+    # nothing recorded for related records without indexed records
+    PersonDocumentRelationType.objects.create(name="unused").delete()
+    assert not LogEntry.objects.filter(
+        content_type=ContentType.objects.get_for_model(PersonDocumentRelationType)
+    ).exists()
+
+
+@pytest.mark.django_db
+@patch("geniza.corpus.management.commands.index_changes.SolrClient")
+@patch.object(Person, "index_items")
+@patch.object(Document, "index_items")
+def test_handle(
+    mock_doc_index_items, mock_person_index_items, mock_solr, document, join, tmp_path
+):
+    mock_doc_index_items.side_effect = lambda items, **kwargs: items.count()
+    mock_person_index_items.return_value = 0
+    stdout = StringIO()
+    command = index_changes.Command(stdout=stdout)
+    command.lastrun_filename = tmp_path / "lastrun"
+
+    # no last run: index everything
+    command.handle(since=None, verbosity=1)
+    output = stdout.getvalue()
+    assert "No previous run found" in output
+    assert set(mock_doc_index_items.call_args[0][0]) == {document, join}
+    assert "Indexed 2 documents" in output
+    assert "Indexed 2 records" in output
+    mock_solr.return_value.update.index.assert_called_with([], commit=True)
+    # last run should be recorded
+    with open(command.lastrun_filename) as lastrun:
+        assert "index_changes" in json.load(lastrun)
+
+    # second run: only changed records are indexed
+    mock_solr.reset_mock()
+    document.save()
+    stdout.seek(0)
+    stdout.truncate()
+    command.handle(since=None, verbosity=1)
+    output = stdout.getvalue()
+    assert "Indexing records changed since" in output
+    assert list(mock_doc_index_items.call_args[0][0]) == [document]
+    assert "Indexed 1 document\n" in output
+
+    # nothing changed; nothing to commit
+    mock_solr.reset_mock()
+    command.handle(since=None, verbosity=0)
+    mock_solr.return_value.update.index.assert_not_called()
+
+
+@pytest.mark.django_db
+@patch("geniza.corpus.management.commands.index_changes.SolrClient")
+@patch.object(Document, "index_items")
+def test_handle_force(mock_index_items, mock_solr, document, tmp_path):
+    def index_items(items, force=False):
+        # simulate unchanged index data
+        if not force:
+            Document.index_stats["skipped"] += items.count()
+        return items.count()
+
+    mock_index_items.side_effect = index_items
+    stdout = StringIO()
+    command = index_changes.Command(stdout=stdout)
+    command.lastrun_filename = tmp_path / "lastrun"
+    command.handle(since=None, verbosity=1)
+    assert mock_index_items.call_args[1] == {"force": False}
+    assert "1 unchanged record not sent to Solr" in stdout.getvalue()
+
+    stdout.seek(0)
+    stdout.truncate()
+    command.handle(since=timezone.now() - timedelta(days=1), force=True, verbosity=1)
+    assert mock_index_items.call_args[1] == {"force": True}
+    assert "not sent to Solr" not in stdout.getvalue()
+
+
+@pytest.mark.django_db
+@patch.object(Document, "index_items")
+def test_handle_connection_error(mock_index_items, tmp_path):
+    mock_index_items.side_effect = ConnectionError
+    command = index_changes.Command(stdout=StringIO())
+    command.lastrun_filename = tmp_path / "lastrun"
+    with pytest.raises(CommandError):
+        command.handle(since=None, verbosity=0)
+    # last run should not be recorded
+    assert command.get_lastrun() is None
+
+
+@pytest.mark.django_db
+@patch("geniza.corpus.management.commands.index_changes.SolrClient")
+@patch.object(Document, "index_items")
+def test_call_command(mock_index_items, mock_solr, document, tmp_path):
+    mock_index_items.side_effect = lambda items, **kwargs: items.count()
+    stdout = StringIO()
+    with patch.object(
+        index_changes.Command, "lastrun_filename", str(tmp_path / "lastrun")
+    ):
+        call_command("index_changes", "--since", "2000-01-01", stdout=stdout)
+    assert "changed since 2000-01-01" in stdout.getvalue()
+    assert document in mock_index_items.call_args[0][0]
@@ -0,0 +1,155 @@
+from unittest.mock import Mock, patch
+
+import pytest
+import requests
+from django.core.cache import caches
+from django.test import override_settings
+from piffle.presentation import IIIFException
+
+from geniza.corpus.manifest_client import (
+    CachedIIIFPresentation,
+    ManifestClient,
+    cache_max_age,
+)
+
+MANIFEST_URL = "https://iiif.example.io/manifests/1"
+
+
+@pytest.fixture
+def manifest_client():
+    caches["default"].clear()
+    return ManifestClient(cache="default")
+
+
+def mock_response(status_code=200, content=None, headers=None):
+    return Mock(
+        status_code=status_code,
+        reason="reason",
+        headers=headers or {},
+        json=Mock(return_value=content),
+    )
+
+
+@override_settings(IIIF_MANIFEST_CACHE="missing")
+def test_missing_cache():
+    # falls back to the default cache when the alias is not configured
+    assert ManifestClient().cache is caches["default"]
+
+
+@override_settings(IIIF_MANIFEST_DEFAULT_MAX_AGE=60)
+def test_cache_max_age():
+    assert cache_max_age({"Cache-Control": "public, max-age=300"}) == 300
+    assert cache_max_age({"Cache-Control": "max-age=300, s-maxage=600"}) == 600
+    assert cache_max_age({"Cache-Control": "no-cache"}) == 0
+    assert cache_max_age({"Cache-Control": "no-store, max-age=300"}) is None
+    # default when not specified
+    assert cache_max_age({}) == 60
+    assert cache_max_age({"Cache-Control": "max-age=bogus"}) == 60
+
+
+@patch("geniza.corpus.manifest_client.requests.get")
+def test_get(mock_get, manifest_client):
+    mock_get.return_value = mock_response(
+        content={"@id": MANIFEST_URL},
+        headers={"Cache-Control": "max-age=300", "ETag": '"v1"'},
+    )
+    assert manifest_client.fetch(MANIFEST_URL) == ({"@id": MANIFEST_URL}, True)
+    mock_get.assert_called_with(
+        MANIFEST_URL, headers={}, timeout=manifest_client.timeout
+    )
+    # fresh cached response is used without a request
+    assert manifest_client.get(MANIFEST_URL) == {"@id": MANIFEST_URL}
+    assert mock_get.call_count == 1
+
+
+@patch("geniza.corpus.manifest_client.requests.get")
+def test_get_conditional(mock_get, manifest_client):
+    mock_get.return_value = mock_response(
+        content={"@id": MANIFEST_URL},
+        headers={
+            "Cache-Control": "no-cache",
+            "ETag": '"v1"',
+            "Last-Modified": "Wed, 21 Oct 2015 07:28:00 GMT",
+        },
+    )
+    manifest_client.get(MANIFEST_URL)
+    # expired response is revalidated with validators from the cached response
+    mock_get.return_value = mock_response(status_code=304)
+    assert manifest_client.get(MANIFEST_URL) == {"@id": MANIFEST_URL}
+    mock_get.assert_called_with(
+        MANIFEST_URL,
+        headers={
+            "If-None-Match": '"v1"',
+            "If-Modified-Since": "Wed, 21 Oct 2015 07:28:00 GMT",
+        },
+        timeout=manifest_client.timeout,
+    )
+    # validators are kept when not included in the not modified response
+    assert manifest_client.fetch(MANIFEST_URL) == ({"@id": MANIFEST_URL}, False)
+    assert mock_get.call_args.kwargs["headers"]["If-None-Match"] == '"v1"'
+
+    # same content without conditional request support is unchanged
+    mock_get.return_value = mock_response(
+        content={"@id": MANIFEST_URL}, headers={"Cache-Control": "no-cache"}
+    )
+    assert manifest_client.fetch(MANIFEST_URL) == ({"@id": MANIFEST_URL}, False)
+    mock_get.return_value = mock_response(
+        content={"@id": MANIFEST_URL, "label": "new"},
+        headers={"Cache-Control": "no-cache"},
+    )
+    assert manifest_client.fetch(MANIFEST_URL)[1] is True
+
+
+@patch("geniza.corpus.manifest_client.requests.get")
+def test_get_errors(mock_get, manifest_client):
+    mock_get.return_value = mock_response(status_code=404)
+    with pytest.raises(IIIFException):
+        manifest_client.get(MANIFEST_URL)
+
+    mock_get.return_value = mock_response()
+    mock_get.return_value.json.side_effect = ValueError
+    with pytest.raises(IIIFException):
+        manifest_client.get(MANIFEST_URL)
+
+    mock_get.side_effect = requests.Timeout
+    with pytest.raises(IIIFException):
+        manifest_client.get(MANIFEST_URL)
+
+    # expired cached response is used when the request fails
+    mock_get.side_effect = None
+    mock_get.return_value = mock_response(
+        content={"@id": MANIFEST_URL}, headers={"Cache-Control": "no-cache"}
+    )
+    manifest_client.get(MANIFEST_URL)
+    mock_get.side_effect = requests.ConnectionError
+    assert manifest_client.get(MANIFEST_URL) == {"@id": MANIFEST_URL}
+
+
+@override_settings(IIIF_MANIFEST_MAX_FAILURES=2)
+@patch("geniza.corpus.manifest_client.requests.get")
+def test_get_unavailable_host(mock_get):
+    caches["default"].clear()
+    manifest_client = ManifestClient(cache="default")
+    mock_get.side_effect = requests.Timeout
+    for _ in range(2):
+        with pytest.raises(IIIFException):
+            manifest_client.get(MANIFEST_URL)
+    assert not manifest_client.is_available("iiif.example.io")
+    # no more requests to the host after too many failures
+    with pytest.raises(IIIFException, match="unavailable"):
+        manifest_client.get("https://iiif.example.io/manifests/2")
+    assert mock_get.call_count == 2
+    # other hosts are not affected
+    mock_get.side_effect = None
+    mock_get.return_value = mock_response(content={})
+    manifest_client.get("https://other.example.io/manifests/1")
+    assert mock_get.call_count == 3
+
+
+@patch("geniza.corpus.manifest_client.ManifestClient")
+def test_cached_iiif_presentation(mock_client):
+    mock_client.return_value.get.return_value = {"@id": MANIFEST_URL, "label": "1"}
+    manifest = CachedIIIFPresentation.from_url(MANIFEST_URL)
+    assert manifest.id == MANIFEST_URL
+    assert manifest.label == "1"
+    mock_client.return_value.get.assert_called_with(MANIFEST_URL)
@@ -0,0 +1,183 @@
+from datetime import timedelta
+from io import StringIO
+from unittest.mock import patch
+
+import pytest
+from django.core.management import call_command
+from django.test import override_settings
+from django.utils import timezone
+from djiffy.models import Manifest
+from piffle.presentation import IIIFException
+
+from geniza.corpus.models import Fragment, TextBlock
+
+MANIFEST_URL = "https://iiif.example.io/manifests/1"
+
+
+@pytest.fixture
+def pending_fragment():
+    with override_settings(IIIF_MANIFEST_IMPORT_BACKGROUND=True):
+        return Fragment.objects.create(shelfmark="T-S 1", iiif_url=MANIFEST_URL)
+
+
+@pytest.mark.django_db
+@patch("geniza.corpus.management.commands.manifest_worker.CachedIIIFPresentation")
+@patch("geniza.corpus.management.commands.manifest_worker.GenizaManifestImporter")
+def test_process(mock_importer, mock_presentation, pending_fragment):
+    assert pending_fragment.manifest_status == Fragment.MANIFEST_PENDING
+    manifest = Manifest.objects.create(uri=MANIFEST_URL, short_id="m1")
+    mock_importer.return_value.import_manifest.return_value = manifest
+    stdout = StringIO()
+    call_command("manifest_worker", "--once", stdout=stdout)
+    mock_presentation.from_url.assert_called_with(MANIFEST_URL)
+    mock_importer.return_value.import_manifest.assert_called_with(
+        mock_presentation.from_url.return_value, MANIFEST_URL
+    )
+    assert "Processed 1 manifest import" in stdout.getvalue()
+    pending_fragment.refresh_from_db()
+    assert pending_fragment.manifest == manifest
+    assert not pending_fragment.manifest_status
+
+
+@pytest.mark.django_db
+@patch("geniza.corpus.management.commands.manifest_worker.CachedIIIFPresentation")
+@patch("geniza.corpus.management.commands.manifest_worker.GenizaManifestImporter")
+def test_process_claim(mock_importer, mock_presentation, pending_fragment):
+    # claim is committed before importing, so other workers skip the fragment
+    def check_claimed(*args):
+        fragment = Fragment.objects.get(pk=pending_fragment.pk)
+        assert fragment.manifest_import_available > timezone.now()
+        raise IIIFException("not found")
+
+    mock_presentation.from_url.side_effect = check_claimed
+    call_command("manifest_worker", "--once", stdout=StringIO(), stderr=StringIO())
+    mock_presentation.from_url.assert_called_once()
+    mock_importer.return_value.import_manifest.assert_not_called()
+
+
+@pytest.mark.django_db
+@patch("geniza.corpus.management.commands.manifest_worker.IndexQueue")
+@patch("geniza.corpus.management.commands.manifest_worker.CachedIIIFPresentation")
+@patch("geniza.corpus.management.commands.manifest_worker.GenizaManifestImporter")
+def test_process_edited(
+    mock_importer, mock_presentation, mock_indexqueue, pending_fragment, document
+):
+    TextBlock.objects.create(document=document, fragment=pending_fragment)
+    manifest = Manifest.objects.create(uri=MANIFEST_URL, short_id="m1")
+    mock_importer.return_value.import_manifest.return_value = manifest
+
+    # fragment is edited while the manifest is retrieved
+    def edit_fragment(*args):
+        Fragment.objects.filter(pk=pending_fragment.pk).update(notes="edited")
+
+    mock_presentation.from_url.side_effect = edit_fragment
+    call_command("manifest_worker", "--once", stdout=StringIO())
+    pending_fragment.refresh_from_db()
+    # manifest is associated without overwriting the edit
+    assert pending_fragment.manifest == manifest
+    assert pending_fragment.notes == "edited"
+    # documents on the fragment are queued for reindexing
+    args = mock_indexqueue.add.call_args[0]
+    assert list(args[1]) == [document.pk]
+
+
+@pytest.mark.django_db
+@patch("geniza.corpus.management.commands.manifest_worker.CachedIIIFPresentation")
+@patch("geniza.corpus.management.commands.manifest_worker.GenizaManifestImporter")
+def test_process_url_changed(mock_importer, mock_presentation, pending_fragment):
+    new_url = "https://iiif.example.io/manifests/2"
+
+    # iiif url is changed while the manifest is retrieved
+    def change_url(*args):
+        Fragment.objects.filter(pk=pending_fragment.pk).update(iiif_url=new_url)
+
+    mock_presentation.from_url.side_effect = change_url
+    call_command("manifest_worker", "--once", stdout=StringIO())
+    # old manifest is not imported or associated; new url is still waiting
+    mock_importer.return_value.import_manifest.assert_not_called()
+    pending_fragment.refresh_from_db()
+    assert pending_fragment.manifest is None
+    assert pending_fragment.iiif_url == new_url
+    assert pending_fragment.manifest_status == Fragment.MANIFEST_PENDING
+
+    # a failed attempt for the old url is not recorded against the new one
+    Fragment.objects.filter(pk=pending_fragment.pk).update(
+        iiif_url=MANIFEST_URL, manifest_import_available=timezone.now()
+    )
+
+    def change_url_error(*args):
+        change_url()
+        raise IIIFException("not found")
+
+    mock_presentation.from_url.side_effect = change_url_error
+    call_command("manifest_worker", "--once", stdout=StringIO(), stderr=StringIO())
+    pending_fragment.refresh_from_db()
+    assert pending_fragment.manifest_import_attempts == 0
+
+
+@pytest.mark.django_db
+@patch("geniza.corpus.management.commands.manifest_worker.CachedIIIFPresentation")
+@patch("geniza.corpus.management.commands.manifest_worker.GenizaManifestImporter")
+def test_process_error(mock_importer, mock_presentation, pending_fragment):
+    mock_presentation.from_url.side_effect = IIIFException("not found")
+    stderr = StringIO()
+    call_command("manifest_worker", "--once", stdout=StringIO(), stderr=stderr)
+    assert "Error importing manifest for T-S 1: not found" in stderr.getvalue()
+    # import should be kept and rescheduled
+    pending_fragment.refresh_from_db()
+    assert pending_fragment.manifest_status == Fragment.MANIFEST_PENDING
+    assert pending_fragment.manifest_import_attempts == 1
+    assert pending_fragment.manifest_import_error == "not found"
+    assert pending_fragment.manifest_import_available > timezone.now()
+    # not available yet, so nothing to process on the next run
+    mock_presentation.reset_mock()
+    call_command("manifest_worker", "--once", stdout=StringIO())
+    mock_presentation.from_url.assert_not_called()
+
+    # any other error is recorded as a failed attempt;
+    # marked as failed after the last attempt
+    Fragment.objects.filter(pk=pending_fragment.pk).update(
+        manifest_import_available=timezone.now() - timedelta(seconds=1)
+    )
+    mock_presentation.from_url.side_effect = None
+    mock_importer.return_value.import_manifest.side_effect = KeyError("sequences")
+    call_command(
+        "manifest_worker",
+        "--once",
+        "--max-attempts",
+        "2",
+        stdout=StringIO(),
+        stderr=StringIO(),
+    )
+    pending_fragment.refresh_from_db()
+    assert pending_fragment.manifest_status == Fragment.MANIFEST_FAILED
+    assert pending_fragment.manifest_import_attempts == 2
+    assert pending_fragment.manifest_import_error == "'sequences'"
+
+
+@pytest.mark.django_db
+@patch("geniza.corpus.management.commands.manifest_worker.CachedIIIFPresentation")
+@patch("geniza.corpus.management.commands.manifest_worker.GenizaManifestImporter")
+def test_process_not_imported(mock_importer, mock_presentation, pending_fragment):
+    # importer skipped the manifest (e.g. unsupported)
+    mock_importer.return_value.import_manifest.return_value = None
+    call_command("manifest_worker", "--once", stdout=StringIO(), stderr=StringIO())
+    pending_fragment.refresh_from_db()
+    assert pending_fragment.manifest_import_attempts == 1
+    assert pending_fragment.manifest_import_error == "Manifest could not be imported"
+
+
+@pytest.mark.django_db
+def test_status(pending_fragment):
+    with override_settings(IIIF_MANIFEST_IMPORT_BACKGROUND=True):
+        failed = Fragment.objects.create(
+            shelfmark="T-S 2", iiif_url="https://iiif.example.io/manifests/2"
+        )
+    Fragment.objects.filter(pk=failed.pk).update(
+        manifest_status=Fragment.MANIFEST_FAILED
+    )
+    stdout = StringIO()
+    call_command("manifest_worker", "--status", stdout=stdout)
+    output = stdout.getvalue()
+    assert "1 import waiting" in output
+    assert "1 import failed after 5 attempts" in output
@@ -0,0 +1,160 @@
+import json
+from io import StringIO
+from unittest.mock import patch
+
+import pytest
+from django.core.management import call_command
+from django.core.management.base import CommandError
+from requests.exceptions import ConnectionError
+
+from geniza.common.indexing import SolrUpdateStream
+from geniza.corpus.management.commands import parallel_index
+from geniza.corpus.models import Document
+
+
+@pytest.mark.django_db
+def test_pk_ranges(document, join):
+    doc3 = Document.objects.create()
+    pks = sorted([document.pk, join.pk, doc3.pk])
+    # one range per document
+    assert list(parallel_index.pk_ranges(Document.objects.all(), 1)) == [
+        (pk, pk) for pk in pks
+    ]
+    # two ranges; second range has only one document
+    assert list(parallel_index.pk_ranges(Document.objects.all(), 2)) == [
+        (pks[0], pks[1]),
+        (pks[2], pks[2]),
+    ]
+    # single range covering all documents
+    assert list(parallel_index.pk_ranges(Document.objects.all(), 10)) == [
+        (pks[0], pks[2])
+    ]
+    # empty queryset has no ranges
+    assert list(parallel_index.pk_ranges(Document.objects.none(), 10)) == []
+
+
+@pytest.mark.django_db
+@patch.object(Document, "index_items")
+def test_index_pk_range(mock_index_items, document, join):
+    mock_index_items.return_value = 1
+    result = parallel_index.index_pk_range((document.pk, document.pk))
+    assert result["range"] == [document.pk, document.pk]
+    assert result["count"] == 1
+    assert "pid" in result
+    assert "elapsed" in result
+    indexed = mock_index_items.call_args[0][0]
+    assert document in indexed
+    assert join not in indexed
+    assert mock_index_items.call_args[1] == {"force": False, "stream": None}
+
+    # documents skipped as unchanged are reported
+    def skip_one(items, **kwargs):
+        Document.index_stats["skipped"] += 1
+        return 1
+
+    mock_index_items.side_effect = skip_one
+    result = parallel_index.index_pk_range((document.pk, document.pk), force=True)
+    assert result["skipped"] == 1
+    assert mock_index_items.call_args[1] == {"force": True, "stream": None}
+
+    # stream with the requested batch size
+    parallel_index.index_pk_range((document.pk, document.pk), batch_bytes=1000)
+    stream = mock_index_items.call_args[1]["stream"]
+    assert isinstance(stream, SolrUpdateStream)
+    assert stream.batch_bytes == 1000
+
+
+@pytest.mark.django_db
+@patch("geniza.corpus.management.commands.parallel_index.SolrClient")
+@patch.object(Document, "index_items")
+def test_handle(mock_index_items, mock_solr, document, join, tmp_path):
+    mock_index_items.side_effect = lambda items, **kwargs: items.count()
+    stdout = StringIO()
+    command = parallel_index.Command(stdout=stdout)
+    command.state_filename = tmp_path / "state"
+    command.handle(workers=1, range_size=1, resume=False, verbosity=1)
+    # one call per range
+    assert mock_index_items.call_count == 2
+    # should commit
+    mock_solr.return_value.update.index.assert_called_with([], commit=True)
+    # state file removed after successful completion
+    assert not command.state_filename.exists()
+    output = stdout.getvalue()
+    assert "Indexing 2 document ranges with 1 worker" in output
+    assert "Worker " in output
+    assert "Indexed 2 documents" in output
+    assert "not sent to Solr" not in output
+
+    # unchanged documents reported
+    with patch.object(parallel_index, "index_pk_range") as mock_index_range:
+        mock_index_range.side_effect = lambda pk_range, force, batch_bytes: {
+            "range": list(pk_range),
+            "pid": 1,
+            "count": 1,
+            "skipped": 0 if force else 1,
+            "elapsed": 0.1,
+        }
+        stdout.seek(0)
+        stdout.truncate()
+        command.handle(workers=1, range_size=1, resume=False, verbosity=1)
+        assert "2 unchanged documents not sent to Solr" in stdout.getvalue()
+        stdout.seek(0)
+        stdout.truncate()
+        command.handle(workers=1, range_size=1, resume=False, force=True, verbosity=1)
+        assert "not sent to Solr" not in stdout.getvalue()
+
+
+@pytest.mark.django_db
+@patch("geniza.corpus.management.commands.parallel_index.SolrClient")
+@patch.object(Document, "index_items")
+def test_handle_resume(mock_index_items, mock_solr, document, join, tmp_path):
+    mock_index_items.side_effect = lambda items, **kwargs: items.count()
+    stdout = StringIO()
+    command = parallel_index.Command(stdout=stdout)
+    command.state_filename = tmp_path / "state"
+    # simulate an interrupted run where the first range completed
+    first_range = [document.pk, document.pk]
+    second_range = [join.pk, join.pk]
+    with open(command.state_filename, "w") as statefile:
+        json.dump(
+            {"ranges": [first_range, second_range], "completed": [first_range]},
+            statefile,
+        )
+    command.handle(workers=1, range_size=1, resume=True, verbosity=1)
+    # only the remaining range should be indexed
+    assert mock_index_items.call_count == 1
+    indexed = mock_index_items.call_args[0][0]
+    assert join in indexed
+    assert document not in indexed
+    assert "skipping 1 completed range" in stdout.getvalue()
+
+
+@pytest.mark.django_db
+@patch.object(Document, "index_items")
+def test_handle_connection_error(mock_index_items, document, tmp_path):
+    mock_index_items.side_effect = ConnectionError
+    command = parallel_index.Command(stdout=StringIO())
+    command.state_filename = tmp_path / "state"
+    with pytest.raises(CommandError):
+        command.handle(workers=1, range_size=1, resume=False, verbosity=0)
+    # state should be preserved for resuming
+    with open(command.state_filename) as statefile:
+        state = json.load(statefile)
+    assert state["ranges"] == [[document.pk, document.pk]]
+    assert state["completed"] == []
+
+
+@pytest.mark.django_db
+@patch("geniza.corpus.management.commands.parallel_index.Command.handle")
+def test_call_command(mock_handle):
+    mock_handle.return_value = None
+    call_command("parallel_index", "--workers", "2", "--range-size", "50")
+    options = mock_handle.call_args[1]
+    assert options["workers"] == 2
+    assert options["range_size"] == 50
+    assert not options["resume"]
+    assert not options["force"]
+    assert options["batch_bytes"] is None
+    call_command("parallel_index", "--force", "--batch-bytes", "1000")
+    assert mock_handle.call_args[1]["force"]
+    assert mock_handle.call_args[1]["batch_bytes"] == 1000
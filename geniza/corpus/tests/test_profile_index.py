@@ -0,0 +1,35 @@
+import json
+from io import StringIO
+
+import pytest
+from django.core.management import call_command
+
+from geniza.corpus.management.commands import profile_index
+
+
+@pytest.mark.django_db
+def test_handle(document, join, person, tmp_path):
+    stdout = StringIO()
+    outfile = tmp_path / "profile.json"
+    call_command("profile_index", "--json", str(outfile), stdout=stdout)
+    output = stdout.getvalue()
+    assert "Profiled 2 document records" in output
+    assert "Profiled 1 person record\n" in output
+    assert "Profiled 0 place records" in output
+    assert "transcription" in output
+    assert "Saved results to %s" % outfile in output
+    with open(outfile) as results_file:
+        results = json.load(results_file)
+    assert {r["model"] for r in results} == {"Document", "Person"}
+
+
+@pytest.mark.django_db
+def test_handle_model_limit(document, join, person):
+    stdout = StringIO()
+    command = profile_index.Command(stdout=stdout)
+    command.handle(models=["document"], limit=1, verbosity=0)
+    output = stdout.getvalue()
+    assert "Profiled" not in output
+    # summary table is always output
+    assert "Document" in output
+    assert "Person" not in output
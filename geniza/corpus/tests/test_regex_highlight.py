@@ -0,0 +1,60 @@
+from unittest.mock import patch
+
+from django.test import override_settings
+
+from geniza.corpus.regex_highlight import RegexHighlighter
+
+
+class TestRegexHighlighter:
+    def test_init(self):
+        with override_settings(
+            REGEX_HIGHLIGHT_TIMEOUT=5, REGEX_HIGHLIGHT_MAX_MATCHES=10
+        ):
+            highlighter = RegexHighlighter("test")
+            assert highlighter.timeout == 5
+            assert highlighter.max_matches == 10
+        highlighter = RegexHighlighter("test", timeout=1, max_matches=2)
+        assert highlighter.timeout == 1
+        assert highlighter.max_matches == 2
+        assert highlighter.pattern.groups == 3
+
+    def test_init_invalid(self):
+        highlighter = RegexHighlighter("te(st")
+        assert highlighter.pattern is None
+        assert highlighter.highlight("test") is None
+
+    def test_highlight(self):
+        highlighter = RegexHighlighter("test")
+        assert highlighter.highlight("other") is None
+        assert highlighter.highlight("a test text") == "a <em>test</em> text"
+        # compiled pattern is reused across texts
+        assert highlighter.highlight("testing") == "<em>test</em>ing"
+        assert highlighter.matches == 2
+
+        # groups in the query should not change the context after the match
+        highlighter = RegexHighlighter("(te)st")
+        assert highlighter.highlight("a test text") == "a <em>test</em> text"
+
+    def test_highlight_match_limit(self):
+        highlighter = RegexHighlighter("test", max_matches=2)
+        text = " ".join(["test"] * 200)
+        highlight = highlighter.highlight(text)
+        # stops after the limit, but returns highlights found so far
+        assert highlight.count(highlighter.separator) == 1
+        assert highlighter.exhausted
+        # no further highlighting
+        assert highlighter.highlight("test") is None
+
+    def test_highlight_time_limit(self):
+        # catastrophic backtracking
+        highlighter = RegexHighlighter("(x+x+)+y", timeout=0.1)
+        assert highlighter.highlight("x" * 5000) is None
+        assert highlighter.exhausted
+
+        # time budget is shared across texts
+        highlighter = RegexHighlighter("test", timeout=1)
+        with patch("geniza.corpus.regex_highlight.time") as mock_time:
+            mock_time.monotonic.side_effect = [0, 0.1, 0.2, 2]
+            assert highlighter.highlight("test")
+            assert highlighter.highlight("test") is None
+        assert highlighter.exhausted
@@ -0,0 +1,49 @@
+from unittest.mock import MagicMock, patch
+
+import pytest
+
+from geniza.corpus.models import Document
+from geniza.corpus.solr_filter import filter_by_solr, iter_pgpids
+
+
+def test_iter_pgpids():
+    sqs = MagicMock()
+    cursor_qs = sqs.only.return_value.cursor.return_value
+    page = cursor_qs.__getitem__.return_value
+    next_page = cursor_qs.cursor.return_value.__getitem__.return_value
+    # one full page and one partial page
+    page.get_results.return_value = [{"pgpid": 1}, {"pgpid": 2}]
+    page.get_next_cursor.return_value = "AoE"
+    next_page.get_results.return_value = [{"pgpid": 3}]
+
+    assert list(iter_pgpids(sqs, page_size=2)) == [1, 2, 3]
+    sqs.only.assert_called_with("pgpid")
+    cursor_qs.__getitem__.assert_called_with(slice(None, 2))
+    # should continue from the next cursor after a full page
+    cursor_qs.cursor.assert_called_with("AoE")
+    # should not request another page after a partial page
+    next_page.get_next_cursor.assert_not_called()
+
+
+@pytest.mark.django_db
+@patch("geniza.corpus.solr_filter.iter_pgpids")
+def test_filter_by_solr(mock_iter_pgpids, document, join):
+    other = Document.objects.create()
+    sqs = MagicMock()
+
+    # no results: empty queryset
+    mock_iter_pgpids.return_value = []
+    assert not filter_by_solr(Document.objects.all(), sqs).exists()
+
+    # filtered to matching documents
+    mock_iter_pgpids.return_value = [join.pk, document.pk]
+    queryset = filter_by_solr(Document.objects.all(), sqs)
+    assert set(queryset) == {document, join}
+    assert other not in queryset
+    mock_iter_pgpids.assert_called_with(sqs)
+
+    # ordered by solr relevance
+    queryset = filter_by_solr(Document.objects.all(), sqs, relevance=True)
+    assert list(queryset) == [join, document]
+    mock_iter_pgpids.assert_called_with(sqs.order_by.return_value)
+    sqs.order_by.assert_called_with("-score")
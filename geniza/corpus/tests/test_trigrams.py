@@ -0,0 +1,45 @@
+from geniza.corpus.trigrams import MAX_TRIGRAMS, regex_literals, regex_trigrams
+
+
+def test_regex_literals():
+    # plain text is a single literal
+    assert regex_literals("six apartments") == ["six apartments"]
+    # wildcards and repetition split literals
+    assert regex_literals("אלאחרף.+למא") == ["אלאחרף", "למא"]
+    assert regex_literals("x.{0,10}yz") == ["x", "yz"]
+    # escaped characters are literal; escaped classes are not
+    assert regex_literals(r"\[אלוא\]צעין") == ["[אלוא]צעין"]
+    assert regex_literals(r"foo\wbar") == ["foo", "bar"]
+    # character classes are skipped
+    assert regex_literals("[אלוא]צעין") == ["צעין"]
+    assert regex_literals(r"[\]a]bcd") == ["bcd"]
+    # optional characters are not required
+    assert regex_literals("ab?cde") == ["a", "cde"]
+    assert regex_literals("a*bcd") == ["bcd"]
+    assert regex_literals("a{0,3}bcd") == ["bcd"]
+    # characters required at least once end the literal
+    assert regex_literals("abc+def") == ["abc", "def"]
+    assert regex_literals("ab{2}cde") == ["ab", "cde"]
+    # group contents are skipped
+    assert regex_literals("(abc)def") == ["def"]
+    assert regex_literals("(abc)?def") == ["def"]
+    # numeric interval contents are skipped
+    assert regex_literals("ab<1-10>cd") == ["ab", "cd"]
+    assert regex_literals("abc<1-10>?def") == ["abc", "def"]
+
+
+def test_regex_literals_unsupported():
+    # alternation, complement, and intersection: no required literals
+    assert regex_literals("abc|def") == []
+    assert regex_literals("(ab|cd)ef") == []
+    assert regex_literals("abc~") == []
+    assert regex_literals("abc&def") == []
+
+
+def test_regex_trigrams():
+    assert regex_trigrams("תם מן") == ["תם ", "ם מ", " מן"]
+    assert regex_trigrams("abc.*abcd") == ["abc", "bcd"]
+    # literals shorter than three characters have no trigrams
+    assert regex_trigrams("ab.*cd") == []
+    # limited to a maximum number
+    assert len(regex_trigrams("abcdefghijklmnopqrstuvwxyz")) == MAX_TRIGRAMS
@@ -0,0 +1,128 @@
+"""Literal trigram extraction for regular expression searches, used to
+prefilter regex search candidates with an n-gram indexed Solr field"""
+
+#: maximum number of trigrams to return for a single pattern
+MAX_TRIGRAMS = 16
+
+# characters with special meaning in Lucene regular expressions, including
+# optional operators: " (string), # (empty), @ (any string), < > (numeric range)
+SPECIAL_CHARS = set('.?+*{}[]()"#@<>^$')
+# operators that mean a match need not contain any given literal:
+# alternation, complement, intersection
+UNSUPPORTED_OPERATORS = set("|~&")
+# escaped character classes
+CLASS_ESCAPES = set("dDsSwW")
+
+
+def _quantifier(pattern, i):
+    """Parse a quantifier at position i in the pattern, if there is one.
+    Returns a tuple of (minimum repetitions, position after the quantifier);
+    minimum is None if there is no quantifier."""
+    char = pattern[i : i + 1]
+    if char in ("?", "*"):
+        return 0, i + 1
+    if char == "+":
+        return 1, i + 1
+    if char == "{":
+        end = pattern.find("}", i)
+        if end != -1:
+            minimum = pattern[i + 1 : end].split(",")[0].strip()
+            return (int(minimum) if minimum.isdigit() else 0), end + 1
+    return None, i
+
+
+def regex_literals(pattern):
+    """Return literal strings that any text matching a Lucene regular
+    expression must contain. This is conservative: characters inside groups
+    or character classes, optional characters, and wildcards end a literal
+    rather than being included in one, and patterns with alternation,
+    complement, or intersection return no literals.
+
+    :param pattern: regular expression, as entered for a regex search
+    :returns: list of literal strings
+    """
+    literals = []
+    current = []
+    depth = 0
+    i = 0
+
+    def end_literal():
+        if current:
+            literals.append("".join(current))
+            current.clear()
+
+    while i < len(pattern):
+        char = pattern[i]
+        literal = None
+        if char == "\\":
+            escaped = pattern[i + 1 : i + 2]
+            i += 2
+            if not escaped or escaped in CLASS_ESCAPES:
+                end_literal()
+            else:
+                literal = escaped
+        elif char in UNSUPPORTED_OPERATORS:
+            return []
+        elif char == "(":
+            end_literal()
+            depth += 1
+            i += 1
+        elif char == ")":
+            depth = max(depth - 1, 0)
+            i += 1
+        elif char == "[":
+            end_literal()
+            # skip to the end of the character class
+            i += 1
+            while i < len(pattern) and pattern[i] != "]":
+                i += 2 if pattern[i] == "\\" else 1
+            i += 1
+        elif char == "<":
+            end_literal()
+            # skip to the end of the numeric interval, e.g. <1-10>
+            end = pattern.find(">", i)
+            i = end + 1 if end != -1 else i + 1
+        elif char in SPECIAL_CHARS:
+            end_literal()
+            i += 1
+        else:
+            literal = char
+            i += 1
+
+        # repetition after a group, character class or wildcard ends a
+        # literal (handled above); skip over it
+        minimum, next_i = _quantifier(pattern, i)
+        if literal is None or depth:
+            i = next_i
+            continue
+        if minimum is None:
+            current.append(literal)
+        elif minimum == 0:
+            # optional: not required, and ends the literal
+            end_literal()
+        else:
+            # required at least once, but may repeat
+            current.append(literal)
+            end_literal()
+        i = next_i
+
+    end_literal()
+    return literals
+
+
+def regex_trigrams(pattern):
+    """Return distinct trigrams that any text matching a Lucene regular
+    expression must contain, in order, up to :data:`MAX_TRIGRAMS`.
+
+    :param pattern: regular expression, as entered for a regex search
+    :returns: list of three-character strings
+    """
+    trigrams = []
+    for literal in regex_literals(pattern):
+        for i in range(len(literal) - 2):
+            trigram = literal[i : i + 3]
+            if trigram not in trigrams:
+                trigrams.append(trigram)
+                if len(trigrams) >= MAX_TRIGRAMS:
+                    return trigrams
+    return trigrams
@@ -4,7 +4,7 @@ from geniza.corpus import views as corpus_views
 
 app_name = "corpus"
 
-# special set for IIIF urls that should not get i18n patterns
+# special set for IIIF and API urls that should not get i18n patterns
 urlpatterns = [
     path(
         "documents/<int:pk>/iiif/manifest/",
@@ -16,4 +16,9 @@ urlpatterns = [
         corpus_views.DocumentAnnotationListView.as_view(),
         name="document-annotations",
     ),
+    path(
+        "api/documents/",
+        corpus_views.DocumentSearchAPIView.as_view(),
+        name="document-search-api",
+    ),
 ]
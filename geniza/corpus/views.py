@@ -1,5 +1,9 @@
+import hashlib
+import json
+import logging
 import re
 from ast import literal_eval
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
 from random import randint
 
@@ -9,9 +13,9 @@ from django.contrib import messages
 from django.contrib.admin.models import CHANGE, LogEntry
 from django.contrib.auth.mixins import PermissionRequiredMixin
 from django.contrib.contenttypes.models import ContentType
-from django.contrib.postgres.aggregates import ArrayAgg
-from django.contrib.postgres.search import SearchVector
+from django.core.cache import caches
 from django.core.exceptions import ValidationError
+from django.core.serializers.json import DjangoJSONEncoder
 from django.db.models import Q
 from django.db.models.query import Prefetch
 from django.http import Http404, HttpResponse, JsonResponse
@@ -19,34 +23,98 @@ from django.http.response import HttpResponsePermanentRedirect, HttpResponseRedi
 from django.middleware.csrf import get_token as csrf_token
 from django.shortcuts import redirect
 from django.urls import reverse
-from django.utils.html import strip_tags
+from django.utils.cache import get_conditional_response
+from django.utils.functional import cached_property
 from django.utils.safestring import mark_safe
 from django.utils.text import Truncator, slugify
+from django.utils.translation import get_language
 from django.utils.translation import gettext as _
 from django.utils.translation import ngettext
 from django.views.generic import DetailView, FormView, ListView
 from django.views.generic.edit import FormMixin
+from parasolr.django import SolrClient, SolrQuerySet
 from parasolr.django.views import SolrLastModifiedMixin
-from piffle.presentation import IIIFPresentation
+from parasolr.solr.base import SolrClientException
+from parasolr.utils import solr_timestamp_to_datetime
 from tabular_export.admin import export_to_csv_response
 from taggit.models import Tag
 
+from geniza.common.solr_cache import CachedSolrClient, SolrIndexStats
 from geniza.common.utils import absolutize_url
 from geniza.corpus import iiif_utils
 from geniza.corpus.forms import DocumentMergeForm, DocumentSearchForm, TagMergeForm
 from geniza.corpus.ja import contains_arabic, contains_hebrew, ja_arabic_chars
+from geniza.corpus.manifest_client import CachedIIIFPresentation
 from geniza.corpus.models import Document, TextBlock
 from geniza.corpus.solr_queryset import DocumentSolrQuerySet
 from geniza.corpus.templatetags import corpus_extras
 from geniza.footnotes.forms import SourceChoiceForm
 from geniza.footnotes.models import Footnote, Source
 
+logger = logging.getLogger(__name__)
+
+
+class SolrQueryCacheMixin(SolrLastModifiedMixin):
+    """Extends :class:`~parasolr.django.views.SolrLastModifiedMixin` to cache
+    Solr query responses for querysets initialized with :attr:`solr_client`,
+    using :class:`~geniza.common.solr_cache.CachedSolrClient` and the cache
+    configured in **SOLR_QUERY_CACHE**. The most recent last modified value
+    and total number of records matching the last modified filters are used
+    as the index version, so cached responses are not used once any of those
+    records are indexed or removed. The version is looked up at most once per
+    request, and is also used for the last modified header."""
+
+    @cached_property
+    def solr_index_version(self):
+        """Dictionary with the most recent last modified value and total
+        number of records matching the last modified filters; None if Solr
+        returns an error."""
+        sqs = (
+            SolrQuerySet()
+            .filter(**self.get_solr_lastmodified_filters())
+            .order_by("-last_modified")
+            .only("last_modified")
+        )
+        try:
+            response = sqs.get_response(rows=1)
+            return {
+                "last_modified": response.docs[0]["last_modified"],
+                "total": response.numFound,
+            }
+        except (AttributeError, IndexError, KeyError, SolrClientException) as err:
+            # no response, no results, or a solr error; no version to return
+            logger.error("Failed to retrieve last modified: %s" % err)
+
+    def get_solr_index_key(self):
+        """Index version as a string for use in cache keys, if available"""
+        if self.solr_index_version:
+            return "%(total)d-%(last_modified)s" % self.solr_index_version
+
+    def last_modified(self):
+        """Return last modified :class:`datetime.datetime` from the
+        index version"""
+        if self.solr_index_version:
+            return solr_timestamp_to_datetime(self.solr_index_version["last_modified"])
+
+    @cached_property
+    def solr_client(self):
+        """Solr client for querysets; caches responses if enabled"""
+        solr = SolrClient()
+        if getattr(settings, "SOLR_QUERY_CACHE", None):
+            return CachedSolrClient(solr, version=self.get_solr_index_key)
+        return solr
+
 
 class SolrDateRangeMixin:
     """Mixin for solr-based views with start and end date fields to get
     the full range of dates across the solr queryset."""
 
-    # NOTE: should cache this, shouldn't really change that frequently
+    @cached_property
+    def solr_stats(self):
+        """Corpus-wide stats service, cached per index version; uses the
+        view's own index version if it has one."""
+        return SolrIndexStats(version=getattr(self, "get_solr_index_key", None))
+
     def get_range_stats(self, queryset_cls, field_name):
         """Return the min and max for range fields based on Solr stats.
 
@@ -55,13 +123,15 @@ class SolrDateRangeMixin:
             the key is not added to a dictionary.
         :rtype: dict
         """
-        stats = queryset_cls().stats("start_dating_i", "end_dating_i").get_stats()
-        if stats.get("stats_fields"):
+        stats = self.solr_stats.range_stats(
+            queryset_cls, "start_dating_i", "end_dating_i"
+        )
+        if stats:
             # use minimum from start date and max from end date
             # - we're storing YYYYMMDD as 8-digit number for this we only want year
             # convert to str, take first 4 digits, then convert back to int
-            min_val = stats["stats_fields"]["start_dating_i"]["min"]
-            max_val = stats["stats_fields"]["end_dating_i"]["max"]
+            min_val = stats["start_dating_i"]["min"]
+            max_val = stats["end_dating_i"]["max"]
 
             # trim from the end to handle 3-digit years; includes .0 at end
             min_year = int(str(min_val)[:-6]) if min_val else None
@@ -71,9 +141,7 @@ class SolrDateRangeMixin:
         return {}
 
 
-class DocumentSearchView(
-    ListView, FormMixin, SolrLastModifiedMixin, SolrDateRangeMixin
-):
+class DocumentSearchView(ListView, FormMixin, SolrQueryCacheMixin, SolrDateRangeMixin):
     model = Document
     form_class = DocumentSearchForm
     context_object_name = "documents"
@@ -182,12 +250,13 @@ class DocumentSearchView(
             "label": form.fields[fieldname].label,
         }
 
-    def get_queryset(self):
-        """Perform requested search and return solr queryset"""
+    def get_base_queryset(self):
+        """Solr queryset to search and filter: published documents, with
+        facets for the search form"""
         # limit to documents with published status (i.e., no suppressed documents);
         # get counts of facets, excluding type filter
-        documents = (
-            DocumentSolrQuerySet()
+        return (
+            DocumentSolrQuerySet(solr=self.solr_client)
             .filter(status=Document.PUBLIC_LABEL)
             .facet(
                 "has_image",
@@ -200,6 +269,58 @@ class DocumentSearchView(
             )
             .facet_field("type", exclude="type", sort="value")
         )
+
+    def highlight_keyword_search(self, documents):
+        """Add highlighting and relevance score to a keyword search, so that
+        matches can be displayed in search results"""
+        # NOTE: using requireFieldMatch so that field-specific search
+        # terms will NOT be used for highlighting text matches
+        # (unless they are in the appropriate field)
+        return (
+            documents.highlight(
+                "description",
+                snippets=3,
+                method="unified",
+                requireFieldMatch=True,
+            )
+            .highlight(
+                "description_nostem",
+                snippets=3,
+                method="unified",
+                requireFieldMatch=True,
+            )
+            # return smaller chunk of highlighted text for transcriptions/translations
+            # since the lines are often shorter, resulting in longer text
+            .highlight(
+                "transcription",
+                method="unified",
+                fragsize=150,  # try including more context
+                requireFieldMatch=True,
+                # use newline as passage boundary
+                **{"bs.type": "SEPARATOR", "bs.separator": "\n"},
+            )
+            .highlight(
+                "translation",
+                method="unified",
+                fragsize=150,
+                requireFieldMatch=True,
+            )
+            .highlight(
+                "transcription_nostem",
+                method="unified",
+                fragsize=150,
+                requireFieldMatch=False,
+                **{"bs.type": "SEPARATOR", "bs.separator": "\n"},
+            )
+            # highlight old shelfmark so we can show match in results
+            .highlight("old_shelfmark", requireFieldMatch=True)
+            .highlight("old_shelfmark_t", requireFieldMatch=True)
+            .also("score")
+        )  # include relevance score in results
+
+    def get_queryset(self):
+        """Perform requested search and return solr queryset"""
+        documents = self.get_base_queryset()
         self.applied_filter_labels = []
 
         form = self.get_form()
@@ -217,51 +338,9 @@ class DocumentSearchView(
                 documents = documents.regex_search(regex_field, search_opts["q"])
 
             elif search_opts["q"]:
-                # NOTE: using requireFieldMatch so that field-specific search
-                # terms will NOT be used for highlighting text matches
-                # (unless they are in the appropriate field)
-                documents = (
+                documents = self.highlight_keyword_search(
                     documents.keyword_search(search_opts["q"])
-                    .highlight(
-                        "description",
-                        snippets=3,
-                        method="unified",
-                        requireFieldMatch=True,
-                    )
-                    .highlight(
-                        "description_nostem",
-                        snippets=3,
-                        method="unified",
-                        requireFieldMatch=True,
-                    )
-                    # return smaller chunk of highlighted text for transcriptions/translations
-                    # since the lines are often shorter, resulting in longer text
-                    .highlight(
-                        "transcription",
-                        method="unified",
-                        fragsize=150,  # try including more context
-                        requireFieldMatch=True,
-                        # use newline as passage boundary
-                        **{"bs.type": "SEPARATOR", "bs.separator": "\n"},
-                    )
-                    .highlight(
-                        "translation",
-                        method="unified",
-                        fragsize=150,
-                        requireFieldMatch=True,
-                    )
-                    .highlight(
-                        "transcription_nostem",
-                        method="unified",
-                        fragsize=150,
-                        requireFieldMatch=False,
-                        **{"bs.type": "SEPARATOR", "bs.separator": "\n"},
-                    )
-                    # highlight old shelfmark so we can show match in results
-                    .highlight("old_shelfmark", requireFieldMatch=True)
-                    .highlight("old_shelfmark_t", requireFieldMatch=True)
-                    .also("score")
-                )  # include relevance score in results
+                )
 
             # order by sort option
             order_by = (
@@ -422,6 +501,107 @@ class DocumentSearchView(
         return context_data
 
 
+class DocumentSearchAPIView(DocumentSearchView):
+    """Read-only JSON document search, with the same search and filter
+    options as :class:`DocumentSearchView`. Results are paged with a Solr
+    cursor rather than page numbers, so harvesting a full result set does not
+    require increasingly expensive deep-offset queries: pass the ``cursor``
+    from one response to get the next page. Results are sorted by shelfmark
+    by default, since random order cannot be paged with a cursor."""
+
+    initial = {**DocumentSearchView.initial, "sort": "shelfmark"}
+    #: maximum number of results per page; may be lowered with ``per_page``
+    paginate_by = 100
+
+    #: fields to return for each document
+    result_fields = [
+        "pgpid",
+        "shelfmark",
+        "shelfmarks",
+        "type",
+        "description",
+        "document_date",
+        "document_dating",
+        "languages",
+        "tags",
+        "has_image",
+        "has_digital_edition",
+        "has_digital_translation",
+        "has_discussion",
+        "scholarship_count",
+    ]
+
+    def dispatch(self, request, *args, **kwargs):
+        # skip redirect for random sort on pages after the first
+        return super(DocumentSearchView, self).dispatch(request, *args, **kwargs)
+
+    def last_modified(self):
+        """last modified from the index version; unlike search pages, API
+        results are never in random order"""
+        return SolrQueryCacheMixin.last_modified(self)
+
+    def get_solr_sort(self, sort_option, exclude_inferred=False):
+        """Use shelfmark sort instead of random sort, which cannot be paged"""
+        if sort_option == "random":
+            sort_option = "shelfmark"
+        return super().get_solr_sort(sort_option, exclude_inferred)
+
+    def get_base_queryset(self):
+        """Published documents, without facets, returning only
+        :attr:`result_fields`"""
+        return (
+            DocumentSolrQuerySet(solr=self.solr_client)
+            .filter(status=Document.PUBLIC_LABEL)
+            .only(*self.result_fields)
+        )
+
+    def highlight_keyword_search(self, documents):
+        """No highlighting for API results"""
+        return documents
+
+    def serialize_document(self, doc):
+        """Convert a search result document to a JSON-serializable dict"""
+        result = {field: doc.get(field) for field in self.result_fields}
+        # document type is converted to a DocumentType object in results
+        result["type"] = str(doc["type"])
+        result["url"] = absolutize_url(reverse("corpus:document", args=[doc["pgpid"]]))
+        return result
+
+    def get(self, request, *args, **kwargs):
+        form = self.get_form()
+        if not form.is_valid():
+            return JsonResponse({"errors": form.errors.get_json_data()}, status=400)
+
+        cursor_mark = request.GET.get("cursor") or DocumentSolrQuerySet.FIRST_CURSOR
+        rows = self.get_paginate_by(None)
+        documents = self.get_queryset().cursor(cursor_mark)[:rows]
+        response = documents.get_response()
+        if not response:
+            # solr error; most likely an invalid cursor or regular expression
+            return JsonResponse(
+                {"errors": {"__all__": [{"message": _("Search failed.")}]}},
+                status=400,
+            )
+
+        next_cursor = documents.get_next_cursor()
+        next_url = None
+        if next_cursor:
+            params = request.GET.copy()
+            params["cursor"] = next_cursor
+            next_url = request.build_absolute_uri("?%s" % params.urlencode())
+        return JsonResponse(
+            {
+                "count": response.numFound,
+                "cursor": cursor_mark,
+                "next_cursor": next_cursor,
+                "next": next_url,
+                "results": [
+                    self.serialize_document(doc) for doc in documents.get_results()
+                ],
+            }
+        )
+
+
 class DocumentDetailBase(SolrLastModifiedMixin):
     """View mixin to handle lastmodified and redirects for documents with old PGPIDs.
     Overrides get request in the case of a 404, looking for any records
@@ -586,11 +766,12 @@ class RelatedDocumentView(DocumentDetailView):
 
     def page_title(self):
         # Translators: title of related documents page
-        return _("Related documents for %(doc)s") % {"doc": self.get_object().title}
+        return _("Related documents for %(doc)s") % {"doc": self.object.title}
 
     def page_description(self):
-        doc = self.get_object()
-        count = doc.related_documents.count()
+        # related documents are cached on the object, so this reuses the
+        # single Solr query for the count check in get_context_data
+        count = self.object.related_documents.count()
         # Translators: description of related documents page, for search engines
         return ngettext(
             "%(count)d related document",
@@ -601,9 +782,8 @@ class RelatedDocumentView(DocumentDetailView):
         }
 
     def get_context_data(self, **kwargs):
-        doc = self.get_object()
         # if there are no related documents, don't serve out this page
-        if not doc.related_documents.count():
+        if not self.object.related_documents.count():
             raise Http404
         return super().get_context_data(**kwargs)
 
@@ -653,13 +833,148 @@ class DocumentManifestView(DocumentDetailView):
             extra_attrs,
         )
 
+    def get_queryset(self, *args, **kwargs):
+        """Prefetch fragments with their imported manifests, and footnotes,
+        which are used both for the manifest version and to build it"""
+        return (
+            super()
+            .get_queryset(*args, **kwargs)
+            .prefetch_related(
+                Prefetch(
+                    "textblock_set",
+                    queryset=TextBlock.objects.select_related("fragment__manifest"),
+                ),
+                "footnotes",
+            )
+        )
+
+    def manifest_version(self, document):
+        """Version string for the manifest for a document, used for the
+        ETag and as the cache key. Changes when the document (including its
+        image overrides), its fragments or their imported manifests are
+        modified, or when a transcription is added or removed."""
+        version = [
+            document.pk,
+            document.last_modified,
+            document.has_transcription(),
+            get_language(),
+            # manifest urls are absolute
+            self.request.get_host(),
+        ]
+        for block in document.textblock_set.all():
+            fragment = block.fragment
+            version.extend(
+                [
+                    fragment.pk,
+                    fragment.iiif_url,
+                    fragment.last_modified,
+                    fragment.manifest_id,
+                    fragment.manifest.last_modified if fragment.manifest else None,
+                ]
+            )
+        return hashlib.sha1(
+            json.dumps(version, cls=DjangoJSONEncoder).encode()
+        ).hexdigest()
+
     def get(self, request, *args, **kwargs):
         document = self.get_object()
         # should 404 if no images or no transcription
         if not document.has_transcription() and not document.has_image():
             raise Http404
 
+        version = self.manifest_version(document)
+        etag = '"%s"' % version
+        # respond 304 Not Modified if the client already has this version
+        response = get_conditional_response(request, etag=etag)
+        if response is None:
+            cache = None
+            cache_alias = getattr(settings, "DOCUMENT_MANIFEST_CACHE", None)
+            if cache_alias:
+                cache = caches[cache_alias]
+            cache_key = "document-manifest:%s:%s" % (document.pk, version)
+            manifest = cache.get(cache_key) if cache else None
+            if manifest is None:
+                manifest = json.dumps(
+                    dict(self.build_manifest(document)),
+                    cls=iiif_utils.AttrDictEncoder,
+                )
+                if cache:
+                    cache.set(
+                        cache_key,
+                        manifest,
+                        getattr(settings, "DOCUMENT_MANIFEST_CACHE_TIMEOUT", None),
+                    )
+            response = HttpResponse(manifest, content_type="application/json")
+        response["ETag"] = etag
+        return response
+
+    def fetch_remote_manifests(self, urls):
+        """Load remote IIIF manifests concurrently, using at most
+        **IIIF_MANIFEST_FETCH_WORKERS** threads. Returns a dict of manifests
+        keyed on url."""
+        if not urls:
+            return {}
+        workers = min(len(urls), getattr(settings, "IIIF_MANIFEST_FETCH_WORKERS", 4))
+        with ThreadPoolExecutor(max_workers=workers) as executor:
+            # NOTE: If a url fails, may raise IIIFException
+            return dict(zip(urls, executor.map(CachedIIIFPresentation.from_url, urls)))
+
+    def fragment_manifests(self, document):
+        """List of source manifests for a document's images, in order, as
+        tuples of manifest id, label, attribution, and list of canvases.
+        Uses manifests and canvases imported into the database when
+        available; any others are loaded from their remote urls."""
+        imported = {}
+        for block in document.textblock_set.all():
+            fragment = block.fragment
+            if not fragment.iiif_url or fragment.iiif_url in imported:
+                continue
+            if fragment.manifest:
+                canvases = [
+                    iiif_utils.djiffy_canvas(canvas)
+                    for canvas in fragment.manifest.canvases.all()
+                ]
+                # if no canvases were imported, use the remote manifest
+                if canvases:
+                    imported[fragment.iiif_url] = (
+                        fragment.manifest.uri,
+                        fragment.manifest.label,
+                        iiif_utils.get_iiif_string(
+                            fragment.manifest.extra_data.get("attribution", "")
+                        ),
+                        canvases,
+                    )
+
         iiif_urls = document.iiif_urls()
+        remote_manifests = self.fetch_remote_manifests(
+            [url for url in iiif_urls if url not in imported]
+        )
+        manifests = []
+        for url in iiif_urls:
+            if url in imported:
+                manifests.append(imported[url])
+            else:
+                remote_manifest = remote_manifests[url]
+                manifests.append(
+                    (
+                        str(remote_manifest.id),
+                        remote_manifest.label,
+                        # attribution is optional, so ignore if not present
+                        iiif_utils.get_iiif_string(
+                            getattr(remote_manifest, "attribution", "")
+                        ),
+                        # do we want local canvas id, or rely on remote id?
+                        [
+                            dict(canvas)
+                            for canvas in remote_manifest.sequences[0].canvases
+                        ],
+                    )
+                )
+        return manifests
+
+    def build_manifest(self, document):
+        """Assemble the IIIF manifest for a document from the canvases of
+        its fragment manifests, with transcription annotations if available."""
         local_manifest_id = self.get_absolute_url()
         first_canvas = None
 
@@ -670,57 +985,50 @@ class DocumentManifestView(DocumentDetailView):
         manifest.metadata = [{"label": "PGP ID", "value": str(document.id)}]
         manifest.description = document.description
 
-        canvases = []
-        # keep track of unique attributions so we can include them all
-        attributions = set()
-        for url in iiif_urls:
-            # NOTE: If this url fails, may raise IIIFException
-            remote_manifest = IIIFPresentation.from_url(url)
-            # CUDL attribution has some variation in tags;
-            # would be nice to preserve tagged version,
-            # for now, ignore tags so we can easily de-dupe
-            try:
-                attributions.add(strip_tags(remote_manifest.attribution))
-            except AttributeError:
-                # attribution is optional, so ignore if not present
-                pass
+        # respect image order override if present:
+        # sort overrides by "order", using ∞ as fallback to sort unordered to end of list
+        override_ids = [
+            canvas_id
+            for canvas_id, _ in sorted(
+                (document.image_overrides or {}).items(),
+                key=lambda item: item[1].get("order", float("inf")),
+            )
+        ]
 
-            # respect image order override if present
-            ordered_canvases = []
-            if document.image_overrides:
-                # order returned images according to override: first, sort overrides by "order"
-                sorted_overrides = sorted(
-                    document.image_overrides.items(),
-                    # get order if present; use ∞ as fallback to sort unordered to end of list
-                    key=lambda item: item[1].get("order", float("inf")),
-                )
-                for canvas_id, _ in sorted_overrides:
-                    matches = [
-                        c
-                        for c in remote_manifest.sequences[0].canvases
-                        if c.id == canvas_id
-                    ]
-                    if matches:
-                        ordered_canvases.append(matches[0])
-            else:
-                ordered_canvases = remote_manifest.sequences[0].canvases
+        canvases = []
+        # keep track of attributions so we can include them all
+        attributions = []
+        for (
+            manifest_id,
+            label,
+            attribution,
+            manifest_canvases,
+        ) in self.fragment_manifests(document):
+            if attribution:
+                attributions.append(attribution)
+
+            if override_ids:
+                # order returned images according to override
+                canvases_by_id = {}
+                for canvas in manifest_canvases:
+                    canvases_by_id.setdefault(canvas["@id"], canvas)
+                manifest_canvases = [
+                    canvases_by_id[canvas_id]
+                    for canvas_id in override_ids
+                    if canvas_id in canvases_by_id
+                ]
 
-            for canvas in ordered_canvases:
-                # do we want local canvas id, or rely on remote id?
-                local_canvas = dict(canvas)
+            for local_canvas in manifest_canvases:
                 if first_canvas is None:
                     first_canvas = local_canvas
-                # TODO: can we build this from djiffy canvas?
 
                 # adding provenance per recommendation from folks on IIIf Slack
                 # to track original source of this canvas
                 local_canvas["partOf"] = [
                     {
-                        "@id": str(remote_manifest.id),
+                        "@id": manifest_id,
                         "@type": "sc:Manifest",
-                        "label": {
-                            "en": ["original source: %s" % remote_manifest.label]
-                        },
+                        "label": {"en": ["original source: %s" % label]},
                     }
                 ]
 
@@ -735,7 +1043,9 @@ class DocumentManifestView(DocumentDetailView):
         # (or at least, do not display in Mirador)
         # in 3.0 we can use multiple provider blocks, but no viewer supports it yet
 
-        manifest.attribution = self.format_attribution(document.attribution())
+        manifest.attribution = self.format_attribution(
+            document.attribution(extra_attributions=attributions)
+        )
 
         # if transcription is available, add an annotation list to first canvas
         if document.has_transcription():
@@ -743,7 +1053,7 @@ class DocumentManifestView(DocumentDetailView):
                 "@context": "http://iiif.io/api/presentation/2/context.json",
                 "@id": absolutize_url(
                     reverse("corpus-uris:document-annotations", args=[document.pk]),
-                    request=request,  # request is needed to avoid getting https:// urls in dev
+                    request=self.request,  # request is needed to avoid getting https:// urls in dev
                 ),
                 "@type": "sc:AnnotationList",
             }
@@ -755,7 +1065,7 @@ class DocumentManifestView(DocumentDetailView):
             # attach annotation list
             first_canvas["otherContent"] = other_content
 
-        return JsonResponse(dict(manifest), encoder=iiif_utils.AttrDictEncoder)
+        return manifest
 
 
 class DocumentAnnotationListView(DocumentDetailView):
@@ -793,7 +1103,7 @@ class DocumentAnnotationListView(DocumentDetailView):
             iiif_urls = document.iiif_urls()
             if iiif_urls:
                 # NOTE: If this url fails, may raise IIIFException
-                manifest = IIIFPresentation.from_url(iiif_urls[0])
+                manifest = CachedIIIFPresentation.from_url(iiif_urls[0])
                 canvas = manifest.sequences[0].canvases[0]
             else:
                 # if there are no images available, use an empty canvas
@@ -905,19 +1215,9 @@ class SourceAutocompleteView(PermissionRequiredMixin, autocomplete.Select2QueryS
         q = self.request.GET.get("q", None)
         qs = Source.objects.all().order_by("authors__last_name")
         if q:
-            qs = (
-                qs.annotate(
-                    # ArrayAgg to group together related values from related model instances
-                    authors_last=ArrayAgg("authors__last_name", distinct=True),
-                    authors_first=ArrayAgg("authors__first_name", distinct=True),
-                    # PostgreSQL search vector to search across combined fields
-                    search=SearchVector(
-                        "title", "authors_last", "authors_first", "volume"
-                    ),
-                )
-                .filter(search=q)
-                .distinct()
-            )
+            # search the stored PostgreSQL search vector, which combines
+            # title, volume, and author names, using its GIN index
+            qs = qs.filter(search_vector=q).distinct()
         return qs
 
 
@@ -9,9 +9,11 @@ from django.contrib.admin.models import CHANGE, LogEntry
 from django.contrib.auth.models import User
 from django.contrib.contenttypes.fields import GenericForeignKey, GenericRelation
 from django.contrib.contenttypes.models import ContentType
+from django.contrib.postgres.aggregates import ArrayAgg
 from django.core.validators import RegexValidator
 from django.db import IntegrityError, models, transaction
-from django.db.models import F, Q, Value
+from django.db.models import Count, F, OuterRef, Q, Subquery, Value
+from django.db.models.functions import Coalesce
 from django.db.models.query import Prefetch
 from django.db.models.signals import pre_delete
 from django.dispatch import receiver
@@ -26,6 +28,7 @@ from slugify import slugify
 from taggit.managers import TaggableManager
 from unidecode import unidecode
 
+from geniza.common.indexing import IndexDigestMixin, IndexProfiler, IndexQueue
 from geniza.common.models import TaggableMixin, TrackChangesModel, cached_class_property
 from geniza.common.signals import detach_logentries
 from geniza.corpus.dates import DocumentDateMixin, PartialDate, standard_date_display
@@ -41,6 +44,53 @@ from geniza.footnotes.models import Footnote
 logger = logging.getLogger(__name__)
 
 
+def count_subquery(queryset, field, count=None):
+    """Subquery expression to count records in `queryset` that refer to the
+    outer record via `field`, for use in annotations; avoids the row
+    multiplication of joining several relations in one query. Counts
+    records unless a different `count` aggregate is specified."""
+    return Coalesce(
+        Subquery(
+            queryset.filter(**{field: OuterRef("pk")})
+            .order_by()
+            .values(field)
+            .annotate(total=count or Count("pk"))
+            .values("total")
+        ),
+        0,
+    )
+
+
+def array_subquery(queryset, field, values):
+    """Subquery expression to aggregate the distinct `values` for records
+    in `queryset` that refer to the outer record via `field` into an array,
+    for use in annotations. Returns None when there are no records."""
+    return Subquery(
+        queryset.filter(**{field: OuterRef("pk")})
+        .order_by()
+        .values(field)
+        .annotate(values=ArrayAgg(values, distinct=True))
+        .values("values")
+    )
+
+
+def pop_index_annotations(instance, annotations):
+    """Remove and return values for the specified annotations on a model
+    instance, as a dictionary. Values are annotated by ``items_to_index``
+    when indexing in bulk; when they are not present, they are queried for
+    this instance. Removing them once used ensures that a later reindex
+    does not use stale data."""
+    if all(name in instance.__dict__ for name in annotations):
+        return {name: instance.__dict__.pop(name) for name in annotations}
+    return (
+        type(instance)
+        .objects.filter(pk=instance.pk)
+        .annotate(**annotations)
+        .values(*annotations.keys())
+        .first()
+    )
+
+
 class NameQuerySet(models.QuerySet):
     """Custom queryset for names for filter utility functions"""
 
@@ -105,6 +155,25 @@ class Name(models.Model):
         super().save(*args, **kwargs)
 
 
+class NamedEntityMixin:
+    """Mixin for entities with a generic relation to :class:`Name` as `names`."""
+
+    def primary_name(self):
+        """Return the primary name, if one is designated, otherwise the first
+        name; returns None if there are no names."""
+        if "names" in getattr(self, "_prefetched_objects_cache", {}):
+            # use prefetched names (e.g. when indexing) instead of querying
+            names = sorted(self.names.all(), key=lambda name: name.pk)
+            primary_names = [name for name in names if name.primary]
+            return (primary_names or names or [None])[0]
+        try:
+            return self.names.get(primary=True)
+        except Name.MultipleObjectsReturned:
+            return self.names.filter(primary=True).first()
+        except Name.DoesNotExist:
+            return self.names.first()
+
+
 class DocumentDatableMixin:
     """Mixin for entities that have associated documents, and thus can be automatically
     roughly dated by the dates on those documents."""
@@ -297,18 +366,20 @@ class PersonSignalHandlers:
             for attr in person_attr:
                 condition = {"%s__pk" % attr: instance.pk}
                 person_filter |= Q(**condition)
-            people = Person.items_to_index().filter(person_filter)
+            people = Person.objects.filter(person_filter)
         else:
             person_filter = {"%s__pk" % person_attr: instance.pk}
-            people = Person.items_to_index().filter(**person_filter)
-        if people.exists():
+            people = Person.objects.filter(**person_filter)
+        # queue de-duplicated ids to be reindexed on commit
+        person_ids = set(people.values_list("pk", flat=True))
+        if person_ids:
             logger.debug(
-                "%s %s, reindexing %d related person(s)",
+                "%s %s, queueing %d related person(s) for reindexing",
                 model_name,
                 mode,
-                people.count(),
+                len(person_ids),
             )
-            ModelIndexable.index_items(people)
+            IndexQueue.add(Person, person_ids)
 
     @staticmethod
     def related_save(sender, instance=None, raw=False, **_kwargs):
@@ -324,7 +395,13 @@ class PersonSignalHandlers:
 
 
 class Person(
-    ModelIndexable, SlugMixin, DocumentDatableMixin, PermalinkMixin, TaggableMixin
+    IndexDigestMixin,
+    ModelIndexable,
+    SlugMixin,
+    NamedEntityMixin,
+    DocumentDatableMixin,
+    PermalinkMixin,
+    TaggableMixin,
 ):
     """A person entity that appears within the PGP corpus."""
 
@@ -420,12 +497,7 @@ class Person(
         Display the person using their primary name, if one is designated,
         otherwise display the first name.
         """
-        try:
-            return str(self.names.get(primary=True))
-        except Name.MultipleObjectsReturned:
-            return str(self.names.filter(primary=True).first())
-        except Name.DoesNotExist:
-            return str(self.names.first() or super().__str__())
+        return str(self.primary_name() or super().__str__())
 
     @property
     def date_str(self):
@@ -504,7 +576,11 @@ class Person(
 
     def get_absolute_url(self):
         """url for this person"""
-        if self.documents.count() >= self.MIN_DOCUMENTS or self.has_page == True:
+        # use document count annotated for indexing, if available
+        document_count = self.__dict__.get("document_relation_count")
+        if document_count is None:
+            document_count = self.documents.count()
+        if document_count >= self.MIN_DOCUMENTS or self.has_page == True:
             return reverse("entities:person", args=[str(self.slug)])
         else:
             return None
@@ -922,106 +998,123 @@ class Person(
         # quick count for parasolr indexing (don't do prefetching just to get the total!)
         return cls.objects.count()
 
+    @classmethod
+    def index_annotations(cls):
+        """Annotations for related object counts and document relation
+        types used in index data, as subqueries"""
+        return {
+            # total document relations, used to determine if there is a page
+            "document_relation_count": count_subquery(
+                PersonDocumentRelation.objects.all(), "person"
+            ),
+            "document_count": count_subquery(
+                PersonDocumentRelation.objects.all(),
+                "person",
+                Count("document", distinct=True),
+            ),
+            "place_count": count_subquery(PersonPlaceRelation.objects.all(), "person"),
+            # related people, entered from either side of the relationship
+            "related_from_ids": array_subquery(
+                PersonPersonRelation.objects.all(), "to_person", "from_person"
+            ),
+            "related_to_ids": array_subquery(
+                PersonPersonRelation.objects.all(), "from_person", "to_person"
+            ),
+            "document_relation_types": array_subquery(
+                PersonDocumentRelation.objects.all(), "person", "type__name_en"
+            ),
+            "certain_document_relation_types": array_subquery(
+                PersonDocumentRelation.objects.exclude(uncertain=True),
+                "person",
+                "type__name_en",
+            ),
+        }
+
     @classmethod
     def items_to_index(cls):
         """Custom logic for finding items to be indexed when indexing in
         bulk."""
-        return Person.objects.prefetch_related(
-            "names",
-            "roles",
-            "relationships",
-            "from_person",
-            "to_person",
-            "personplacerelation_set",
-            Prefetch(
-                "persondocumentrelation_set",
-                queryset=PersonDocumentRelation.objects.select_related("type"),
-            ),
-            Prefetch(
-                "documents",
-                queryset=Document.objects.prefetch_related("dating_set"),
-            ),
+        return Person.objects.annotate(**cls.index_annotations()).prefetch_related(
+            "names", "roles", "tags"
         )
 
     @classmethod
     def prep_index_chunk(cls, chunk):
         """Prefetch related information when indexing in chunks
         (modifies queryset chunk in place)"""
-        models.prefetch_related_objects(
-            chunk,
-            "names",
-            "roles",
-            "relationships",
-            "from_person",
-            "to_person",
-            "personplacerelation_set",
-            Prefetch(
-                "persondocumentrelation_set",
-                queryset=PersonDocumentRelation.objects.select_related("type"),
-            ),
-            Prefetch(
-                "documents",
-                queryset=Document.objects.prefetch_related("dating_set"),
-            ),
-        )
+        models.prefetch_related_objects(chunk, "names", "roles", "tags")
         return chunk
 
     def index_data(self):
         """data for indexing in Solr"""
         index_data = super().index_data()
-        url = self.get_absolute_url()
-        index_data.update(
-            {
-                # basic metadata
-                "slug_s": self.slug,
-                "name_s": str(self),
-                "other_names_ss": [n.name for n in self.names.non_primary()],
-                "description_txt": self.description_en,
-                "gender_s": self.get_gender_display(),
-                "role_ss": [role.name_en for role in self.roles.all()],
-                "url_s": url,
-                "has_page_b": bool(url),
-                # related object counts
-                "documents_i": self.documents.distinct().count(),
-                "people_i": self.related_people_count,
-                "places_i": self.personplacerelation_set.count(),
-                # kinds of relationships to documents
-                "document_relation_ss": list(
-                    self.persondocumentrelation_set.values_list(
-                        "type__name_en", flat=True
-                    ).distinct()
-                ),
-                "certain_document_relation_ss": list(
-                    self.persondocumentrelation_set.exclude(uncertain=True)
-                    .values_list("type__name_en", flat=True)
-                    .distinct()
-                ),
-                "tags_ss_lower": [t.name for t in self.tags.all()],
-            }
-        )
-        solr_date_range = self.solr_date_range()
-        if solr_date_range:
-            # date range, either from associated documents or manual override
-            dates = [
-                PartialDate(date)
-                for date in (
-                    self.date.split("/")
-                    if self.date
-                    else self.active_date_range.split("/")
-                )
-            ]
+        with IndexProfiler.section(self, "relations"):
+            annotations = self.index_annotations()
+            if not all(name in self.__dict__ for name in annotations):
+                # not indexed in bulk; query for the annotated values
+                self.__dict__.update(pop_index_annotations(self, annotations))
+            # get url while document count is still annotated
+            url = self.get_absolute_url()
+            related = pop_index_annotations(self, annotations)
             index_data.update(
                 {
-                    "date_dr": solr_date_range,
-                    "date_str_s": self.date_str,
-                    "start_dating_i": (dates[0].numeric_format()),
-                    "end_dating_i": (
-                        (dates[1] if len(dates) > 1 else dates[0]).numeric_format(
-                            mode="max"
-                        )
+                    # related object counts
+                    "documents_i": related["document_count"],
+                    "people_i": len(
+                        set(related["related_from_ids"] or [])
+                        | set(related["related_to_ids"] or [])
                     ),
+                    "places_i": related["place_count"],
+                    # kinds of relationships to documents
+                    "document_relation_ss": related["document_relation_types"] or [],
+                    "certain_document_relation_ss": related[
+                        "certain_document_relation_types"
+                    ]
+                    or [],
+                }
+            )
+        with IndexProfiler.section(self, "metadata"):
+            index_data.update(
+                {
+                    # basic metadata
+                    "slug_s": self.slug,
+                    "name_s": str(self),
+                    # use prefetched names when available
+                    "other_names_ss": [
+                        n.name for n in self.names.all() if not n.primary
+                    ],
+                    "description_txt": self.description_en,
+                    "gender_s": self.get_gender_display(),
+                    "role_ss": [role.name_en for role in self.roles.all()],
+                    "url_s": url,
+                    "has_page_b": bool(url),
+                    "tags_ss_lower": [t.name for t in self.tags.all()],
                 }
             )
+        with IndexProfiler.section(self, "dating"):
+            solr_date_range = self.solr_date_range()
+            if solr_date_range:
+                # date range, either from associated documents or manual override
+                dates = [
+                    PartialDate(date)
+                    for date in (
+                        self.date.split("/")
+                        if self.date
+                        else self.active_date_range.split("/")
+                    )
+                ]
+                index_data.update(
+                    {
+                        "date_dr": solr_date_range,
+                        "date_str_s": self.date_str,
+                        "start_dating_i": (dates[0].numeric_format()),
+                        "end_dating_i": (
+                            (dates[1] if len(dates) > 1 else dates[0]).numeric_format(
+                                mode="max"
+                            )
+                        ),
+                    }
+                )
         return index_data
 
     # signal handlers to update the index based on changes to other models
@@ -1446,15 +1539,15 @@ class PlaceSignalHandlers:
             return
 
         place_filter = {"%s__pk" % place_attr: instance.pk}
-        places = Place.items_to_index().filter(**place_filter)
-        if places.exists():
+        place_ids = Place.objects.filter(**place_filter).values_list("pk", flat=True)
+        if place_ids:
             logger.debug(
-                "%s %s, reindexing %d related place(s)",
+                "%s %s, queueing %d related place(s) for reindexing",
                 model_name,
                 mode,
-                places.count(),
+                len(place_ids),
             )
-            ModelIndexable.index_items(places)
+            IndexQueue.add(Place, place_ids)
 
     @staticmethod
     def related_save(sender, instance=None, raw=False, **_kwargs):
@@ -1469,7 +1562,9 @@ class PlaceSignalHandlers:
         PlaceSignalHandlers.related_change(instance, raw, "delete")
 
 
-class Place(ModelIndexable, SlugMixin, PermalinkMixin):
+class Place(
+    IndexDigestMixin, ModelIndexable, SlugMixin, NamedEntityMixin, PermalinkMixin
+):
     """A named geographical location, which may be associated with documents or people."""
 
     names = GenericRelation(Name, related_query_name="place")
@@ -1519,12 +1614,7 @@ class Place(ModelIndexable, SlugMixin, PermalinkMixin):
         Display the place using its display name, if one is designated,
         otherwise display the first name.
         """
-        try:
-            return str(self.names.get(primary=True))
-        except Name.MultipleObjectsReturned:
-            return str(self.names.filter(primary=True).first())
-        except Name.DoesNotExist:
-            return str(self.names.first() or super().__str__())
+        return str(self.primary_name() or super().__str__())
 
     def save(self, *args, **kwargs):
         # if slug has changed, save the old one as a past slug
@@ -1567,12 +1657,22 @@ class Place(ModelIndexable, SlugMixin, PermalinkMixin):
         # quick count for parasolr indexing (don't do prefetching just to get the total!)
         return cls.objects.count()
 
+    @classmethod
+    def index_annotations(cls):
+        """Annotations for related object counts used in index data, as subqueries"""
+        return {
+            "document_count": count_subquery(
+                DocumentPlaceRelation.objects.all(), "place"
+            ),
+            "person_count": count_subquery(PersonPlaceRelation.objects.all(), "place"),
+        }
+
     @classmethod
     def items_to_index(cls):
         """Custom logic for finding items to be indexed when indexing in
         bulk."""
-        return Place.objects.prefetch_related(
-            "names", "documentplacerelation_set", "personplacerelation_set"
+        return Place.objects.annotate(**cls.index_annotations()).prefetch_related(
+            "names"
         )
 
     def related_places(self):
@@ -1672,25 +1772,35 @@ class Place(ModelIndexable, SlugMixin, PermalinkMixin):
     def index_data(self):
         """data for indexing in Solr"""
         index_data = super().index_data()
-        index_data.update(
-            {
-                # basic metadata
-                "slug_s": self.slug,
-                "name_s": str(self),
-                "other_names_ss": sorted([n.name for n in self.names.non_primary()]),
-                "url_s": self.get_absolute_url(),
-                # LatLonPointSpatialField takes lat,lon string
-                "location_p": (
-                    f"{self.latitude},{self.longitude}"
-                    if self.latitude and self.longitude
-                    else None
-                ),
-                # related object counts
-                "documents_i": self.documentplacerelation_set.count(),
-                "people_i": self.personplacerelation_set.count(),
-                "is_region_b": self.is_region,
-            }
-        )
+        with IndexProfiler.section(self, "metadata"):
+            index_data.update(
+                {
+                    # basic metadata
+                    "slug_s": self.slug,
+                    "name_s": str(self),
+                    "other_names_ss": sorted(
+                        # use prefetched names when available
+                        [n.name for n in self.names.all() if not n.primary]
+                    ),
+                    "url_s": self.get_absolute_url(),
+                    # LatLonPointSpatialField takes lat,lon string
+                    "location_p": (
+                        f"{self.latitude},{self.longitude}"
+                        if self.latitude and self.longitude
+                        else None
+                    ),
+                    "is_region_b": self.is_region,
+                }
+            )
+        with IndexProfiler.section(self, "relations"):
+            related = pop_index_annotations(self, self.index_annotations())
+            index_data.update(
+                {
+                    # related object counts
+                    "documents_i": related["document_count"],
+                    "people_i": related["person_count"],
+                }
+            )
         return index_data
 
     # signal handlers to update the index based on changes to other models
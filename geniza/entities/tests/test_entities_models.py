@@ -7,10 +7,10 @@ from django.contrib.auth.models import User
 from django.contrib.contenttypes.models import ContentType
 from django.forms import ValidationError
 from django.utils import timezone
-from parasolr.django.indexing import ModelIndexable
 from slugify import slugify
 from unidecode import unidecode
 
+from geniza.common.indexing import IndexDigestMixin, IndexQueue
 from geniza.corpus.dates import PartialDate, standard_date_display
 from geniza.corpus.models import Dating, Document
 from geniza.entities.models import (
@@ -88,6 +88,19 @@ class TestPerson:
         # __str__ should use the primary name
         assert str(person) == primary_name.name
 
+    def test_str_prefetched(self, django_assert_num_queries):
+        person = Person.objects.create()
+        Name.objects.create(name="Shelomo Dov Goitein", content_object=person)
+        primary_name = Name.objects.create(
+            name="S.D. Goitein", content_object=person, primary=True
+        )
+        unnamed = Person.objects.create()
+        people = list(Person.objects.prefetch_related("names").order_by("pk"))
+        # prefetched names are used without querying
+        with django_assert_num_queries(0):
+            assert str(people[0]) == primary_name.name
+            assert str(people[1]) == f"Person object ({unnamed.pk})"
+
     def test_merge_with(self):
         # create two people
         person = Person.objects.create(
@@ -589,6 +602,54 @@ class TestPerson:
             in index_data["other_names_ss"]
         )
 
+    def test_index_data_annotated(
+        self, person, person_multiname, document, join, django_assert_max_num_queries
+    ):
+        (pdrtype, _) = PersonDocumentRelationType.objects.get_or_create(name_en="test")
+        PersonDocumentRelation.objects.create(
+            person=person, document=document, type=pdrtype
+        )
+        (scribe, _) = PersonDocumentRelationType.objects.get_or_create(name_en="scribe")
+        PersonDocumentRelation.objects.create(
+            person=person, document=document, type=scribe, uncertain=True
+        )
+        PersonDocumentRelation.objects.create(person=person, document=join)
+        (ppr_type, _) = PersonPersonRelationType.objects.get_or_create(name_en="test")
+        # related in both directions; counted once
+        PersonPersonRelation.objects.create(
+            from_person=person, to_person=person_multiname, type=ppr_type
+        )
+        PersonPersonRelation.objects.create(
+            from_person=person_multiname, to_person=person, type=ppr_type
+        )
+        # avoid date range queries
+        Person.objects.update(date="1200")
+
+        people = Person.prep_index_chunk(
+            list(Person.items_to_index().order_by("pk").filter(pk=person.pk))
+        )
+        assert people[0].document_relation_count == 3
+        assert people[0].document_count == 2
+        assert people[0].document_relation_types == [
+            scribe.name_en,
+            pdrtype.name_en,
+            None,
+        ]
+        assert people[0].certain_document_relation_types == [pdrtype.name_en, None]
+
+        # no additional queries per record for counts and relations
+        with django_assert_max_num_queries(0):
+            index_data = people[0].index_data()
+        # same results as for a record that was not annotated
+        person.refresh_from_db()
+        assert index_data == person.index_data()
+        assert index_data["documents_i"] == 2
+        assert index_data["people_i"] == 1
+        assert index_data["places_i"] == 0
+        assert index_data["certain_document_relation_ss"] == [pdrtype.name_en, None]
+        # annotations are removed once used
+        assert not hasattr(people[0], "document_count")
+
     def test_active_date_range(self, person, document, join):
         # these dates should be used (active)
         document.doc_date_standard = "1200/1300"
@@ -718,19 +779,32 @@ class TestPersonSolrQuerySet:
 
 @pytest.mark.django_db
 class TestPersonSignalHandlers:
-    @patch.object(ModelIndexable, "index_items")
-    def test_related_save(self, mock_indexitems, person, person_multiname, document):
+    @patch.object(IndexDigestMixin, "index_items")
+    def test_related_save(
+        self,
+        mock_indexitems,
+        person,
+        person_multiname,
+        document,
+        django_capture_on_commit_callbacks,
+    ):
         # unsaved name should be ignored
         name = Name(name="test name")
-        PersonSignalHandlers.related_save(Name, name)
+        with django_capture_on_commit_callbacks(execute=True):
+            PersonSignalHandlers.related_save(Name, name)
         mock_indexitems.assert_not_called()
         # raw - ignore
-        PersonSignalHandlers.related_save(Name, name, raw=True)
+        with django_capture_on_commit_callbacks(execute=True):
+            PersonSignalHandlers.related_save(Name, name, raw=True)
         mock_indexitems.assert_not_called()
         # name associated with a person
         name.content_object = person
         name.save()
-        PersonSignalHandlers.related_save(Name, name)
+        # discard reindexing queued by the save, so only the handler's
+        # records are flushed
+        IndexQueue.clear()
+        with django_capture_on_commit_callbacks(execute=True):
+            PersonSignalHandlers.related_save(Name, name)
         assert mock_indexitems.call_count == 1
         assert person in mock_indexitems.call_args[0][0]
 
@@ -739,7 +813,9 @@ class TestPersonSignalHandlers:
         role.name_en = "changed"
         role.save()
         mock_indexitems.reset_mock()
-        PersonSignalHandlers.related_save(PersonRole, role)
+        IndexQueue.clear()
+        with django_capture_on_commit_callbacks(execute=True):
+            PersonSignalHandlers.related_save(PersonRole, role)
         assert mock_indexitems.call_count == 1
         assert person in mock_indexitems.call_args[0][0]
 
@@ -750,7 +826,9 @@ class TestPersonSignalHandlers:
         )
         person_rel.save()
         mock_indexitems.reset_mock()
-        PersonSignalHandlers.related_save(PersonPersonRelation, person_rel)
+        IndexQueue.clear()
+        with django_capture_on_commit_callbacks(execute=True):
+            PersonSignalHandlers.related_save(PersonPersonRelation, person_rel)
         assert mock_indexitems.call_count == 1
         assert person in mock_indexitems.call_args[0][0]
 
@@ -759,7 +837,9 @@ class TestPersonSignalHandlers:
         ppr = PersonPlaceRelation(person=person, place=rel_place)
         ppr.save()
         mock_indexitems.reset_mock()
-        PersonSignalHandlers.related_save(PersonPlaceRelation, ppr)
+        IndexQueue.clear()
+        with django_capture_on_commit_callbacks(execute=True):
+            PersonSignalHandlers.related_save(PersonPlaceRelation, ppr)
         assert mock_indexitems.call_count == 1
         assert person in mock_indexitems.call_args[0][0]
 
@@ -767,18 +847,23 @@ class TestPersonSignalHandlers:
         pdr = PersonDocumentRelation(document=document, person=person)
         pdr.save()
         mock_indexitems.reset_mock()
-        PersonSignalHandlers.related_save(PersonDocumentRelation, pdr)
+        IndexQueue.clear()
+        with django_capture_on_commit_callbacks(execute=True):
+            PersonSignalHandlers.related_save(PersonDocumentRelation, pdr)
         assert mock_indexitems.call_count == 1
         assert person in mock_indexitems.call_args[0][0]
 
         # unhandled model should be ignored, no error
         mock_indexitems.reset_mock()
-        PersonSignalHandlers.related_save(Person, person)
+        with django_capture_on_commit_callbacks(execute=True):
+            PersonSignalHandlers.related_save(Person, person)
         mock_indexitems.assert_not_called()
 
     @pytest.mark.django_db
-    @patch.object(ModelIndexable, "index_items")
-    def test_related_delete(self, mock_indexitems, person, document):
+    @patch.object(IndexDigestMixin, "index_items")
+    def test_related_delete(
+        self, mock_indexitems, person, document, django_capture_on_commit_callbacks
+    ):
         # delegates to same method as save, just check a few cases
 
         # Name associated with a person
@@ -786,7 +871,11 @@ class TestPersonSignalHandlers:
         name.save()
         # delete
         mock_indexitems.reset_mock()
-        PersonSignalHandlers.related_delete(Name, name)
+        # discard reindexing queued by the save, so only the handler's
+        # records are flushed
+        IndexQueue.clear()
+        with django_capture_on_commit_callbacks(execute=True):
+            PersonSignalHandlers.related_delete(Name, name)
         assert mock_indexitems.call_count == 1
         assert person in mock_indexitems.call_args[0][0]
 
@@ -794,7 +883,9 @@ class TestPersonSignalHandlers:
         pdr = PersonDocumentRelation(document=document, person=person)
         pdr.save()
         mock_indexitems.reset_mock()
-        PersonSignalHandlers.related_delete(PersonDocumentRelation, pdr)
+        IndexQueue.clear()
+        with django_capture_on_commit_callbacks(execute=True):
+            PersonSignalHandlers.related_delete(PersonDocumentRelation, pdr)
         assert mock_indexitems.call_count == 1
         assert person in mock_indexitems.call_args[0][0]
 
@@ -1126,6 +1217,13 @@ class TestPlace:
         assert index_data["documents_i"] == 2
         assert index_data["people_i"] == 1
 
+        # counts annotated for bulk indexing
+        annotated = Place.items_to_index().get(pk=mosul.pk)
+        assert annotated.document_count == 2
+        assert annotated.person_count == 1
+        mosul.refresh_from_db()
+        assert annotated.index_data() == mosul.index_data()
+
 
 @pytest.mark.django_db
 class TestPersonPlaceRelation:
@@ -1265,21 +1363,29 @@ class TestPlaceEventRelation:
 
 @pytest.mark.django_db
 class TestPlaceSignalHandlers:
-    @patch.object(ModelIndexable, "index_items")
-    def test_related_save(self, mock_indexitems, person, document):
+    @patch.object(IndexDigestMixin, "index_items")
+    def test_related_save(
+        self, mock_indexitems, person, document, django_capture_on_commit_callbacks
+    ):
         place = Place.objects.create()
 
         # unsaved name should be ignored
         name = Name(name="test name")
-        PlaceSignalHandlers.related_save(Name, name)
+        with django_capture_on_commit_callbacks(execute=True):
+            PlaceSignalHandlers.related_save(Name, name)
         mock_indexitems.assert_not_called()
         # raw - ignore
-        PlaceSignalHandlers.related_save(Name, name, raw=True)
+        with django_capture_on_commit_callbacks(execute=True):
+            PlaceSignalHandlers.related_save(Name, name, raw=True)
         mock_indexitems.assert_not_called()
         # name associated with a place
         name.content_object = place
         name.save()
-        PlaceSignalHandlers.related_save(Name, name)
+        # discard reindexing queued by the save, so only the handler's
+        # records are flushed
+        IndexQueue.clear()
+        with django_capture_on_commit_callbacks(execute=True):
+            PlaceSignalHandlers.related_save(Name, name)
         assert mock_indexitems.call_count == 1
         assert place in mock_indexitems.call_args[0][0]
 
@@ -1287,7 +1393,9 @@ class TestPlaceSignalHandlers:
         ppr = PersonPlaceRelation(person=person, place=place)
         ppr.save()
         mock_indexitems.reset_mock()
-        PlaceSignalHandlers.related_save(PersonPlaceRelation, ppr)
+        IndexQueue.clear()
+        with django_capture_on_commit_callbacks(execute=True):
+            PlaceSignalHandlers.related_save(PersonPlaceRelation, ppr)
         assert mock_indexitems.call_count == 1
         assert place in mock_indexitems.call_args[0][0]
 
@@ -1295,18 +1403,23 @@ class TestPlaceSignalHandlers:
         dpr = DocumentPlaceRelation(document=document, place=place)
         dpr.save()
         mock_indexitems.reset_mock()
-        PlaceSignalHandlers.related_save(PersonPlaceRelation, dpr)
+        IndexQueue.clear()
+        with django_capture_on_commit_callbacks(execute=True):
+            PlaceSignalHandlers.related_save(PersonPlaceRelation, dpr)
         assert mock_indexitems.call_count == 1
         assert place in mock_indexitems.call_args[0][0]
 
         # unhandled model should be ignored, no error
         mock_indexitems.reset_mock()
-        PlaceSignalHandlers.related_save(Place, place)
+        with django_capture_on_commit_callbacks(execute=True):
+            PlaceSignalHandlers.related_save(Place, place)
         mock_indexitems.assert_not_called()
 
     @pytest.mark.django_db
-    @patch.object(ModelIndexable, "index_items")
-    def test_related_delete(self, mock_indexitems, document):
+    @patch.object(IndexDigestMixin, "index_items")
+    def test_related_delete(
+        self, mock_indexitems, document, django_capture_on_commit_callbacks
+    ):
         # delegates to same method as save, just check a few cases
 
         # Name associated with a document
@@ -1315,7 +1428,11 @@ class TestPlaceSignalHandlers:
         name.save()
         # delete
         mock_indexitems.reset_mock()
-        PlaceSignalHandlers.related_delete(Name, name)
+        # discard reindexing queued by the save, so only the handler's
+        # records are flushed
+        IndexQueue.clear()
+        with django_capture_on_commit_callbacks(execute=True):
+            PlaceSignalHandlers.related_delete(Name, name)
         assert mock_indexitems.call_count == 1
         assert place in mock_indexitems.call_args[0][0]
 
@@ -1323,7 +1440,9 @@ class TestPlaceSignalHandlers:
         dpr = DocumentPlaceRelation(document=document, place=place)
         dpr.save()
         mock_indexitems.reset_mock()
-        PlaceSignalHandlers.related_delete(DocumentPlaceRelation, dpr)
+        IndexQueue.clear()
+        with django_capture_on_commit_callbacks(execute=True):
+            PlaceSignalHandlers.related_delete(DocumentPlaceRelation, dpr)
         assert mock_indexitems.call_count == 1
         assert place in mock_indexitems.call_args[0][0]
 
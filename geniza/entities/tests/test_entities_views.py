@@ -683,6 +683,38 @@ class TestPersonListView:
             # should call set_choices_from_facets on form
             mock_setchoices.assert_called_once()
 
+    def test_get_context_data__facets(self, rf):
+        personlist_view = PersonListView(kwargs={})
+        personlist_view.request = rf.get("/people/")
+        personlist_view.solr_stats = Mock()
+        personlist_view.solr_stats.facet_counts.return_value = {"gender": {"Male": 2}}
+        with patch.object(personlist_view, "get_form") as mock_get_form:
+            mock_get_form.return_value.is_valid.return_value = True
+            # no query or filters: facets from cached stats, not from the search
+            mock_get_form.return_value.cleaned_data = {}
+            qs = personlist_view.get_queryset()
+            assert personlist_view.unfiltered
+            assert "facet.field" not in qs.query_opts()
+            personlist_view.object_list = qs
+            with patch("geniza.entities.views.ListView.get_context_data") as mock_ctx:
+                mock_ctx.return_value = {
+                    "form": mock_get_form.return_value,
+                    "page_obj": Mock(object_list=Mock(count=Mock(return_value=0))),
+                }
+                personlist_view.get_context_data()
+            personlist_view.solr_stats.facet_counts.assert_called_with(
+                PersonSolrQuerySet, *PersonListView.facet_fields
+            )
+            mock_get_form.return_value.set_choices_from_facets.assert_called_with(
+                {"gender": {"Male": 2}}
+            )
+
+            # keyword query: facets from the search
+            mock_get_form.return_value.cleaned_data = {"q": "berakha"}
+            qs = personlist_view.get_queryset()
+            assert not personlist_view.unfiltered
+            assert "facet.field" in qs.query_opts()
+
     def test_get_form_kwargs(self, client):
         # should use initial values if not set
         response = client.get(reverse("entities:person-list"))
@@ -1268,12 +1300,15 @@ class TestPlaceListView:
             placelist_view.object_list = mock_qs
             placelist_view.request = rf.get("/places/")
             placelist_view.get_range_stats = Mock(return_value={})
+            placelist_view.solr_stats = Mock()
+            placelist_view.solr_stats.count.return_value = 150
             context_data = placelist_view.get_context_data()
             assert context_data["page_type"] == "places"
             assert context_data["search_opts"]["form_valid"] == True
 
-            # total count should be pulled from SolrQuerySet
-            mock_qs.count.assert_called()
+            # total count should be pulled from cached stats for SolrQuerySet
+            placelist_view.solr_stats.count.assert_called_with(mock_queryset_cls)
+            assert context_data["total"] == 150
 
             # invalid form
             placelist_view.request.GET = {"sort": "abcdefg"}
@@ -814,6 +814,16 @@ class PersonListView(ListView, FormMixin, SolrDateRangeMixin):
         "date_desc": "-end_dating_i",
     }
     initial = {"sort": "name", "sort_dir": "asc"}
+    # solr fields to facet on
+    facet_fields = [
+        "gender",
+        "roles",
+        "document_relations",
+        "certain_document_relations",
+        "has_page",
+    ]
+    # set when no query or filters are applied
+    unfiltered = False
 
     # regex to fix problematic characters in names of roles, relations, etc
     qs_regex = r"([ \(\)])"
@@ -833,18 +843,13 @@ class PersonListView(ListView, FormMixin, SolrDateRangeMixin):
 
     def get_queryset(self, *args, **kwargs):
         """modify queryset to sort and filter on people in the list"""
-        people = PersonSolrQuerySet().facet(
-            "gender",
-            "roles",
-            "document_relations",
-            "certain_document_relations",
-            "has_page",
-        )
+        people = PersonSolrQuerySet()
+        self.unfiltered = False
 
         form = self.get_form()
         # bail out if form is invalid
         if not form.is_valid():
-            return people.none()
+            return people.facet(*self.facet_fields).none()
 
         search_opts = form.cleaned_data
         if search_opts.get("q"):
@@ -943,6 +948,12 @@ class PersonListView(ListView, FormMixin, SolrDateRangeMixin):
             # use name (slug_s ascending) as tiebreaker
             people = people.order_by(order_by, "slug_s")
 
+        # facet counts without a query or filters are the same for every
+        # request, so get them from the stats cache instead of from solr
+        self.unfiltered = not search_opts.get("q") and not self.applied_filter_labels
+        if not self.unfiltered:
+            people = people.facet(*self.facet_fields)
+
         self.queryset = people
 
         return people
@@ -971,9 +982,14 @@ class PersonListView(ListView, FormMixin, SolrDateRangeMixin):
         context_data = super().get_context_data(**kwargs)
 
         # set facet labels and counts on form
-        facet_dict = self.queryset.get_facets()
+        if self.unfiltered:
+            facet_fields = self.solr_stats.facet_counts(
+                PersonSolrQuerySet, *self.facet_fields
+            )
+        else:
+            facet_fields = self.queryset.get_facets().facet_fields
         # populate choices for facet filter fields on the form
-        context_data["form"].set_choices_from_facets(facet_dict.facet_fields)
+        context_data["form"].set_choices_from_facets(facet_fields)
         # get highlighting
         paged_result = context_data["page_obj"].object_list
         highlights = paged_result.get_highlighting() if paged_result.count() else {}
@@ -1085,7 +1101,7 @@ class PlaceListView(ListView, FormMixin, SolrDateRangeMixin):
                 "page_title": self.page_title,
                 "page_description": self.page_description,
                 "applied_filters": applied_filters,
-                "total": PlaceSolrQuerySet().count(),
+                "total": self.solr_stats.count(PlaceSolrQuerySet),
                 "page_type": "places",
                 "maptiler_token": getattr(settings, "MAPTILER_API_TOKEN", ""),
             }
@@ -1,6 +1,30 @@
 from django.apps import AppConfig
+from django.db.models.signals import m2m_changed, post_delete, post_save
 
 
 class FootnotesConfig(AppConfig):
     name = "geniza.footnotes"
     verbose_name = "Scholarship Records"
+
+    def ready(self):
+        # import and connect signal handlers for source search vectors
+        # and stored footnote content
+        from geniza.footnotes.models import FootnoteSignalHandlers, SourceSignalHandlers
+
+        post_save.connect(
+            SourceSignalHandlers.authorship_change, sender="footnotes.Authorship"
+        )
+        post_delete.connect(
+            SourceSignalHandlers.authorship_change, sender="footnotes.Authorship"
+        )
+        m2m_changed.connect(
+            SourceSignalHandlers.authors_change, sender="footnotes.Authorship"
+        )
+        post_save.connect(SourceSignalHandlers.creator_save, sender="footnotes.Creator")
+        post_save.connect(
+            FootnoteSignalHandlers.annotation_change, sender="annotations.Annotation"
+        )
+        post_delete.connect(
+            FootnoteSignalHandlers.annotation_change, sender="annotations.Annotation"
+        )
+        return super().ready()
@@ -0,0 +1,18 @@
+# Generated by Django 5.2.18 on 2026-10-16 20:49
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("footnotes", "0037_creator_creator_unique_name_first_name_en_and_more"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="footnote",
+            name="render_cache",
+            field=models.JSONField(blank=True, editable=False, null=True),
+        ),
+    ]
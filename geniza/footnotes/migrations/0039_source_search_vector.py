@@ -0,0 +1,28 @@
+# Generated by Django 5.2.18 on 2026-10-16 22:58
+
+import django.contrib.postgres.indexes
+import django.contrib.postgres.search
+from django.db import migrations
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ("footnotes", "0038_footnote_render_cache"),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name="source",
+            name="search_vector",
+            field=django.contrib.postgres.search.SearchVectorField(
+                editable=False, null=True
+            ),
+        ),
+        migrations.AddIndex(
+            model_name="source",
+            index=django.contrib.postgres.indexes.GinIndex(
+                fields=["search_vector"], name="footnotes_s_search__0d07fe_gin"
+            ),
+        ),
+    ]
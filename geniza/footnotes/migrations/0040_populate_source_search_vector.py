@@ -0,0 +1,39 @@
+# Generated by Django 5.2.18 on 2026-10-16 23:02
+
+from django.conf import settings
+from django.contrib.postgres.search import SearchVector
+from django.db import migrations
+from django.db.models import Value
+
+
+def populate_search_vectors(apps, schema_editor):
+    """Calculate the search vector for existing sources, from title, volume,
+    and author names in all languages."""
+    Source = apps.get_model("footnotes", "Source")
+    language_codes = [code for code, _ in settings.LANGUAGES]
+    for source in Source.objects.prefetch_related("authorship_set__creator"):
+        values = [getattr(source, "title_%s" % code) for code in language_codes]
+        values.append(source.volume)
+        for authorship in source.authorship_set.all():
+            for field in ["last_name", "first_name"]:
+                values.extend(
+                    getattr(authorship.creator, "%s_%s" % (field, code))
+                    for code in language_codes
+                )
+        text = " ".join(dict.fromkeys(value for value in values if value))
+        Source.objects.filter(pk=source.pk).update(
+            search_vector=SearchVector(Value(text))
+        )
+
+
+class Migration(migrations.Migration):
+    dependencies = [
+        ("footnotes", "0039_source_search_vector"),
+    ]
+
+    operations = [
+        migrations.RunPython(
+            populate_search_vectors,
+            reverse_code=migrations.RunPython.noop,
+        ),
+    ]
@@ -1,3 +1,4 @@
+import hashlib
 import re
 from collections import defaultdict
 from functools import cached_property
@@ -9,8 +10,10 @@ from django.conf import settings
 from django.contrib.contenttypes.fields import GenericForeignKey
 from django.contrib.contenttypes.models import ContentType
 from django.contrib.humanize.templatetags.humanize import ordinal
-from django.db import models
-from django.db.models import Count, Q
+from django.contrib.postgres.indexes import GinIndex
+from django.contrib.postgres.search import SearchVector, SearchVectorField
+from django.db import models, transaction
+from django.db.models import Count, Q, Value
 from django.db.models.functions import NullIf
 from django.db.models.query import Prefetch
 from django.utils.html import strip_tags
@@ -125,6 +128,20 @@ class SourceQuerySet(MultilingualQuerySet):
         "annotate with footnote count"
         return self.annotate(Count("footnote", distinct=True))
 
+    def update_search_vectors(self):
+        """Recalculate and store the search vector for each source, for
+        use when titles, volumes, or authors change"""
+        sources = self.order_by().prefetch_related(
+            Prefetch(
+                "authorship_set",
+                queryset=Authorship.objects.select_related("creator"),
+            )
+        )
+        for source in sources:
+            Source.objects.filter(pk=source.pk).update(
+                search_vector=SearchVector(Value(source.search_text()))
+            )
+
 
 class Source(models.Model):
     """a published or unpublished work related to geniza materials"""
@@ -179,6 +196,9 @@ class Source(models.Model):
     url = models.URLField(blank=True, max_length=300, verbose_name="URL")
     # preliminary place to store transcription text; should not be editable
     notes = models.TextField(blank=True)
+    # full-text search vector over title, volume, and author names, for
+    # source autocomplete; maintained on save and when authors change
+    search_vector = SearchVectorField(null=True, editable=False)
 
     objects = SourceQuerySet.as_manager()
 
@@ -186,6 +206,12 @@ class Source(models.Model):
         # set default order to title, year for now since first-author order
         # requires queryset annotation
         ordering = ["title", "year"]
+        indexes = [GinIndex(fields=["search_vector"])]
+
+    def save(self, *args, **kwargs):
+        super().save(*args, **kwargs)
+        # update after saving, since the vector is calculated in the database
+        Source.objects.filter(pk=self.pk).update_search_vectors()
 
     def __str__(self):
         """Method used for for internal/data admin use.
@@ -197,6 +223,20 @@ class Source(models.Model):
         else:
             return self.display()
 
+    def search_text(self):
+        """Text for the search vector: title in all languages, volume, and
+        author first and last names in all languages"""
+        values = [getattr(self, "title_%s" % code) for code, _ in settings.LANGUAGES]
+        values.append(self.volume)
+        for authorship in self.authorship_set.all():
+            for field in ["last_name", "first_name"]:
+                values.extend(
+                    getattr(authorship.creator, "%s_%s" % (field, code))
+                    for code, _ in settings.LANGUAGES
+                )
+        # remove empty and duplicate values, preserving order
+        return " ".join(dict.fromkeys(value for value in values if value))
+
     def all_authors(self):
         """semi-colon delimited list of authors in order"""
         return "; ".join([str(c.creator) for c in self.authorship_set.all()])
@@ -447,7 +487,67 @@ class Source(models.Model):
         return cls.objects.get(pk=Source.id_from_uri(uri))
 
 
+class SourceSignalHandlers:
+    """Signal handlers for updating :class:`Source` search vectors when
+    authors are added, removed, or renamed."""
+
+    @staticmethod
+    def authorship_change(sender, instance=None, raw=False, **_kwargs):
+        """update the source search vector when an authorship is saved or deleted"""
+        # raw = saved as presented; don't query the database
+        if raw:
+            return
+        Source.objects.filter(pk=instance.source_id).update_search_vectors()
+
+    @staticmethod
+    def authors_change(sender, instance, action, reverse, pk_set, **_kwargs):
+        """update source search vectors when authors are added or removed
+        through the many-to-many relationship"""
+        if action not in ["post_add", "post_remove", "post_clear"]:
+            return
+        if not reverse:
+            # instance is the source
+            Source.objects.filter(pk=instance.pk).update_search_vectors()
+        elif pk_set:
+            # instance is the creator; pk_set is the affected sources
+            Source.objects.filter(pk__in=pk_set).update_search_vectors()
+
+    @staticmethod
+    def creator_save(sender, instance=None, raw=False, **_kwargs):
+        """update search vectors for all sources by a creator when it is saved"""
+        if raw or not instance.pk:
+            return
+        Source.objects.filter(authors=instance).update_search_vectors()
+
+
+class FootnoteSignalHandlers:
+    """Signal handlers for updating stored :class:`Footnote` rendered
+    content when annotations are saved or deleted."""
+
+    @staticmethod
+    def annotation_change(sender, instance=None, raw=False, **_kwargs):
+        """update rendered content for an annotation's footnote, and its
+        previous footnote if it was moved, when it is saved or deleted"""
+        # raw = saved as presented; don't query the database
+        if raw:
+            return
+        footnote_ids = {instance.footnote_id, instance.initial_value("footnote_id")}
+        # update once the transaction is committed, so that content is
+        # rendered from the saved annotations
+        transaction.on_commit(
+            lambda: Footnote.objects.filter(
+                pk__in=footnote_ids - {None}
+            ).update_render_caches()
+        )
+
+
 class FootnoteQuerySet(models.QuerySet):
+    def update_render_caches(self):
+        """Update stored rendered content for footnotes in this queryset
+        that are out of date (see :meth:`Footnote.update_render_cache`)"""
+        for footnote in self.prefetch_related("annotation_set"):
+            footnote.update_render_cache()
+
     def includes_footnote(self, other):
         """Check if the current queryset includes a match for the
         specified footnote. Matches are made by comparing content source,
@@ -538,6 +638,12 @@ class Footnote(TrackChangesModel):
     url = models.URLField(
         "URL", blank=True, max_length=300, help_text="Link to the source (optional)"
     )
+    #: rendered transcription content generated from associated annotations,
+    #: with a digest of the annotations used to determine when it is out of date
+    render_cache = models.JSONField(blank=True, null=True, editable=False)
+    #: version of rendered content in :attr:`render_cache`; increment when
+    #: changes to rendering code or templates should invalidate stored content
+    RENDER_VERSION = 1
 
     # Generic relationship
     content_type = models.ForeignKey(
@@ -728,15 +834,27 @@ class Footnote(TrackChangesModel):
     has_url.boolean = True
     has_url.admin_order_field = "url"
 
-    @cached_property
-    def content_html(self):
-        """content as html, if available; returns a dictionary of lists.
-        keys are canvas ids, list is html content."""
+    def annotations_digest(self):
+        """Digest of :attr:`RENDER_VERSION` and the ids and modification times
+        for all annotations associated with this footnote, used to check if
+        rendered content is current. Uses prefetched annotations if available."""
+        digest = hashlib.sha1(f"v{self.RENDER_VERSION};".encode())
+        for annotation_id, modified in sorted(
+            (a.pk, a.modified) for a in self.annotation_set.all()
+        ):
+            digest.update(f"{annotation_id}:{modified.isoformat()};".encode())
+        return digest.hexdigest()
+
+    def render_content(self):
+        """Generate html and text versions of content from associated annotations.
+        Returns a dictionary with html content as a list of (canvas id, list of html)
+        pairs, html as a single string with and without explicit line numbers,
+        plain text, and a list of plain text strings per canvas."""
         # NOTE: previously only returned if type was digital edition;
         # now that we're using foreign keys, return content from
         # any associated annotations, regardless of what doc relation.
 
-        # generate return a dictionary of lists of annotation html content
+        # generate a dictionary of lists of annotation html content
         # keyed on canvas uri
         # handle multiple annotations on the same canvas
         html_content = defaultdict(list)
@@ -749,30 +867,21 @@ class Footnote(TrackChangesModel):
             & Q(content__textGranularity="line")
         ).order_by("content__schema:position", "created"):
             html_content[a.target_source_id] += a.block_content_html
-        # cast to a regular dict to avoid weirdness in django templates
-        return dict(html_content)
 
-    @cached_property
-    def content_html_str(self):
-        "content as a single string of html, if available"
-        # content html is a dict; values are lists of html content
-        content_html = self.content_html
-        if content_html:
-            return "\n".join(
+        html_str = text = text_canvases = None
+        if html_content:
+            html_str = "\n".join(
                 [
                     section
-                    for canvas_annos in content_html.values()
+                    for canvas_annos in html_content.values()
                     for section in canvas_annos
                 ]
             )
-
-    @cached_property
-    def content_text_canvases(self):
-        """content as a list of strings, one per canvas"""
-        # used for regex search indexing
-        content_html = self.content_html
-        if content_html:
-            return [
+            # use beautiful soup to parse html content and return as text
+            # (strips tags and convert entities to plain text equivalent)
+            text = BeautifulSoup(html_str, features="lxml").get_text()
+            # used for regex search indexing
+            text_canvases = [
                 # convert each annotation from html to plaintext
                 "\n".join(
                     [
@@ -781,9 +890,71 @@ class Footnote(TrackChangesModel):
                         for a in canvas_annos
                     ]
                 )
-                for canvas_annos in content_html.values()
+                for canvas_annos in html_content.values()
             ]
 
+        return {
+            # store as a list of pairs; json object key order is not preserved
+            "html": [[canvas, sections] for canvas, sections in html_content.items()],
+            "html_str": html_str,
+            "html_lines": self.explicit_line_numbers(html_str),
+            "text": text,
+            "text_canvases": text_canvases,
+        }
+
+    def update_render_cache(self):
+        """Render content from associated annotations and store it in
+        :attr:`render_cache`, if annotations or :attr:`RENDER_VERSION` have
+        changed since it was stored. Returns True if the cache was updated."""
+        digest = self.annotations_digest()
+        if self.render_cache and self.render_cache.get("digest") == digest:
+            return False
+        self.render_cache = {
+            **self.render_content(),
+            "digest": digest,
+            "version": self.RENDER_VERSION,
+        }
+        # update without saving, to avoid triggering signal handlers
+        Footnote.objects.filter(pk=self.pk).update(render_cache=self.render_cache)
+        self.__dict__.pop("rendered", None)
+        return True
+
+    @cached_property
+    def rendered(self):
+        """Rendered content from :attr:`render_cache`, if it was rendered
+        with the current :attr:`RENDER_VERSION`; otherwise content is
+        rendered from annotations without storing it. The cache is updated
+        when annotations are saved or deleted, and when documents are indexed
+        (see :meth:`update_render_cache`)."""
+        if (
+            self.render_cache
+            and self.render_cache.get("version") == self.RENDER_VERSION
+        ):
+            return self.render_cache
+        return self.render_content()
+
+    @property
+    def content_html(self):
+        """content as html, if available; returns a dictionary of lists.
+        keys are canvas ids, list is html content."""
+        # cast to a regular dict to avoid weirdness in django templates
+        return dict(self.rendered["html"])
+
+    @property
+    def content_html_str(self):
+        "content as a single string of html, if available"
+        return self.rendered["html_str"]
+
+    @property
+    def content_html_lines(self):
+        "content as a single string of html with explicit line numbers, if available"
+        return self.rendered["html_lines"]
+
+    @property
+    def content_text_canvases(self):
+        """content as a list of strings, one per canvas"""
+        return self.rendered["text_canvases"]
+
     @staticmethod
     def explicit_line_numbers(html):
         """add explicit line numbers to passed HTML (in value attributes of ol > li)"""
@@ -795,11 +966,7 @@ class Footnote(TrackChangesModel):
     @property
     def content_text(self):
         "content as plain text, if available"
-        # use beautiful soup to parse html content and return as text
-        # (strips tags and convert entities to plain text equivalent)
-        # but only return if we have content (otherwise returns string "None")
-        if self.content_html_str:
-            return BeautifulSoup(self.content_html_str, features="lxml").get_text()
+        return self.rendered["text"]
 
     def iiif_annotation_content(self):
         """Return transcription content from this footnote (if any)
@@ -7,6 +7,7 @@ from django.utils.html import strip_tags
 from geniza.annotations.models import Annotation
 from geniza.corpus.models import Document
 from geniza.footnotes.models import (
+    Authorship,
     Creator,
     Footnote,
     Source,
@@ -250,6 +251,36 @@ class TestSource:
         with pytest.raises(Source.DoesNotExist):
             Source.from_uri("http://example.com/-1/")
 
+    def test_search_text(self, twoauthor_source):
+        twoauthor_source.title_he = "שפת התכנות"
+        twoauthor_source.volume = "XXII"
+        assert twoauthor_source.search_text() == (
+            "The C Programming Language שפת התכנות XXII Kernighan Brian Ritchie Dennis"
+        )
+
+    def test_search_vector(self, source, twoauthor_source):
+        def search(q):
+            return set(Source.objects.filter(search_vector=q))
+
+        # populated on save and when authors are added
+        assert search("orwell tea") == {source}
+        assert search("kernighan ritchie programming") == {twoauthor_source}
+
+        # updated when an author is renamed
+        orwell = source.authors.first()
+        orwell.last_name_en = "Blair"
+        orwell.save()
+        assert search("blair") == {source}
+        assert not search("orwell")
+
+        # updated when an authorship is added or removed
+        Authorship.objects.create(creator=orwell, source=twoauthor_source)
+        assert search("blair") == {source, twoauthor_source}
+        twoauthor_source.authorship_set.get(creator=orwell).delete()
+        assert search("blair") == {source}
+        source.authors.remove(orwell)
+        assert not search("blair")
+
 
 class TestFootnote:
     @pytest.mark.django_db
@@ -409,7 +440,7 @@ class TestFootnote:
         annotation.content["schema:position"] = 2
         annotation.save()
         # invalidate cache
-        del digital_edition.content_html
+        del digital_edition.rendered
         assert digital_edition.content_html[canvas_uri] == [
             "<h3>A label</h3>",
             "Second annotation!",
@@ -427,9 +458,103 @@ class TestFootnote:
         # should return empty dict if there are no annotations
         digital_edition.annotation_set.all().delete()
         # delete the cached value from cached property
-        del digital_edition.content_html
+        del digital_edition.rendered
         assert digital_edition.content_html == {}
 
+    def test_rendered(self, annotation):
+        footnote = Footnote.objects.get(pk=annotation.footnote.pk)
+        assert footnote.render_cache is None
+        rendered = footnote.rendered
+        assert rendered["html_str"] == "Test annotation"
+        assert rendered["text_canvases"] == ["Test annotation"]
+        # reading content does not write to the database
+        assert Footnote.objects.get(pk=footnote.pk).render_cache is None
+
+        # should use stored content when it is available
+        footnote.update_render_cache()
+        footnote = Footnote.objects.get(pk=footnote.pk)
+        with patch.object(Footnote, "render_content") as mock_render_content:
+            with patch.object(Footnote, "annotations_digest") as mock_digest:
+                assert footnote.content_html_str == "Test annotation"
+                mock_render_content.assert_not_called()
+                # does not check annotations on access
+                mock_digest.assert_not_called()
+
+        # stored content from another render version is not used
+        footnote = Footnote.objects.get(pk=footnote.pk)
+        with patch.object(Footnote, "RENDER_VERSION", 2):
+            with patch.object(Footnote, "render_content") as mock_render_content:
+                footnote.content_html_str
+                mock_render_content.assert_called_once()
+
+    def test_update_render_cache(self, annotation):
+        footnote = Footnote.objects.get(pk=annotation.footnote.pk)
+        assert footnote.update_render_cache()
+        stored = Footnote.objects.get(pk=footnote.pk).render_cache
+        assert stored["html_str"] == "Test annotation"
+        assert stored["digest"] == footnote.annotations_digest()
+        assert stored["version"] == Footnote.RENDER_VERSION
+        # not rendered again when annotations are unchanged
+        with patch.object(Footnote, "render_content") as mock_render_content:
+            assert not footnote.update_render_cache()
+            mock_render_content.assert_not_called()
+
+        # rendered again when an annotation changes
+        annotation.content["body"][0]["value"] = "Updated annotation"
+        annotation.save()
+        assert footnote.update_render_cache()
+        assert footnote.content_text == "Updated annotation"
+        assert (
+            Footnote.objects.get(pk=footnote.pk).render_cache["html_str"]
+            == "Updated annotation"
+        )
+
+        # rendered again when the render version changes
+        with patch.object(Footnote, "RENDER_VERSION", 2):
+            assert footnote.update_render_cache()
+            assert footnote.render_cache["version"] == 2
+
+    @patch.object(Document, "index_items")
+    def test_annotation_change(
+        self, mock_index_items, annotation, django_capture_on_commit_callbacks
+    ):
+        footnote = annotation.footnote
+        # stored content is updated when annotations are saved or deleted
+        with django_capture_on_commit_callbacks(execute=True):
+            annotation.content["body"][0]["value"] = "Updated annotation"
+            annotation.save()
+        stored = Footnote.objects.get(pk=footnote.pk).render_cache
+        assert stored["html_str"] == "Updated annotation"
+        with django_capture_on_commit_callbacks(execute=True):
+            annotation.delete()
+        assert Footnote.objects.get(pk=footnote.pk).render_cache["html_str"] is None
+
+    def test_annotations_digest(self, annotation):
+        footnote = annotation.footnote
+        digest = footnote.annotations_digest()
+        assert footnote.annotations_digest() == digest
+        # changes when annotations are modified, added, or removed
+        annotation.save()
+        assert footnote.annotations_digest() != digest
+        digest = footnote.annotations_digest()
+        second_annotation = Annotation.objects.create(
+            footnote=footnote, content=annotation.content
+        )
+        assert footnote.annotations_digest() != digest
+        second_annotation.delete()
+        assert footnote.annotations_digest() == digest
+        # changes when the render version changes
+        with patch.object(Footnote, "RENDER_VERSION", 2):
+            assert footnote.annotations_digest() != digest
+
+    def test_content_html_lines(self, annotation):
+        annotation.content["body"][0]["value"] = "<ol><li>one</li><li>two</li></ol>"
+        annotation.save()
+        assert (
+            annotation.footnote.content_html_lines
+            == '<ol><li value="1">one</li><li value="2">two</li></ol>'
+        )
+
     def test_content_text(self, annotation):
         assert annotation.footnote.content_text == strip_tags(annotation.body_content)
 
@@ -11,6 +11,7 @@ https://docs.djangoproject.com/en/3.1/ref/settings/
 """
 
 from pathlib import Path
+from tempfile import gettempdir
 
 # Build paths inside the project like this: BASE_DIR / 'subdir'.
 BASE_DIR = Path(__file__).resolve().parent.parent.parent
@@ -137,6 +138,88 @@ SOLR_CONNECTIONS = {
     }
 }
 
+# When enabled, saved records and records affected by changes to related
+# objects are queued in the database and indexed by the index_worker manage
+# command instead of being indexed in Solr during the request
+SOLR_INDEX_BACKGROUND = False
+
+# When enabled, bulk indexing streams documents to Solr as JSON lines
+# instead of sending each chunk as a single JSON array, in update requests
+# of at most SOLR_INDEX_BATCH_BYTES; soft commits use COMMITWITHIN
+# from SOLR_CONNECTIONS, if set
+SOLR_INDEX_STREAM = False
+SOLR_INDEX_BATCH_BYTES = 10 * 1024 * 1024
+
+# Django cache alias for Solr search responses on public search pages, or
+# None to disable (default). Use a cache shared by all processes (e.g. Redis
+# or Memcached), so that they agree on cached values. Cached responses are
+# not used once the index changes, and expire after SOLR_QUERY_CACHE_TIMEOUT
+# seconds
+SOLR_QUERY_CACHE = None
+SOLR_QUERY_CACHE_TIMEOUT = 60 * 60 * 24
+# Corpus-wide date ranges, facet counts and totals on search pages are cached
+# in SOLR_QUERY_CACHE per index version, when enabled; the version for the
+# whole index is checked at most once every SOLR_STATS_VERSION_TIMEOUT
+# seconds, so these values may be that many seconds out of date
+SOLR_STATS_VERSION_TIMEOUT = 60
+
+# Django cache alias for combined document IIIF manifests, or None to disable
+# (default); use a cache shared by all processes. Cached manifests are keyed
+# on a version of the document, its fragments and their imported manifests,
+# so are not used once any of those change, and expire after
+# DOCUMENT_MANIFEST_CACHE_TIMEOUT seconds
+DOCUMENT_MANIFEST_CACHE = None
+DOCUMENT_MANIFEST_CACHE_TIMEOUT = 60 * 60 * 24
+# Maximum number of remote IIIF manifests to load at once when a fragment's
+# manifest has not been imported
+IIIF_MANIFEST_FETCH_WORKERS = 4
+# When enabled, IIIF manifests for fragments saved with a new IIIF url are
+# queued and imported by the manifest_worker manage command, instead of being
+# loaded from the remote server during the request
+IIIF_MANIFEST_IMPORT_BACKGROUND = False
+
+CACHES = {
+    "default": {
+        "BACKEND": "django.core.cache.backends.locmem.LocMemCache",
+    },
+    # on-disk cache for remote IIIF manifest responses, shared across processes;
+    # allow enough entries for manifests for all fragments, since the default
+    # limit of 300 would cull cached manifests constantly
+    "iiif_manifests": {
+        "BACKEND": "django.core.cache.backends.filebased.FileBasedCache",
+        "LOCATION": Path(gettempdir()) / "geniza-iiif-manifests",
+        "OPTIONS": {"MAX_ENTRIES": 100000},
+    },
+}
+
+# Django cache alias for responses from remote IIIF manifest urls. Responses
+# are used until they expire according to their Cache-Control headers (or
+# after IIIF_MANIFEST_DEFAULT_MAX_AGE seconds, if not specified), and then
+# revalidated with a conditional request; they are kept for up to
+# IIIF_MANIFEST_CACHE_TIMEOUT seconds
+IIIF_MANIFEST_CACHE = "iiif_manifests"
+IIIF_MANIFEST_DEFAULT_MAX_AGE = 60 * 60
+IIIF_MANIFEST_CACHE_TIMEOUT = 60 * 60 * 24 * 30
+# Connect and read timeouts in seconds for requests to remote IIIF manifests
+IIIF_MANIFEST_CONNECT_TIMEOUT = 3
+IIIF_MANIFEST_READ_TIMEOUT = 10
+# After IIIF_MANIFEST_MAX_FAILURES consecutive errors or timeouts from a
+# remote host, stop requesting manifests from it for IIIF_MANIFEST_RETRY_AFTER
+# seconds
+IIIF_MANIFEST_MAX_FAILURES = 5
+IIIF_MANIFEST_RETRY_AFTER = 5 * 60
+
+# Limits for highlighting regular expression search results, which is done
+# in Python: total seconds and number of matches per page of results
+REGEX_HIGHLIGHT_TIMEOUT = 2.0
+REGEX_HIGHLIGHT_MAX_MATCHES = 1000
+
+# When enabled, regex searches on transcription, translation and description
+# are filtered to records containing the literal trigrams required by the
+# pattern, using the *_trigram Solr fields; requires reindexing after the
+# Solr configset has been updated
+REGEX_SEARCH_TRIGRAM_FILTER = False
+
 
 # Authentication backends
 # https://docs.djangoproject.com/en/3.1/topics/auth/customizing/#specifying-authentication-backends